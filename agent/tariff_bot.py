@@ -2,40 +2,162 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from tools.answer_generator import AnswerStream
 from tools.rag_tool import RAGTool
 from tools.tariff_calculator import TariffCalculator
+from tools.history_maintenance import HistoryMaintenance
 from tools.memory_handler import MemoryHandler
+from tools.policy_service import PolicyQueryService
+from tools.program_index import find_origin
 import re
 import json
+from itertools import islice
+
+import pandas as pd
+
+# Line items priced (and history rows written) per chunk in batch mode
+BATCH_CHUNK_SIZE = 500
 
 class TariffBot:
-    def __init__(self):
+    def __init__(self, warm_up=False, maintenance=False):
+        """Construction never loads the embedding model: RAGTool loads it on the
+        first policy query. warm_up=True starts loading it in the background, for
+        sessions that will likely ask policy questions (chat, the web app).
+        maintenance=True runs history maintenance hourly in the background, for
+        long-running servers; one-shot runs use scripts/maintain_history.py."""
         print("Initializing TariffBot...")
-        self.rag_tool = RAGTool()
-        self.tariff_calculator = TariffCalculator()
         self.memory = MemoryHandler()
+        # Archives old history, enforces retention and takes backups, hourly
+        self.maintenance = HistoryMaintenance(self.memory).start() if maintenance else None
+        self.rag_tool = RAGTool(history=self.memory)
+        # Shares work between sessions asking policy questions at the same time
+        self.policy_service = PolicyQueryService(self.rag_tool)
+        self.tariff_calculator = TariffCalculator()
+        if warm_up:
+            self.rag_tool.warm_up()
         print("TariffBot ready!")
     
-    def process_query(self, query):
-        """Route queries to appropriate tool"""
-        query_lower = query.lower()
+    def process_query(self, query, stream=False):
+        """Route queries to appropriate tool.
         
-        # Check if it's a tariff calculation query
-        hts_pattern = r'\b\d{4}\.\d{2}\.\d{2}\.\d{2}\b'
-        if re.search(hts_pattern, query) or any(keyword in query_lower for keyword in ['calculate', 'duty', 'cost', 'tariff']):
-            response = self._handle_tariff_query(query)
-        else:
-            # It's a policy/general question
-            response = self._handle_policy_query(query)
+        With stream=True a policy question returns an AnswerStream: iterate it
+        to show the answer as it is generated; its response (also saved to
+        memory) is available once it is exhausted. Other queries return their
+        result as usual.
+        """
+        if stream and not self._is_tariff_query(query):
+            answer = self.policy_service.stream(query)
+            return answer.on_complete(lambda response: self.memory.add_query(query, response))
+        
+        response = self._route(query)
         
         # Save to memory
         self.memory.add_query(query, response)
         
         return response
     
+    def process_batch(self, items, chunk_size=BATCH_CHUNK_SIZE):
+        """Process many queries, yielding (item, result) pairs as they complete.
+        
+        Items are free-text queries or line-item dicts with the batch template
+        fields (hts_code, product_cost, freight, insurance, unit_weight,
+        quantity, origin). Input is consumed chunk by chunk: the line items of
+        a chunk are priced with one calculate_duties call and its history rows
+        are written in one transaction, so memory stays flat however long the
+        input is.
+        """
+        items = iter(items)
+        while True:
+            chunk = list(islice(items, chunk_size))
+            if not chunk:
+                break
+            history = []
+            priced = iter(self._price_line_items([item for item in chunk if isinstance(item, dict)]))
+            try:
+                for item in chunk:
+                    if isinstance(item, dict):
+                        query, result = self._describe_line_item(item), next(priced)
+                    else:
+                        query = item
+                        try:
+                            result = self._route(item)
+                        except Exception as e:
+                            # One bad line should not stop a nightly run
+                            result = {"error": str(e)}
+                    history.append((query, result))
+                    yield item, result
+            finally:
+                # Also runs if the consumer stops early, so yielded results are recorded
+                self.memory.add_queries(history)
+    
+    @staticmethod
+    def _is_tariff_query(query):
+        query_lower = query.lower()
+        hts_pattern = r'\b\d{4}\.\d{2}\.\d{2}\.\d{2}\b'
+        return bool(re.search(hts_pattern, query)) or any(keyword in query_lower for keyword in ['calculate', 'duty', 'cost', 'tariff'])
+    
+    def _route(self, query):
+        # Check if it's a tariff calculation query
+        if self._is_tariff_query(query):
+            return self._handle_tariff_query(query)
+        # It's a policy/general question
+        return self._handle_policy_query(query)
+    
+    def _price_line_items(self, items):
+        """Calculate duties for structured line items, without parsing text.
+        
+        Valid lines are priced together with one calculate_duties call; lines
+        that cannot be read get their own error result.
+        """
+        def number(item, field, default):
+            value = item.get(field)
+            if value is None or str(value).strip() == "":
+                return default
+            return float(str(value).replace('$', '').replace(',', ''))
+        
+        results = [None] * len(items)
+        lines, positions = [], []
+        for i, item in enumerate(items):
+            hts_code = str(item.get("hts_code") or "").strip()
+            if not hts_code:
+                results[i] = {"error": "Line item has no hts_code"}
+                continue
+            try:
+                lines.append({
+                    "hts_code": hts_code,
+                    "product_cost": number(item, "product_cost", 0.0),
+                    "freight": number(item, "freight", 0.0),
+                    "insurance": number(item, "insurance", 0.0),
+                    "unit_weight": number(item, "unit_weight", None),
+                    "quantity": number(item, "quantity", None),
+                    "origin": (item.get("origin") or "").strip() or None
+                })
+            except ValueError as e:
+                results[i] = {"error": f"Invalid line item for {hts_code}: {str(e)}"}
+                continue
+            positions.append(i)
+        
+        if lines:
+            try:
+                priced = self.tariff_calculator.calculate_duties(pd.DataFrame(lines), formatted=True)
+                for i, row in zip(positions, priced.to_dict("records")):
+                    results[i] = TariffCalculator.result_from_row(row)
+            except Exception as e:
+                for i in positions:
+                    results[i] = {"error": str(e)}
+        return results
+    
+    @staticmethod
+    def _describe_line_item(item):
+        """History text for a line item, phrased like a calculation query"""
+        query = f"Calculate duty for HTS {item.get('hts_code', '')} with cost ${item.get('product_cost', '')}"
+        if item.get("origin"):
+            query += f" from {item['origin']}"
+        return query
+    
     def _handle_policy_query(self, query):
         """Handle policy-related questions using RAG"""
-        result = self.rag_tool.answer_policy_question(query)
+        result = self.policy_service.answer_sync(query)
         return result
     
     def _handle_tariff_query(self, query):
@@ -73,6 +195,9 @@ class TariffBot:
         if qty_match:
             quantity = int(qty_match.group(1))
         
+        # Look for a country of origin with its own rate ("from Korea")
+        origin = find_origin(query)
+        
         # Calculate duties
         result = self.tariff_calculator.calculate_duty(
             hts_code=hts_code,
@@ -80,23 +205,15 @@ class TariffBot:
             freight=freight,
             insurance=insurance,
             unit_weight=unit_weight,
-            quantity=quantity
+            quantity=quantity,
+            origin=origin
         )
         
         return result
     
     def get_similar_queries(self, query):
         """Get similar past queries from memory"""
-        recent = self.memory.get_recent_queries(20)
-        similar = []
-        
-        query_words = set(query.lower().split())
-        for past_query in recent:
-            past_words = set(past_query['query'].lower().split())
-            if len(query_words.intersection(past_words)) >= 2:
-                similar.append(past_query)
-        
-        return similar[:5]
+        return self.memory.get_similar_queries(query, limit=5)
     
     def chat(self):
         """Interactive chat interface with memory"""
@@ -130,9 +247,17 @@ class TariffBot:
                     print(f"  - {sq['query'][:60]}...")
             
             try:
-                result = self.process_query(query)
+                result = self.process_query(query, stream=True)
                 
-                if isinstance(result, dict):
+                if isinstance(result, AnswerStream):
+                    # Policy answer, printed as it is generated
+                    print("\n📚 Answer: ", end="", flush=True)
+                    for token in result:
+                        print(token, end="", flush=True)
+                    print()
+                    if "sources" in result.response:
+                        print(f"📄 {result.response['sources']}")
+                elif isinstance(result, dict):
                     if "error" in result:
                         print(f"\n❌ Error: {result['error']}")
                     elif "answer" in result:
@@ -161,6 +286,10 @@ class TariffBot:
         print(f"Total Queries: {stats['total_queries']}")
         print(f"Policy Questions: {stats['policy_queries']}")
         print(f"Duty Calculations: {stats['duty_calculations']}")
+        cache = self.rag_tool.cache_stats()
+        if "semantic_hits" in cache:
+            print(f"Answered from Cache: {cache['semantic_hits']} of {cache['semantic_hits'] + cache['semantic_misses']} "
+                  f"policy questions")
         print("\n📝 Recent Queries:")
         print("-"*50)
         
@@ -193,5 +322,5 @@ class TariffBot:
         print("="*50)
 
 if __name__ == "__main__":
-    bot = TariffBot()
+    bot = TariffBot(warm_up=True)
     bot.chat()
\ No newline at end of file
@@ -11,9 +11,11 @@ import base64
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from agent.tariff_bot import TariffBot
+from tools.answer_generator import AnswerStream
 from tools.invoice_parser import InvoiceParser
 from tools.export_handler import ExportHandler
 from tools.memory_handler import MemoryHandler
+from tools.program_index import KNOWN_ORIGINS
 
 st.set_page_config(
     page_title="HTS AI Agent",
@@ -30,7 +32,7 @@ if 'chat_history' not in st.session_state:
 
 @st.cache_resource
 def load_bot():
-    return TariffBot()
+    return TariffBot(warm_up=True, maintenance=True)
 
 def main():
     st.title("🌐 HTS AI Agent - Advanced Trade Assistant")
@@ -131,36 +133,45 @@ def render_chat_interface(bot):
                 st.session_state.memory.add_query(query)
                 
                 # Process query
-                response = bot.process_query(query)
-                
-                # Display response
-                if isinstance(response, dict):
-                    if "duties" in response:
-                        display_duty_result(response)
-                        # Add export buttons
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            excel_data = ExportHandler.to_excel(response)
-                            st.download_button(
-                                "📥 Download Excel",
-                                data=excel_data,
-                                file_name=f"duty_calculation_{response['HTS Code'].replace('.', '')}.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                            )
-                        with col2:
-                            pdf_data = ExportHandler.to_pdf(response)
-                            st.download_button(
-                                "📥 Download PDF",
-                                data=pdf_data,
-                                file_name=f"duty_calculation_{response['HTS Code'].replace('.', '')}.pdf",
-                                mime="application/pdf"
-                            )
-                    else:
-                        st.markdown(response.get("answer", str(response)))
+                response = bot.process_query(query, stream=True)
+            
+            # Display response
+            if isinstance(response, AnswerStream):
+                # Policy answer, shown as it is generated
+                placeholder = st.empty()
+                text = ""
+                for token in response:
+                    text += token
+                    placeholder.markdown(text + "▌")
+                placeholder.markdown(text)
+                response = response.response
+            elif isinstance(response, dict):
+                if "duties" in response:
+                    display_duty_result(response)
+                    # Add export buttons
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        excel_data = ExportHandler.to_excel(response)
+                        st.download_button(
+                            "📥 Download Excel",
+                            data=excel_data,
+                            file_name=f"duty_calculation_{response['HTS Code'].replace('.', '')}.xlsx",
+                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                        )
+                    with col2:
+                        pdf_data = ExportHandler.to_pdf(response)
+                        st.download_button(
+                            "📥 Download PDF",
+                            data=pdf_data,
+                            file_name=f"duty_calculation_{response['HTS Code'].replace('.', '')}.pdf",
+                            mime="application/pdf"
+                        )
                 else:
-                    st.markdown(str(response))
-                
-                st.session_state.chat_history.append({"role": "assistant", "content": response})
+                    st.markdown(response.get("answer", str(response)))
+            else:
+                st.markdown(str(response))
+            
+            st.session_state.chat_history.append({"role": "assistant", "content": response})
 
 def render_duty_calculator(bot):
     st.header("Advanced Duty Calculator")
@@ -188,6 +199,7 @@ def render_duty_calculator(bot):
         st.subheader("Additional Costs")
         handling_fee = st.number_input("Handling Fee ($)", value=50.0, min_value=0.0)
         customs_broker_fee = st.number_input("Customs Broker Fee ($)", value=150.0, min_value=0.0)
+        origin = st.selectbox("Country of Origin", ["Other / not specified"] + list(KNOWN_ORIGINS))
         
     if st.button("Calculate Total Costs", type="primary"):
         with st.spinner("Calculating..."):
@@ -198,7 +210,8 @@ def render_duty_calculator(bot):
                 freight=freight,
                 insurance=insurance,
                 unit_weight=unit_weight,
-                quantity=quantity
+                quantity=quantity,
+                origin=origin if origin in KNOWN_ORIGINS else None
             )
             
             if "error" not in result:
@@ -273,37 +286,18 @@ def render_batch_processing(bot):
         st.dataframe(df)
         
         if st.button("Process Batch", type="primary"):
-            progress_bar = st.progress(0)
-            results = []
+            with st.spinner(f"Calculating duties for {len(df):,} line items..."):
+                batch = bot.tariff_calculator.calculate_duties(df, formatted=True)
             
-            for idx, row in df.iterrows():
-                progress_bar.progress((idx + 1) / len(df))
-                
-                result = bot.tariff_calculator.calculate_duty(
-                    hts_code=row['HTS Code'],
-                    product_cost=row['Product Cost'],
-                    freight=row['Freight'],
-                    insurance=row['Insurance'],
-                    unit_weight=row['Unit Weight'],
-                    quantity=row['Quantity']
-                )
-                
-                if "error" not in result:
-                    results.append({
-                        'HTS Code': result['HTS Code'],
-                        'Description': result['Description'],
-                        'CIF Value': result['CIF Value'],
-                        'Total Duty': result['Total Duty'],
-                        'Landed Cost': result['Landed Cost']
-                    })
-                else:
-                    results.append({
-                        'HTS Code': row['HTS Code'],
-                        'Error': result['error']
-                    })
+            # Keep the historical result layout: priced rows carry the cost
+            # summary, rows that failed only carry the code and the error
+            failed = batch['error'].notna()
+            results_df = batch[['HTS Code', 'Description', 'CIF Value', 'Total Duty', 'Landed Cost']].copy()
+            if failed.any():
+                results_df['Error'] = batch['error']
+                results_df.loc[failed, ['Description', 'CIF Value', 'Total Duty', 'Landed Cost']] = None
             
             # Display results
-            results_df = pd.DataFrame(results)
             st.dataframe(results_df)
             
             # Export batch results
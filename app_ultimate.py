@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import json
+import re
 import numpy as np
 from datetime import datetime, timedelta
 import plotly.express as px
@@ -8,6 +9,9 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import time
 
+from tools.advanced_analytics import get_analytics
+from tools.tariff_provider import DISPLAY_ORIGINS, get_tariff_provider
+
 # Set page config
 st.set_page_config(
     page_title="HTS AI Agent - Ultimate Pro",
@@ -102,58 +106,8 @@ def load_css():
 
 # Enhanced HTS database
 def get_hts_database():
-    return {
-        "0101.30.00.00": {
-            "description": "Live asses",
-            "duty_rate": 0.0,
-            "category": "Live Animals",
-            "units": "Number",
-            "special_programs": ["GSP"],
-            "origin_rates": {"China": 0.0, "EU": 0.0, "USMCA": 0.0},
-            "seasonal": False,
-            "avg_value": 5000
-        },
-        "0102.21.00.00": {
-            "description": "Live cattle, purebred breeding animals",
-            "duty_rate": 0.025,
-            "category": "Live Animals",
-            "units": "Number",
-            "special_programs": ["USMCA"],
-            "origin_rates": {"China": 0.025, "EU": 0.025, "USMCA": 0.0},
-            "seasonal": False,
-            "avg_value": 15000
-        },
-        "0201.10.00.00": {
-            "description": "Beef carcasses and half-carcasses, fresh or chilled",
-            "duty_rate": 0.044,
-            "category": "Meat Products",
-            "units": "kg",
-            "special_programs": ["TRQ"],
-            "origin_rates": {"China": 0.044, "EU": 0.044, "USMCA": 0.0},
-            "seasonal": False,
-            "avg_value": 8
-        },
-        "8471.30.01.00": {
-            "description": "Portable digital automatic data processing machines",
-            "duty_rate": 0.0,
-            "category": "Electronics",
-            "units": "Number",
-            "special_programs": ["ITA"],
-            "origin_rates": {"China": 0.25, "EU": 0.0, "USMCA": 0.0},
-            "seasonal": False,
-            "avg_value": 800
-        },
-        "6109.10.00.40": {
-            "description": "T-shirts, singlets and other vests, knitted, of cotton",
-            "duty_rate": 0.165,
-            "category": "Textiles",
-            "units": "Dozen",
-            "special_programs": ["CAFTA"],
-            "origin_rates": {"China": 0.165, "EU": 0.12, "USMCA": 0.0},
-            "seasonal": False,
-            "avg_value": 45
-        }
-    }
+    """Process-wide tariff data provider (memoized records, keyed by schedule version)"""
+    return get_tariff_provider()
 
 # Initialize session state
 def init_session_state():
@@ -258,18 +212,24 @@ def render_ultimate_dashboard():
     
     # Real-time metrics
     col1, col2, col3, col4, col5, col6 = st.columns(6)
+    analytics = get_analytics()
+    usage = analytics.generate_usage_analytics()
+    metrics = analytics.get_trade_metrics()
+    today = datetime.now().date().isoformat()
+    today_count = sum(day['queries'] for day in usage['daily_activity'] if day['date'] == today)
+    history_calcs = sum(row['count'] for row in usage['query_types'] if row['query_type'] == 'duty_calculation')
     
     with col1:
-        st.markdown("""
+        st.markdown(f"""
         <div class="metric-card">
-            <h3>125</h3>
+            <h3>{usage['total_queries']:,}</h3>
             <p>Total Queries</p>
-            <small>↗️ +12 today</small>
+            <small>↗️ +{today_count} today</small>
         </div>
         """, unsafe_allow_html=True)
     
     with col2:
-        calc_count = 87 + len(st.session_state.calculations_history)
+        calc_count = history_calcs + len(st.session_state.calculations_history)
         st.markdown(f"""
         <div class="metric-card">
             <h3>{calc_count}</h3>
@@ -279,18 +239,18 @@ def render_ultimate_dashboard():
         """, unsafe_allow_html=True)
     
     with col3:
-        st.markdown("""
+        st.markdown(f"""
         <div class="metric-card">
-            <h3>8.5%</h3>
+            <h3>{metrics.average_duty_rate * 100:.1f}%</h3>
             <p>Avg Duty Rate</p>
             <small>📊 Weighted</small>
         </div>
         """, unsafe_allow_html=True)
     
     with col4:
-        st.markdown("""
+        st.markdown(f"""
         <div class="metric-card">
-            <h3>$12.5K</h3>
+            <h3>${metrics.total_savings / 1000:,.1f}K</h3>
             <p>Est. Savings</p>
             <small>💰 This month</small>
         </div>
@@ -434,7 +394,7 @@ def render_standard_calc():
     
     with col2:
         st.markdown("#### 🚚 Shipping & Origin")
-        countries = ["China", "Germany", "Japan", "Mexico", "Canada", "Vietnam", "India", "Brazil"]
+        countries = list(DISPLAY_ORIGINS)
         country_origin = st.selectbox("Country of Origin", countries)
         
         freight = st.number_input("Freight ($)", value=product_cost * 0.05, min_value=0.0)
@@ -468,24 +428,19 @@ def calculate_standard_duty(hts_code, product_cost, freight, insurance, country_
     # Calculate base values
     cif_value = product_cost + freight + insurance
     
-    # Determine duty rate
-    if country_origin in hts_info["origin_rates"]:
-        duty_rate = hts_info["origin_rates"][country_origin]
-    else:
-        duty_rate = hts_info["duty_rate"]
-    
-    # Apply preferential treatment
-    preferential_applied = False
-    if use_preferential:
-        if "USMCA" in hts_info["special_programs"] and country_origin in ["Mexico", "Canada"]:
-            duty_rate = 0.0
-            preferential_applied = True
-        elif "GSP" in hts_info["special_programs"]:
-            duty_rate = 0.0
-            preferential_applied = True
+    # Applicable rate for the origin: column 2, a claimed special program, or general
+    unit_weight = quantity if hts_info["units"] == "kg" else None
+    resolution = hts_database.resolve(
+        hts_code, country_origin,
+        unit_weight=unit_weight,
+        cif_value=cif_value, quantity=quantity,
+        claim_programs=use_preferential
+    )
+    preferential_applied = resolution.column == "special"
     
     # Calculate duty and total costs
-    duty_amount = cif_value * duty_rate
+    duty_amount = resolution.rate.amount(cif_value, unit_weight, quantity)
+    duty_rate = duty_amount / cif_value if cif_value else 0.0
     additional_fees = handling_fee + broker_fee + exam_fee
     total_landed_cost = cif_value + duty_amount + additional_fees
     cost_per_unit = total_landed_cost / quantity
@@ -726,6 +681,19 @@ def render_manual_batch():
         df_batch = pd.DataFrame(st.session_state.batch_items)
         st.dataframe(df_batch, use_container_width=True, hide_index=True)
 
+def estimate_duty(hts_database, hts_code, country, cif_value, quantity=1):
+    """Duty amount and effective rate for one line, priced like the calculator."""
+    hts_info = hts_database[hts_code]
+    unit_weight = quantity if hts_info["units"] == "kg" else None
+    resolution = hts_database.resolve(
+        hts_code, country,
+        unit_weight=unit_weight,
+        cif_value=cif_value, quantity=quantity
+    )
+    duty_amount = resolution.rate.amount(cif_value, unit_weight, quantity)
+    duty_rate = duty_amount / cif_value if cif_value else 0.0
+    return duty_amount, duty_rate
+
 def process_batch_items():
     """Process all items in the batch with progress tracking"""
     if not st.session_state.batch_items:
@@ -762,9 +730,10 @@ def process_batch_items():
             insurance = product_cost * 0.01  # 1% insurance estimate
             cif_value = product_cost + freight + insurance
             
-            # Get duty rate
-            duty_rate = hts_info['origin_rates'].get(item['country'], hts_info['duty_rate'])
-            duty_amount = cif_value * duty_rate
+            # Price the line through the schedule
+            duty_amount, duty_rate = estimate_duty(
+                hts_database, item['hts_code'], item['country'], cif_value, item['quantity']
+            )
             
             # Additional fees
             additional_fees = 200  # Standard fees
@@ -920,31 +889,36 @@ def render_country_comparison():
         selected_hts = st.selectbox("Select HTS Code", hts_codes)
     
     with col2:
-        countries = ["China", "Germany", "Japan", "Mexico", "Canada", "Vietnam", "India", "Brazil"]
+        countries = list(DISPLAY_ORIGINS)
         selected_countries = st.multiselect("Select Countries", countries, default=["China", "Germany", "Mexico"])
     
     if selected_hts and selected_countries and st.button("📊 Generate Comparison", type="primary"):
         hts_database = get_hts_database()
         hts_info = hts_database[selected_hts]
         
+        # Sample calculation with $10,000 product
+        sample_cost = 10000
+        cif_value = sample_cost * 1.06  # Add 6% for freight/insurance
+        
+        # Price every origin once through the schedule
+        duties = {c: estimate_duty(hts_database, selected_hts, c, cif_value) for c in selected_countries}
+        landed_costs = {c: cif_value + duties[c][0] + 200 for c in selected_countries}  # Add standard fees
+        lowest_cost = min(landed_costs.values())
+        highest_cost = max(landed_costs.values())
+        
         # Create comparison data
         comparison_data = []
         for country in selected_countries:
-            duty_rate = hts_info['origin_rates'].get(country, hts_info['duty_rate'])
-            
-            # Sample calculation with $10,000 product
-            sample_cost = 10000
-            cif_value = sample_cost * 1.06  # Add 6% for freight/insurance
-            duty_amount = cif_value * duty_rate
-            landed_cost = cif_value + duty_amount + 200  # Add standard fees
+            duty_amount, duty_rate = duties[country]
+            landed_cost = landed_costs[country]
             
             comparison_data.append({
                 "Country": country,
                 "Duty Rate": f"{duty_rate*100:.2f}%",
                 "Duty Amount": f"${duty_amount:,.2f}",
                 "Landed Cost": f"${landed_cost:,.2f}",
-                "Cost Difference": f"${landed_cost - min([cif_value * hts_info['origin_rates'].get(c, hts_info['duty_rate']) + cif_value + 200 for c in selected_countries]):,.2f}",
-                "Savings Potential": f"{((max([landed_cost for c in selected_countries]) - landed_cost) / max([landed_cost for c in selected_countries]) * 100):.1f}%"
+                "Cost Difference": f"${landed_cost - lowest_cost:,.2f}",
+                "Savings Potential": f"{((highest_cost - landed_cost) / highest_cost * 100):.1f}%"
             })
         
         # Display comparison table
@@ -959,7 +933,7 @@ def render_country_comparison():
         
         with col1:
             # Duty rate comparison
-            rates = [hts_info['origin_rates'].get(country, hts_info['duty_rate'])*100 for country in selected_countries]
+            rates = [duties[country][1]*100 for country in selected_countries]
             
             fig_bar = go.Figure(data=[go.Bar(x=selected_countries, y=rates)])
             fig_bar.update_layout(title="Duty Rates by Country", 
@@ -968,8 +942,7 @@ def render_country_comparison():
         
         with col2:
             # Cost comparison
-            costs = [cif_value * hts_info['origin_rates'].get(country, hts_info['duty_rate']) + cif_value + 200 
-                    for country in selected_countries]
+            costs = [landed_costs[country] for country in selected_countries]
             
             fig_pie = go.Figure(data=[go.Pie(labels=selected_countries, values=costs)])
             fig_pie.update_layout(title="Total Cost Distribution")
@@ -978,11 +951,9 @@ def render_country_comparison():
         # Recommendations
         st.subheader("💡 Smart Recommendations")
         
-        best_country = min(selected_countries, 
-                          key=lambda c: cif_value * hts_info['origin_rates'].get(c, hts_info['duty_rate']) + cif_value + 200)
+        best_country = min(selected_countries, key=landed_costs.get)
         
-        worst_country = max(selected_countries, 
-                           key=lambda c: cif_value * hts_info['origin_rates'].get(c, hts_info['duty_rate']) + cif_value + 200)
+        worst_country = max(selected_countries, key=landed_costs.get)
         
         st.markdown(f"""
         <div class="feature-card">
@@ -1101,8 +1072,9 @@ def generate_smart_response(question, knowledge_base):
     
     # HTS code specific responses
     hts_database = get_hts_database()
-    for hts_code, info in hts_database.items():
-        if hts_code in question:
+    for hts_code in re.findall(r"\d{4}(?:\.\d{2}){0,3}", question):
+        if hts_code in hts_database:
+            info = hts_database[hts_code]
             return f"HTS Code {hts_code}: {info['description']} | Category: {info['category']} | Standard Rate: {info['duty_rate']*100:.2f}% | Special Programs: {', '.join(info['special_programs'])}"
     
     # Context-aware responses
@@ -1149,46 +1121,40 @@ def render_advanced_analytics():
 def render_analytics_overview():
     st.subheader("📊 Analytics Overview")
     
-    # Generate sample analytics data
-    if not st.session_state.calculations_history:
-        # Create sample data for demonstration
-        sample_data = generate_sample_analytics_data()
-    else:
-        sample_data = st.session_state.calculations_history
+    # Key metrics from the query history rollups
+    analytics = get_analytics()
+    metrics = analytics.get_trade_metrics()
+    usage = analytics.generate_usage_analytics()
     
-    # Key metrics
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Total Calculations", len(sample_data))
+        calc_count = sum(row['count'] for row in usage['query_types'] if row['query_type'] == 'duty_calculation')
+        st.metric("Total Calculations", calc_count + len(st.session_state.calculations_history))
     with col2:
-        avg_duty = 8.5  # Sample average
-        st.metric("Avg Duty Rate", f"{avg_duty:.1f}%")
+        st.metric("Avg Duty Rate", f"{metrics.average_duty_rate * 100:.1f}%")
     with col3:
-        total_value = sum([10000 for _ in sample_data])  # Sample values
-        st.metric("Total Value", f"${total_value:,.0f}")
+        st.metric("Total Value", f"${metrics.total_volume:,.0f}")
     with col4:
-        savings = total_value * 0.05  # 5% estimated savings
-        st.metric("Est. Savings", f"${savings:,.0f}")
+        st.metric("Est. Savings", f"${metrics.total_savings:,.0f}")
+    
+    cache = analytics.cache_stats()
+    if cache['enabled']:
+        st.caption(f"Analytics cache: {cache['hit_rate']:.0%} hit rate, {cache['entries']} entries")
     
     # Activity over time
-    if len(sample_data) > 0:
+    if usage['daily_activity']:
         st.subheader("📈 Activity Timeline")
         
-        # Create timeline data
-        dates = pd.date_range(start='2024-01-01', periods=30, freq='D')
-        activity_counts = np.random.poisson(5, 30)  # Sample activity
-        
-        timeline_data = pd.DataFrame({
-            'Date': dates,
-            'Calculations': activity_counts,
-            'Cumulative': np.cumsum(activity_counts)
-        })
+        # Daily query counts from the rollups
+        timeline_data = pd.DataFrame(usage['daily_activity']).rename(columns={'date': 'Date', 'queries': 'Queries'})
+        timeline_data['Date'] = pd.to_datetime(timeline_data['Date'])
+        timeline_data['Cumulative'] = timeline_data['Queries'].cumsum()
         
         fig = make_subplots(specs=[[{"secondary_y": True}]])
         
         fig.add_trace(
-            go.Bar(x=timeline_data['Date'], y=timeline_data['Calculations'], name="Daily"),
+            go.Bar(x=timeline_data['Date'], y=timeline_data['Queries'], name="Daily"),
             secondary_y=False,
         )
         
@@ -1198,30 +1164,11 @@ def render_analytics_overview():
         )
         
         fig.update_layout(title="Daily vs Cumulative Activity")
-        fig.update_yaxes(title_text="Daily Calculations", secondary_y=False)
+        fig.update_yaxes(title_text="Daily Queries", secondary_y=False)
         fig.update_yaxes(title_text="Cumulative Total", secondary_y=True)
         
         st.plotly_chart(fig, use_container_width=True)
 
-def generate_sample_analytics_data():
-    """Generate sample data for analytics demonstration"""
-    countries = ["China", "Germany", "Japan", "Mexico", "Canada"]
-    hts_codes = list(get_hts_database().keys())
-    
-    sample_data = []
-    for i in range(50):  # 50 sample calculations
-        sample_data.append({
-            "timestamp": (datetime.now() - timedelta(days=np.random.randint(0, 30))).strftime("%Y-%m-%d %H:%M:%S"),
-            "hts_code": np.random.choice(hts_codes),
-            "country_origin": np.random.choice(countries),
-            "cif_value": np.random.uniform(1000, 50000),
-            "duty_rate": np.random.uniform(0, 0.25),
-            "duty_amount": np.random.uniform(0, 5000),
-            "total_landed_cost": np.random.uniform(1200, 60000)
-        })
-    
-    return sample_data
-
 def render_express_calc():
     st.subheader("⚡ Express Calculator")
     
@@ -1240,10 +1187,8 @@ def render_express_calc():
         
         if st.button("⚡ Quick Calculate", type="primary", key="express_calc_btn"):
             hts_database = get_hts_database()
-            hts_info = hts_database[hts_code]
             
-            duty_rate = hts_info['origin_rates'].get(country, hts_info['duty_rate'])
-            duty_amount = value * duty_rate
+            duty_amount, duty_rate = estimate_duty(hts_database, hts_code, country, value)
             total_cost = value + duty_amount + 200  # Add standard fees
             
             st.success(f"⚡ **Quick Result**: ${total_cost:,.2f} total cost (${duty_amount:,.2f} duty at {duty_rate*100:.2f}%)")
@@ -1365,7 +1310,10 @@ def preview_batch_results():
     for item in st.session_state.batch_items[:10]:  # Preview first 10
         if item['hts_code'] in hts_database:
             hts_info = hts_database[item['hts_code']]
-            duty_rate = hts_info['origin_rates'].get(item['country'], hts_info['duty_rate'])
+            duty_rate = estimate_duty(
+                hts_database, item['hts_code'], item['country'],
+                item['product_cost'] * 1.06, item['quantity']
+            )[1]
             
             preview_data.append({
                 "HTS Code": item['hts_code'],
@@ -1526,13 +1474,13 @@ def render_hts_explorer():
     with col1:
         search_term = st.text_input("Search HTS Codes", placeholder="Enter keyword or HTS code...")
     
-    with col2:
-        category_filter = st.selectbox("Filter by Category", 
-                                      ["All", "Live Animals", "Electronics", "Textiles", "Food"])
-    
     # HTS database display
     hts_database = get_hts_database()
     
+    with col2:
+        categories = sorted({info['category'] for info in hts_database.values()})
+        category_filter = st.selectbox("Filter by Category", ["All"] + categories)
+    
     # Convert to DataFrame for easier filtering
     hts_data = []
     for code, info in hts_database.items():
@@ -1550,8 +1498,9 @@ def render_hts_explorer():
     
     # Apply filters
     if search_term:
-        mask = df_hts.apply(lambda x: search_term.lower() in x.astype(str).str.lower().to_string(), axis=1)
-        df_hts = df_hts[mask]
+        # Ranked full-text match over descriptions, categories and code prefixes
+        ranked_codes = hts_database.search(search_term, limit=len(df_hts))
+        df_hts = df_hts.set_index("HTS Code").loc[ranked_codes].reset_index()
     
     if category_filter != "All":
         df_hts = df_hts[df_hts["Category"] == category_filter]
@@ -1792,9 +1741,9 @@ def render_supply_chain_sim():
     if st.button("🔄 Optimize Supply Chain", type="primary"):
         # Simulation results
         results = []
+        hts_database = get_hts_database()
+        sample_hts = next(iter(hts_database))  # Use first HTS for demo
         for supplier in suppliers:
-            hts_database = get_hts_database()
-            sample_hts = list(hts_database.keys())[0]  # Use first HTS for demo
             duty_rate = hts_database[sample_hts]['origin_rates'].get(supplier, 0.1)
             
             total_cost = product_value * (1 + duty_rate + 0.05)  # Add 5% logistics
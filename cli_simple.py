@@ -12,6 +12,11 @@ import re
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
+from tools.tariff_provider import get_tariff_provider
+
+# Matches returned per search
+SEARCH_LIMIT = 25
+
 def print_banner():
     """Print application banner"""
     banner = """
@@ -30,39 +35,8 @@ class SimpleHTS:
     """Simple HTS Agent without AI dependencies"""
     
     def __init__(self):
-        # Sample HTS database
-        self.hts_database = {
-            "0101.30.00.00": {
-                "description": "Live asses",
-                "duty_rate": 0.0,
-                "category": "Live Animals",
-                "units": "Number"
-            },
-            "0102.21.00.00": {
-                "description": "Live cattle, purebred breeding animals",
-                "duty_rate": 0.025,
-                "category": "Live Animals",
-                "units": "Number"
-            },
-            "0201.10.00.00": {
-                "description": "Beef carcasses and half-carcasses, fresh or chilled",
-                "duty_rate": 0.044,
-                "category": "Meat Products",
-                "units": "kg"
-            },
-            "0301.11.00.00": {
-                "description": "Ornamental fish",
-                "duty_rate": 0.0,
-                "category": "Fish",
-                "units": "Number"
-            },
-            "0401.10.00.00": {
-                "description": "Milk, not concentrated, not sweetened, fat content ≤ 1%",
-                "duty_rate": 0.038,
-                "category": "Dairy",
-                "units": "Liter"
-            }
-        }
+        # Shared tariff schedule (same provider as main_fixed.py and the apps)
+        self.hts_database = get_tariff_provider()
         
         # Knowledge base for questions
         self.knowledge_base = {
@@ -86,8 +60,9 @@ class SimpleHTS:
                 return answer
         
         # Check for HTS code specific questions
-        for hts_code, info in self.hts_database.items():
-            if hts_code in question:
+        for hts_code in re.findall(r"\d{4}(?:\.\d{2}){0,3}", question):
+            if hts_code in self.hts_database:
+                info = self.hts_database[hts_code]
                 return f"HTS Code {hts_code}: {info['description']} | Duty Rate: {info['duty_rate']*100:.1f}% | Category: {info['category']}"
         
         return "I don't have specific information about that. Try asking about GSP, HTS codes, duties, CIF, NAFTA/USMCA, or FTA."
@@ -102,12 +77,12 @@ class SimpleHTS:
         if not hts_info:
             return {
                 "error": f"HTS code {hts_code} not found in database",
-                "available_codes": list(self.hts_database.keys())
+                "available_codes": [code for code, _ in self.search_codes(hts_code)[:10]]
             }
         
-        # Calculate duty
-        duty_rate = hts_info["duty_rate"]
-        duty_amount = cif_value * duty_rate
+        # Calculate duty, including specific (per kg / per unit) components
+        duty_amount = self.hts_database.duty(hts_code, cif_value, unit_weight=weight, quantity=quantity)
+        duty_rate = duty_amount / cif_value if cif_value else hts_info["duty_rate"]
         landed_cost = cif_value + duty_amount
         
         return {
@@ -134,16 +109,8 @@ class SimpleHTS:
     
     def search_codes(self, search_term: str) -> List[Tuple[str, Dict]]:
         """Search HTS codes by keyword"""
-        search_lower = search_term.lower()
-        matches = []
-        
-        for code, info in self.hts_database.items():
-            if (search_lower in info['description'].lower() or 
-                search_lower in info['category'].lower() or
-                search_lower in code.lower()):
-                matches.append((code, info))
-        
-        return matches
+        codes = self.hts_database.search(search_term, limit=SEARCH_LIMIT)
+        return [(code, self.hts_database[code]) for code in codes]
     
     def compare_codes(self, codes: List[str]) -> Dict:
         """Compare multiple HTS codes"""
@@ -198,7 +165,7 @@ class SimpleHTS:
         if format_type.lower() == 'json':
             filename = f"hts_database_{timestamp}.json"
             with open(filename, 'w') as f:
-                json.dump(self.hts_database, f, indent=2)
+                json.dump(dict(self.hts_database), f, indent=2)
         
         elif format_type.lower() == 'csv':
             filename = f"hts_database_{timestamp}.csv"
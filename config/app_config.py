@@ -16,6 +16,13 @@ class DatabaseConfig:
     vector_store_path: str = "data/vector_store"
     backup_enabled: bool = True
     backup_interval_hours: int = 24
+    history_durability: str = "normal"
+    history_flush_rows: int = 256
+    history_flush_ms: int = 500
+    history_live_days: int = 90
+    history_archive_dir: str = "data/history_archive"
+    backup_dir: str = "data/backups"
+    backup_keep: int = 7
 
 @dataclass
 class UIConfig:
@@ -41,6 +48,16 @@ class PerformanceConfig:
     query_timeout_seconds: int = 30
     embedding_batch_size: int = 64
     max_concurrent_requests: int = 10
+    query_cache_size: int = 1024
+    query_cache_ttl_seconds: int = 3600
+    semantic_cache_threshold: float = 0.92
+    semantic_cache_size: int = 512
+    vector_index: str = "auto"
+    hybrid_retrieval: bool = True
+    retrieval_k: int = 2
+    policy_batch_window_ms: float = 5.0
+    policy_max_batch: int = 32
+    analytics_cache_ttl_seconds: int = 300
 
 @dataclass
 class SecurityConfig:
@@ -69,6 +86,17 @@ class AnalyticsConfig:
     enable_predictive_insights: bool = True
     real_time_updates: bool = True
 
+@dataclass
+class GenerationConfig:
+    """Policy answer generation settings (see tools.answer_generator)"""
+    backend: str = "keyword"
+    model_path: str = "models/qwen2.5-0.5b-instruct-q4_k_m.gguf"
+    server_url: str = "http://localhost:8080/v1"
+    server_model: str = "local"
+    max_tokens: int = 256
+    context_window: int = 2048
+    threads: int = 0
+
 class AppConfig:
     """Main application configuration class"""
     
@@ -85,7 +113,14 @@ class AppConfig:
             query_history_db=os.getenv("QUERY_HISTORY_DB", "data/query_history.db"),
             vector_store_path=os.getenv("VECTOR_STORE_PATH", "data/vector_store"),
             backup_enabled=os.getenv("BACKUP_ENABLED", "true").lower() == "true",
-            backup_interval_hours=int(os.getenv("BACKUP_INTERVAL_HOURS", "24"))
+            backup_interval_hours=int(os.getenv("BACKUP_INTERVAL_HOURS", "24")),
+            history_durability=os.getenv("HISTORY_DURABILITY", "normal"),
+            history_flush_rows=int(os.getenv("HISTORY_FLUSH_ROWS", "256")),
+            history_flush_ms=int(os.getenv("HISTORY_FLUSH_MS", "500")),
+            history_live_days=int(os.getenv("HISTORY_LIVE_DAYS", "90")),
+            history_archive_dir=os.getenv("HISTORY_ARCHIVE_DIR", "data/history_archive"),
+            backup_dir=os.getenv("BACKUP_DIR", "data/backups"),
+            backup_keep=int(os.getenv("BACKUP_KEEP", "7"))
         )
         
         # UI configuration
@@ -102,7 +137,18 @@ class AppConfig:
             cache_enabled=os.getenv("CACHE_ENABLED", "true").lower() == "true",
             cache_size_mb=int(os.getenv("CACHE_SIZE_MB", "100")),
             batch_processing_max_records=int(os.getenv("BATCH_MAX_RECORDS", "1000")),
-            query_timeout_seconds=int(os.getenv("QUERY_TIMEOUT", "30"))
+            query_timeout_seconds=int(os.getenv("QUERY_TIMEOUT", "30")),
+            max_concurrent_requests=int(os.getenv("MAX_CONCURRENT_REQUESTS", "10")),
+            query_cache_size=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+            query_cache_ttl_seconds=int(os.getenv("QUERY_CACHE_TTL", "3600")),
+            semantic_cache_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+            semantic_cache_size=int(os.getenv("SEMANTIC_CACHE_SIZE", "512")),
+            vector_index=os.getenv("VECTOR_INDEX", "auto"),
+            hybrid_retrieval=os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true",
+            retrieval_k=int(os.getenv("RETRIEVAL_K", "2")),
+            policy_batch_window_ms=float(os.getenv("POLICY_BATCH_WINDOW_MS", "5")),
+            policy_max_batch=int(os.getenv("POLICY_MAX_BATCH", "32")),
+            analytics_cache_ttl_seconds=int(os.getenv("ANALYTICS_CACHE_TTL", "300"))
         )
         
         # Security configuration
@@ -126,6 +172,17 @@ class AppConfig:
             real_time_updates=os.getenv("REAL_TIME_UPDATES", "true").lower() == "true"
         )
         
+        # Answer generation configuration
+        self.generation = GenerationConfig(
+            backend=os.getenv("LLM_BACKEND", "keyword"),
+            model_path=os.getenv("LLM_MODEL_PATH", "models/qwen2.5-0.5b-instruct-q4_k_m.gguf"),
+            server_url=os.getenv("LLM_SERVER_URL", "http://localhost:8080/v1"),
+            server_model=os.getenv("LLM_SERVER_MODEL", "local"),
+            max_tokens=int(os.getenv("LLM_MAX_TOKENS", "256")),
+            context_window=int(os.getenv("LLM_CONTEXT_WINDOW", "2048")),
+            threads=int(os.getenv("LLM_THREADS", "0"))
+        )
+        
         # Model configuration
         self.model_cache_dir = os.getenv("MODEL_CACHE_DIR", "models")
         self.embedding_model = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
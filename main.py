@@ -7,6 +7,8 @@ A dual-purpose agent for HTS policy questions and duty calculations
 import os
 import sys
 import argparse
+import csv
+import json
 from datetime import datetime
 
 # Add project root to path
@@ -14,20 +16,50 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from agent.tariff_bot import TariffBot
 
+def read_batch_items(path):
+    """Stream line items from a CSV, or queries from a text file, one at a time"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if path.lower().endswith('.csv'):
+            for row in csv.DictReader(f):
+                yield {key.strip().lower().replace(' ', '_'): value for key, value in row.items() if key}
+        else:
+            for line in f:
+                if line.strip():
+                    yield line.strip()
+
+def run_batch(bot, input_path, output_path):
+    """Write one JSON line per input item as results arrive"""
+    started = datetime.now()
+    count = errors = 0
+    with open(output_path, 'w', encoding='utf-8') as out:
+        for item, result in bot.process_batch(read_batch_items(input_path)):
+            count += 1
+            if isinstance(result, dict) and "error" in result:
+                errors += 1
+            out.write(json.dumps({"line": count, "input": item, "result": result}) + "\n")
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"✅ Processed {count} items ({errors} errors) in {elapsed:.1f}s -> {output_path}")
+
 def main():
     parser = argparse.ArgumentParser(description='HTS AI Agent - Trade Policy & Duty Calculator')
-    parser.add_argument('--mode', choices=['chat', 'query'], default='chat',
-                        help='Run in chat mode or single query mode')
+    parser.add_argument('--mode', choices=['chat', 'query', 'batch'], default='chat',
+                        help='Run in chat mode, single query mode or batch mode')
     parser.add_argument('--query', type=str, help='Single query to process')
+    parser.add_argument('--input', type=str,
+                        help='Batch input: a CSV of line items (see hts_batch_template.csv) or a text file with one query per line')
+    parser.add_argument('--output', type=str, default='results.jsonl', help='Batch output (JSON Lines)')
     parser.add_argument('--test', action='store_true', help='Run test queries')
     
     args = parser.parse_args()
+    if args.mode == 'batch' and not args.input:
+        parser.error('--mode batch requires --input')
     
     # Initialize the bot
     print(f"\n🤖 Starting HTS AI Agent at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
     try:
-        bot = TariffBot()
+        # Only interactive sessions pay for loading the policy model up front
+        bot = TariffBot(warm_up=args.mode == 'chat' and not args.query and not args.test)
         
         if args.test:
             # Run test queries
@@ -47,6 +79,9 @@ def main():
                 else:
                     print(f"✅ Result: {result}")
         
+        elif args.mode == 'batch':
+            run_batch(bot, args.input, args.output)
+        
         elif args.query:
             # Process single query
             result = bot.process_query(args.query)
@@ -13,39 +13,13 @@ from datetime import datetime
 from typing import Dict, List, Optional
 import re
 
-# Simple HTS database (same as in cli_simple.py)
-HTS_DATABASE = {
-    "0101.30.00.00": {
-        "description": "Live asses",
-        "duty_rate": 0.0,
-        "category": "Live Animals",
-        "units": "Number"
-    },
-    "0102.21.00.00": {
-        "description": "Live cattle, purebred breeding animals",
-        "duty_rate": 0.025,
-        "category": "Live Animals",
-        "units": "Number"
-    },
-    "0201.10.00.00": {
-        "description": "Beef carcasses and half-carcasses, fresh or chilled",
-        "duty_rate": 0.044,
-        "category": "Meat Products",
-        "units": "kg"
-    },
-    "0301.11.00.00": {
-        "description": "Ornamental fish",
-        "duty_rate": 0.0,
-        "category": "Fish",
-        "units": "Number"
-    },
-    "0401.10.00.00": {
-        "description": "Milk, not concentrated, not sweetened, fat content ≤ 1%",
-        "duty_rate": 0.038,
-        "category": "Dairy",
-        "units": "Liter"
-    }
-}
+from tools.tariff_provider import get_tariff_provider
+
+# Shared tariff schedule (same provider as cli_simple.py and the apps)
+HTS_DATABASE = get_tariff_provider()
+
+# Matches printed per search
+SEARCH_LIMIT = 25
 
 # Knowledge base for questions
 KNOWLEDGE_BASE = {
@@ -69,13 +43,14 @@ def answer_question(question):
             return f"💡 {answer}"
     
     # Check for HTS code specific questions
-    for hts_code, info in HTS_DATABASE.items():
-        if hts_code in question:
+    for hts_code in re.findall(r"\d{4}(?:\.\d{2}){0,3}", question):
+        if hts_code in HTS_DATABASE:
+            info = HTS_DATABASE[hts_code]
             return f"💡 HTS Code {hts_code}: {info['description']} | Duty Rate: {info['duty_rate']*100:.1f}% | Category: {info['category']}"
     
     return "❓ I don't have specific information about that. Try asking about GSP, HTS codes, duties, CIF, NAFTA/USMCA, or FTA."
 
-def calculate_duty(hts_code, product_cost, freight=0, insurance=0):
+def calculate_duty(hts_code, product_cost, freight=0, insurance=0, weight=0, quantity=1):
     """Calculate duty for given HTS code and costs"""
     # Calculate CIF value
     cif_value = product_cost + freight + insurance
@@ -83,11 +58,11 @@ def calculate_duty(hts_code, product_cost, freight=0, insurance=0):
     # Get HTS info
     hts_info = HTS_DATABASE.get(hts_code)
     if not hts_info:
-        return f"❌ HTS code {hts_code} not found. Available codes: {', '.join(HTS_DATABASE.keys())}"
+        return f"❌ HTS code {hts_code} not found among {len(HTS_DATABASE):,} codes. Use --search to find one."
     
-    # Calculate duty
-    duty_rate = hts_info["duty_rate"]
-    duty_amount = cif_value * duty_rate
+    # Calculate duty, including specific (per kg / per unit) components
+    duty_amount = HTS_DATABASE.duty(hts_code, cif_value, unit_weight=weight, quantity=quantity)
+    duty_rate = duty_amount / cif_value if cif_value else hts_info["duty_rate"]
     landed_cost = cif_value + duty_amount
     
     result = f"""
@@ -100,9 +75,11 @@ Category:      {hts_info['category']}
 Product Cost:  ${product_cost:,.2f}
 Freight:       ${freight:,.2f}
 Insurance:     ${insurance:,.2f}
+Weight:        {weight:,.2f} kg
+Quantity:      {quantity}
 CIF Value:     ${cif_value:,.2f}
 
-Duty Rate:     {duty_rate*100:.1f}%
+Duty Rate:     {duty_rate*100:.2f}%
 Duty Amount:   ${duty_amount:,.2f}
 Landed Cost:   ${landed_cost:,.2f}
 
@@ -127,12 +104,14 @@ def batch_calculate(csv_file: str) -> None:
                     product_cost = float(row['product_cost'])
                     freight = float(row.get('freight', 0))
                     insurance = float(row.get('insurance', 0))
+                    weight = float(row.get('weight') or 0)
+                    quantity = float(row.get('quantity') or 1)
                     
                     # Calculate duty
                     if hts_code in HTS_DATABASE:
                         duty_info = HTS_DATABASE[hts_code]
                         cif_value = product_cost + freight + insurance
-                        duty_amount = cif_value * duty_info['duty_rate']
+                        duty_amount = HTS_DATABASE.duty(hts_code, cif_value, unit_weight=weight, quantity=quantity)
                         total_cost = cif_value + duty_amount
                         
                         result = {
@@ -141,7 +120,7 @@ def batch_calculate(csv_file: str) -> None:
                             'description': duty_info['description'],
                             'product_cost': product_cost,
                             'cif_value': cif_value,
-                            'duty_rate': duty_info['duty_rate'],
+                            'duty_rate': duty_amount / cif_value if cif_value else duty_info['duty_rate'],
                             'duty_amount': duty_amount,
                             'total_cost': total_cost
                         }
@@ -179,7 +158,7 @@ def export_hts_database(format_type: str = 'json') -> None:
     if format_type.lower() == 'json':
         filename = f"hts_database_{timestamp}.json"
         with open(filename, 'w') as f:
-            json.dump(HTS_DATABASE, f, indent=2)
+            json.dump(dict(HTS_DATABASE), f, indent=2)
         print(f"📁 HTS database exported to: {filename}")
     
     elif format_type.lower() == 'csv':
@@ -205,14 +184,7 @@ def search_hts_codes(search_term: str) -> None:
     print(f"\n🔍 Searching for: '{search_term}'")
     print("-" * 60)
     
-    matches = []
-    search_lower = search_term.lower()
-    
-    for code, info in HTS_DATABASE.items():
-        if (search_lower in info['description'].lower() or 
-            search_lower in info['category'].lower() or
-            search_lower in code.lower()):
-            matches.append((code, info))
+    matches = [(code, HTS_DATABASE[code]) for code in HTS_DATABASE.search(search_term, limit=SEARCH_LIMIT)]
     
     if matches:
         print(f"Found {len(matches)} matches:")
@@ -249,12 +221,12 @@ def generate_template() -> None:
     filename = "hts_batch_template.csv"
     with open(filename, 'w', newline='') as f:
         writer = csv.writer(f)
-        writer.writerow(['hts_code', 'product_cost', 'freight', 'insurance', 'description'])
+        writer.writerow(['hts_code', 'product_cost', 'freight', 'insurance', 'weight', 'quantity', 'description'])
         
         # Add sample data
         sample_codes = list(HTS_DATABASE.keys())[:3]
         for code in sample_codes:
-            writer.writerow([code, '10000', '500', '100', f'Sample product for {code}'])
+            writer.writerow([code, '10000', '500', '100', '100', '1', f'Sample product for {code}'])
     
     print(f"📁 Batch template created: {filename}")
     print("Fill in your data and use --batch to process it")
@@ -310,7 +282,8 @@ Available HTS Codes:
     
     parser.add_argument('--query', '-q', help='Ask a question about trade policies')
     parser.add_argument('--chat', '-c', action='store_true', help='Start interactive chat mode')
-    parser.add_argument('--calc', nargs='+', help='Calculate duty: HTS_CODE PRODUCT_COST [FREIGHT] [INSURANCE]')
+    parser.add_argument('--calc', nargs='+',
+                        help='Calculate duty: HTS_CODE PRODUCT_COST [FREIGHT] [INSURANCE] [WEIGHT_KG] [QUANTITY]')
     parser.add_argument('--list', '-l', action='store_true', help='List available HTS codes')
     parser.add_argument('--search', '-s', help='Search HTS codes by keyword')
     parser.add_argument('--compare', nargs='+', help='Compare duty rates for multiple HTS codes')
@@ -337,7 +310,7 @@ Advanced Trade Intelligence & Duty Calculation Platform
     elif args.calc:
         # Handle duty calculation
         if len(args.calc) < 2:
-            print("❌ Usage: --calc HTS_CODE PRODUCT_COST [FREIGHT] [INSURANCE]")
+            print("❌ Usage: --calc HTS_CODE PRODUCT_COST [FREIGHT] [INSURANCE] [WEIGHT_KG] [QUANTITY]")
             sys.exit(1)
         
         try:
@@ -345,8 +318,10 @@ Advanced Trade Intelligence & Duty Calculation Platform
             product_cost = float(args.calc[1])
             freight = float(args.calc[2]) if len(args.calc) > 2 else 0
             insurance = float(args.calc[3]) if len(args.calc) > 3 else 0
+            weight = float(args.calc[4]) if len(args.calc) > 4 else 0
+            quantity = float(args.calc[5]) if len(args.calc) > 5 else 1
             
-            result = calculate_duty(hts_code, product_cost, freight, insurance)
+            result = calculate_duty(hts_code, product_cost, freight, insurance, weight, quantity)
             print(result)
         except ValueError:
             print("❌ Error: Please provide valid numbers for costs")
@@ -425,15 +400,17 @@ Advanced Trade Intelligence & Duty Calculation Platform
                 elif user_input.lower().startswith('calc'):
                     parts = user_input.split()
                     if len(parts) < 3:
-                        print("❌ Usage: calc <hts_code> <product_cost> [freight] [insurance]")
+                        print("❌ Usage: calc <hts_code> <product_cost> [freight] [insurance] [weight_kg] [quantity]")
                     else:
                         try:
                             hts_code = parts[1]
                             product_cost = float(parts[2])
                             freight = float(parts[3]) if len(parts) > 3 else 0
                             insurance = float(parts[4]) if len(parts) > 4 else 0
+                            weight = float(parts[5]) if len(parts) > 5 else 0
+                            quantity = float(parts[6]) if len(parts) > 6 else 1
                             
-                            result = calculate_duty(hts_code, product_cost, freight, insurance)
+                            result = calculate_duty(hts_code, product_cost, freight, insurance, weight, quantity)
                             print(result)
                         except ValueError:
                             print("❌ Error: Please provide valid numbers")
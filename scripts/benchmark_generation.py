@@ -0,0 +1,111 @@
+"""
+Benchmark: time-to-first-token and tokens/s of the policy answer generator.
+
+Runs the configured backend (LLM_BACKEND, or --backend) over a fixed set of
+policy questions, each with excerpts of the General Notes as context: chunks
+of data/vector_store when it has been built, otherwise a short built-in
+passage. Streamed pieces are counted as tokens, which is exact for llama.cpp
+and OpenAI-compatible servers.
+
+    python scripts/benchmark_generation.py --backend llama_cpp --model-path models/model.gguf
+    python scripts/benchmark_generation.py --backend server --server-url http://localhost:8080/v1
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import time
+from dataclasses import replace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.app_config import get_config
+from tools.answer_generator import GENERATOR_BACKENDS, get_generator
+from tools.rag_tool import CONTEXT_CHARS
+
+VECTOR_STORE_PATH = "data/vector_store"
+CONTEXT_CHUNKS = 2
+
+QUESTIONS = [
+    "What is the Generalized System of Preferences?",
+    "Which goods qualify for the United States-Israel Free Trade Agreement?",
+    "How are goods from Canada and Mexico treated under USMCA?",
+    "What are column 2 rates of duty?",
+    "When does subheading 9802.00.80 apply to assembled articles?",
+]
+
+FALLBACK_CONTEXT = (
+    "General Note 4. Products of countries designated as beneficiary developing countries for purposes "
+    "of the Generalized System of Preferences (GSP) are eligible for duty-free treatment when the rate "
+    "of duty column 1 special contains the symbol A, A* or A+. "
+    "General Note 8. Products of Israel are eligible for treatment under the United States-Israel Free "
+    "Trade Area Implementation Act when the Special subcolumn contains the symbol IL."
+)
+
+
+def contexts():
+    """One context per question, cycling through the store's chunks if it exists"""
+    try:
+        with open(os.path.join(VECTOR_STORE_PATH, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+    except OSError:
+        return [FALLBACK_CONTEXT] * len(QUESTIONS)
+    ids = list(index_to_docstore_id.values())
+    step = max(1, len(ids) // (len(QUESTIONS) * CONTEXT_CHUNKS))
+    return [
+        "\n".join(docstore.search(ids[(i * CONTEXT_CHUNKS + j) * step % len(ids)]).page_content[:CONTEXT_CHARS]
+                  for j in range(CONTEXT_CHUNKS))
+        for i in range(len(QUESTIONS))
+    ]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def run_benchmark(generator, runs):
+    # The first generation also loads the model; it is reported separately
+    start = time.perf_counter()
+    generator.generate(QUESTIONS[0], FALLBACK_CONTEXT)
+    print(f"backend {generator.cache_key}: first answer (including load) {time.perf_counter() - start:.2f} s")
+
+    ttft, rates, totals, tokens = [], [], [], 0
+    for _ in range(runs):
+        for question, context in zip(QUESTIONS, contexts()):
+            start = time.perf_counter()
+            first = None
+            count = 0
+            for _ in generator.stream(question, context):
+                if first is None:
+                    first = time.perf_counter() - start
+                count += 1
+            total = time.perf_counter() - start
+            ttft.append((first if first is not None else total) * 1000)
+            totals.append(total)
+            tokens += count
+            if count > 1 and total > first:
+                # Decode rate, after the prompt has been processed
+                rates.append((count - 1) / (total - first))
+
+    print(f"{len(ttft)} answers, {tokens} tokens")
+    print(f"time to first token  p50 {percentile(ttft, 0.5):8.1f} ms   p95 {percentile(ttft, 0.95):8.1f} ms")
+    if rates:
+        print(f"decode rate          p50 {percentile(rates, 0.5):8.1f} tok/s p5  {percentile(rates, 0.05):8.1f} tok/s")
+    print(f"overall              {tokens / sum(totals):8.1f} tok/s   {sum(totals) / len(totals):8.2f} s per answer")
+
+
+if __name__ == "__main__":
+    config = get_config().generation
+    parser = argparse.ArgumentParser(description="Time-to-first-token and tokens/s of the answer generator")
+    parser.add_argument("--backend", choices=GENERATOR_BACKENDS, default=config.backend)
+    parser.add_argument("--model-path", default=config.model_path, help="GGUF model for the llama_cpp backend")
+    parser.add_argument("--server-url", default=config.server_url, help="Base URL for the server backend")
+    parser.add_argument("--max-tokens", type=int, default=config.max_tokens)
+    parser.add_argument("--threads", type=int, default=config.threads, help="CPU threads (0: llama.cpp default)")
+    parser.add_argument("--runs", type=int, default=2, help="Passes over the question set")
+    args = parser.parse_args()
+    config = replace(config, backend=args.backend, model_path=args.model_path, server_url=args.server_url,
+                     max_tokens=args.max_tokens, threads=args.threads)
+    run_benchmark(get_generator(config), args.runs)
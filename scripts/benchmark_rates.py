@@ -0,0 +1,74 @@
+"""
+Microbenchmark: compiled duty rates vs. the legacy per-call regex parser.
+
+Prices every rate string stored in hts_data several times over, once with the
+regex path TariffCalculator.parse_duty_advanced used to run on every call and
+once with tools.rate_compiler (parse once, evaluate many).
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.rate_compiler import compile_rate, rate_cache_info, clear_rate_cache
+
+DB_PATH = "data/hts.db"
+ROUNDS = 50
+
+
+def legacy_parse(duty_str, unit_weight=None, quantity=None, cif_value=1.0):
+    """The pre-compiler implementation, kept verbatim as the baseline"""
+    if duty_str is None or duty_str.strip() == "":
+        return 0.0
+    duty_str = duty_str.strip().lower()
+    if "free" in duty_str:
+        return 0.0
+    match = re.search(r"([\d.]+)\s*%", duty_str)
+    if match:
+        return float(match.group(1)) / 100
+    match = re.search(r"([\d.]+)\s*¢/kg", duty_str)
+    if match and unit_weight is not None:
+        return (float(match.group(1)) * unit_weight) / (100 * cif_value)
+    match = re.search(r"\$([\d.]+)/unit", duty_str)
+    if match and quantity is not None:
+        return (float(match.group(1)) * quantity) / cif_value
+    return 0.0
+
+
+def load_rate_strings(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        'SELECT "General Rate of Duty", "Special Rate of Duty", "Column 2 Rate of Duty" FROM hts_data'
+    ).fetchall()
+    conn.close()
+    return [value for row in rows for value in row if value]
+
+
+def run_benchmark(rounds=ROUNDS):
+    rates = load_rate_strings()
+    workload = rates * rounds
+    print(f"Pricing {len(workload):,} rate evaluations ({len(set(rates))} distinct strings)")
+
+    start = time.perf_counter()
+    for raw in workload:
+        legacy_parse(raw, 500, 5, 10600.0)
+    legacy_seconds = time.perf_counter() - start
+
+    clear_rate_cache()
+    start = time.perf_counter()
+    for raw in workload:
+        compile_rate(raw).evaluate(10600.0, 500, 5)
+    compiled_seconds = time.perf_counter() - start
+
+    print(f"Legacy regex path:   {legacy_seconds * 1000:8.1f} ms")
+    print(f"Compiled rate path:  {compiled_seconds * 1000:8.1f} ms")
+    print(f"Speedup:             {legacy_seconds / compiled_seconds:8.1f}x")
+    print(f"Rate cache:          {rate_cache_info()}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
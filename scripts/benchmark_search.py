@@ -0,0 +1,90 @@
+"""
+Benchmark: search latency as the schedule grows.
+
+Replicates Section I under synthetic chapter numbers, with a distinct
+vocabulary per copy, until the schedule is the size of the full HTS (~30k
+lines), then times the FTS5 search index against the LIKE scan
+HTSDataProcessor.search_hts used to run.
+"""
+
+import csv
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.hts_index import HTSScheduleIndex, SCHEDULE_COLUMNS
+from tools.hts_search import HTSSearchIndex
+
+SECTION_I = "data/hts_csvs/section_i.csv"
+SIZES = [2_000, 8_000, 30_000]
+QUERIES = ["bovine", "veal", "live horses", "frozen fish fillets", "milk cream", "hair", "bovi", "zeppelin"]
+ROUNDS = 30
+
+
+def synthetic_rows(base_rows, size):
+    rows = []
+    copy = 0
+    while len(rows) < size:
+        for row in base_rows:
+            row = dict(row)
+            code = row.get("HTS Number")
+            if code:
+                # Shift into a distinct chapter per copy so codes stay unique
+                row["HTS Number"] = f"{(int(code[:2]) + copy * 5) % 100:02d}{code[2:]}"
+            if copy and row.get("Description"):
+                # Later copies stand in for other chapters' products
+                row["Description"] = " ".join(f"c{copy}{word}" for word in row["Description"].split())
+            rows.append(row)
+        copy += 1
+    return rows[:size]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def time_queries(search):
+    samples = []
+    for _ in range(ROUNDS):
+        for query in QUERIES:
+            start = time.perf_counter()
+            search(query)
+            samples.append((time.perf_counter() - start) * 1000)
+    return percentile(samples, 0.5), percentile(samples, 0.99)
+
+
+def run_benchmark():
+    with open(SECTION_I, encoding="utf-8-sig") as f:
+        base_rows = list(csv.DictReader(f))
+
+    print(f"{'lines':>8} {'LIKE p50':>10} {'LIKE p99':>10} {'FTS p50':>10} {'FTS p99':>10}  (ms)")
+    for size in SIZES:
+        rows = synthetic_rows(base_rows, size)
+        schedule = HTSScheduleIndex.from_rows(rows)
+        search_index = HTSSearchIndex.from_schedule(schedule)
+
+        conn = sqlite3.connect(":memory:")
+        conn.execute(f"CREATE TABLE hts_data ({', '.join(repr(col) for col in SCHEDULE_COLUMNS)})")
+        conn.executemany(
+            f"INSERT INTO hts_data VALUES ({', '.join('?' for _ in SCHEDULE_COLUMNS)})",
+            [tuple(row.get(col) for col in SCHEDULE_COLUMNS) for row in rows]
+        )
+
+        def like_search(keyword):
+            return conn.execute(
+                'SELECT "HTS Number", Description FROM hts_data WHERE Description LIKE ? LIMIT 10',
+                (f"%{keyword}%",)
+            ).fetchall()
+
+        like_p50, like_p99 = time_queries(like_search)
+        fts_p50, fts_p99 = time_queries(lambda query: search_index.search(query, limit=10))
+        print(f"{size:>8,} {like_p50:>10.3f} {like_p99:>10.3f} {fts_p50:>10.3f} {fts_p99:>10.3f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    run_benchmark()
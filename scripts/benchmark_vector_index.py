@@ -0,0 +1,102 @@
+"""
+Benchmark: recall against latency for the policy vector store index types.
+
+Uses the vectors of data/vector_store when it has been built, replicated with
+noise up to the requested size, otherwise clustered synthetic vectors of the
+same dimension as all-MiniLM-L6-v2. Every configuration is compared with the
+exact flat index on the same queries: recall@k is the share of the true top k
+it returns.
+
+    python scripts/benchmark_vector_index.py --size 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import faiss
+import numpy as np
+
+from tools.vector_index import apply_search_params, create_index, flat_vectors
+
+VECTOR_STORE_PATH = "data/vector_store"
+DIMENSION = 384
+QUERY_COUNT = 200
+K = 10
+
+CONFIGS = [
+    ("hnsw", {"M": 16}, [{"efSearch": 16}, {"efSearch": 64}, {"efSearch": 128}]),
+    ("hnsw", {"M": 32}, [{"efSearch": 32}, {"efSearch": 64}, {"efSearch": 128}]),
+    ("ivfpq", {}, [{"nprobe": 4}, {"nprobe": 16}, {"nprobe": 64}]),
+    ("ivfpq", {"nbits": 8, "m": 96}, [{"nprobe": 16}, {"nprobe": 64}]),
+]
+
+
+def corpus_vectors(size, seed=0):
+    rng = np.random.default_rng(seed)
+    flat_path = os.path.join(VECTOR_STORE_PATH, "index.faiss")
+    if os.path.exists(flat_path):
+        base = flat_vectors(faiss.read_index(flat_path)).astype(np.float32)
+    else:
+        centers = rng.normal(size=(64, DIMENSION)).astype(np.float32)
+        base = centers[rng.integers(0, len(centers), size)] + 0.5 * rng.normal(size=(size, DIMENSION))
+    copies = [base]
+    while sum(len(c) for c in copies) < size:
+        # Perturbed copies stand in for the rest of a larger corpus
+        copies.append(base + 0.05 * base.std() * rng.normal(size=base.shape))
+    return np.ascontiguousarray(np.concatenate(copies)[:size], dtype=np.float32)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def time_search(index, queries):
+    samples = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), K)
+        samples.append((time.perf_counter() - start) * 1000)
+        results.append(ids[0])
+    return np.array(results), percentile(samples, 0.5), percentile(samples, 0.99)
+
+
+def recall(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def run_benchmark(size):
+    vectors = corpus_vectors(size)
+    rng = np.random.default_rng(1)
+    sample = vectors[rng.choice(len(vectors), QUERY_COUNT, replace=False)]
+    queries = (sample + 0.1 * sample.std() * rng.normal(size=sample.shape)).astype(np.float32)
+
+    flat, _ = create_index(vectors, "flat")
+    truth, flat_p50, flat_p99 = time_search(flat, queries)
+    flat_mb = faiss.serialize_index(flat).nbytes / 1e6
+
+    print(f"{len(vectors):,} vectors, d={vectors.shape[1]}, {QUERY_COUNT} queries, recall@{K}")
+    print(f"{'index':<56} {'recall':>7} {'p50 ms':>8} {'p99 ms':>8} {'MB':>8} {'build s':>8}")
+    print(f"{'flat':<56} {1.0:>7.3f} {flat_p50:>8.3f} {flat_p99:>8.3f} {flat_mb:>8.1f} {'-':>8}")
+    for index_type, params, searches in CONFIGS:
+        start = time.perf_counter()
+        index, effective = create_index(vectors, index_type, params)
+        build_seconds = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+        for search in searches:
+            apply_search_params(index, search)
+            found, p50, p99 = time_search(index, queries)
+            label = f"{index_type} {effective} {search}".replace("'", "")
+            print(f"{label:<56} {recall(found, truth):>7.3f} {p50:>8.3f} {p99:>8.3f} "
+                  f"{size_mb:>8.1f} {build_seconds:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs latency of flat, HNSW and IVF-PQ indexes")
+    parser.add_argument("--size", type=int, default=50_000, help="Number of vectors to index")
+    run_benchmark(parser.parse_args().size)
@@ -1,19 +1,16 @@
-import pandas as pd
 import os
-import glob
+import sys
 
-input_folder = "data/hts_csvs"
-output_file = os.path.join(input_folder, "section_i.csv")
-
-# Get all CSV files matching pattern 'htsdata*.csv'
-csv_files = glob.glob(os.path.join(input_folder, "htsdata*.csv"))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-dfs = []
-for file in csv_files:
-    df = pd.read_csv(file)
-    dfs.append(df)
+from scripts.ingest_hts import HTSIngestPipeline
 
-combined_df = pd.concat(dfs, ignore_index=True)
-combined_df.to_csv(output_file, index=False)
+input_folder = "data/hts_csvs"
+output_file = os.path.join(input_folder, "section_i.csv")
 
-print(f"Combined Section I CSV saved to {output_file}")
+# Concatenate the 'htsdata*.csv' parts, skipped when no part has changed
+pipeline = HTSIngestPipeline(csv_dir=input_folder)
+if pipeline.combine_parts(output=os.path.basename(output_file)):
+    print(f"Combined Section I CSV saved to {output_file}")
+else:
+    print(f"{output_file} is up to date")
@@ -0,0 +1,351 @@
+"""
+Parallel ingestion of a PDF corpus (General Notes, chapter notes, CBP rulings,
+CSMS messages) into the policy vector store.
+
+    extract   page ranges of every PDF are read in a process pool, at most a
+              few ranges ahead of the consumer
+    chunk     pages are split into chunks as they arrive (a generator)
+    embed     batches of new chunks go through a bounded queue to N worker
+              processes; each loads the model once, commits its embeddings to
+              the shared embedding cache and builds its own FAISS shard
+    merge     the shards are merged into data/vector_store at the end
+
+Chunks use the same ids and embedding cache as scripts/ingest_data.py, so the
+pipeline is incremental in the same way: chunks already in the store are
+skipped, chunks whose text was embedded before are added from the cache, and
+chunks of PDFs that are gone are deleted.
+"""
+
+import argparse
+import multiprocessing
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import FAISS
+
+from config.app_config import get_config
+from scripts.ingest_data import (
+    CHUNK_OVERLAP, CHUNK_SIZE, EMBEDDING_CACHE_PATH, VECTOR_STORE_PATH,
+    EmbeddingCache, LazyEmbeddings, add_index_arguments, apply_index_arguments, chunk_id, save_store, text_hash
+)
+
+CORPUS_DIRS = ("data/general_notes", "data/corpus")
+PAGES_PER_TASK = 16
+REPORT_INTERVAL = 5.0
+
+
+def discover_pdfs(directories: Iterable[str] = CORPUS_DIRS) -> List[str]:
+    paths = []
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+    return sorted(paths)
+
+
+def page_count(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def extract_pages(path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """(page number, text) for a range of pages; runs in the extraction pool"""
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [(number, reader.pages[number].extract_text()) for number in range(start, stop)]
+
+
+def _embed_worker(worker_id, embedding_model, cache_path, shard_dir, tasks, results):
+    """Embed batches from the task queue into a shard until a None arrives"""
+    model_name = getattr(embedding_model, "model_name", type(embedding_model).__name__)
+    cache = EmbeddingCache(cache_path, model_name)
+    shard = None
+    while True:
+        batch = tasks.get()
+        if batch is None:
+            break
+        ids, texts, metadatas = batch
+        vectors = embedding_model.embed_documents(texts)
+        # Committed per batch: an interrupted run resumes from the cache
+        cache.put_many((text_hash(text), vector) for text, vector in zip(texts, vectors))
+        pairs = list(zip(texts, vectors))
+        if shard is None:
+            shard = FAISS.from_embeddings(pairs, embedding_model, metadatas=metadatas, ids=ids)
+        else:
+            shard.add_embeddings(pairs, metadatas=metadatas, ids=ids)
+        results.put(("embedded", worker_id, len(ids)))
+    path = None
+    if shard is not None:
+        path = os.path.join(shard_dir, f"shard_{worker_id}")
+        shard.save_local(path)
+    results.put(("done", worker_id, path))
+
+
+def _run_worker(threads: int, *args):
+    # Keep each worker's BLAS/torch pool to its share of the cores
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(name, str(threads))
+    _embed_worker(*args)
+
+
+def _check_workers(workers):
+    failed = [worker.name for worker in workers if worker.exitcode not in (None, 0)]
+    if failed:
+        raise RuntimeError(f"Embedding worker(s) {', '.join(failed)} exited unexpectedly")
+
+
+def _put(tasks, item, workers):
+    """Put on the bounded queue, waiting for room unless the workers have died"""
+    while True:
+        try:
+            tasks.put(item, timeout=1.0)
+            return
+        except queue.Full:
+            _check_workers(workers)
+
+
+class ProgressReport:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.pages = 0
+        self.chunks = 0
+        self.embedded = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def summary(self) -> str:
+        elapsed = max(self.elapsed, 1e-9)
+        return (f"{self.pages} pages ({self.pages / elapsed:.1f}/s), "
+                f"{self.chunks} chunks ({self.chunks / elapsed:.1f}/s), "
+                f"{self.embedded} embedded ({self.embedded / elapsed:.1f}/s)")
+
+    def tick(self):
+        now = time.perf_counter()
+        if now - self.last >= REPORT_INTERVAL:
+            self.last = now
+            print(f"  {self.summary()}")
+
+
+class CorpusIngestPipeline:
+    def __init__(self, vector_store_path: str = VECTOR_STORE_PATH, cache_path: str = EMBEDDING_CACHE_PATH,
+                 embed_workers: Optional[int] = None, extract_workers: Optional[int] = None,
+                 batch_size: Optional[int] = None, queue_size: Optional[int] = None, embedding_model=None):
+        cpus = os.cpu_count() or 1
+        self.vector_store_path = vector_store_path
+        self.cache_path = cache_path
+        self.embed_workers = embed_workers or max(1, cpus // 2)
+        self.extract_workers = extract_workers or max(1, cpus - self.embed_workers)
+        self.batch_size = batch_size or get_config().performance.embedding_batch_size
+        # Batches waiting for a worker; producers block when it is full
+        self.queue_size = queue_size or 2 * self.embed_workers
+        self.embedding_model = embedding_model or LazyEmbeddings()
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        self.report = ProgressReport()
+
+    def pages(self, pdf_paths: Iterable[str]) -> Iterator[Document]:
+        """Pages of every PDF as they are extracted, with a bounded number of ranges in flight"""
+        ranges = ((path, start, min(start + PAGES_PER_TASK, count))
+                  for path in pdf_paths
+                  for count in (page_count(path),)
+                  for start in range(0, count, PAGES_PER_TASK))
+        with ProcessPoolExecutor(self.extract_workers) as pool:
+            pending = {}
+            for task in ranges:
+                pending[pool.submit(extract_pages, *task)] = task
+                if len(pending) < 2 * self.extract_workers:
+                    continue
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from self._page_documents(pending.pop(future)[0], future.result())
+            for future in list(pending):
+                yield from self._page_documents(pending.pop(future)[0], future.result())
+
+    def _page_documents(self, path: str, pages: List[Tuple[int, str]]) -> Iterator[Document]:
+        for number, text in pages:
+            self.report.pages += 1
+            yield Document(page_content=text or "", metadata={"source": path, "page": number})
+
+    def chunks(self, pages: Iterable[Document]) -> Iterator[Document]:
+        for page in pages:
+            for chunk in self.splitter.split_documents([page]):
+                self.report.chunks += 1
+                yield chunk
+
+    def run(self, pdf_paths: Optional[Iterable[str]] = None) -> Dict[str, object]:
+        pdf_paths = discover_pdfs() if pdf_paths is None else list(pdf_paths)
+        return self.ingest_pages(self.pages(pdf_paths))
+
+    def ingest_pages(self, pages: Iterable[Document]) -> Dict[str, object]:
+        """Chunk, embed and index a stream of pages.
+
+        Chunks that were indexed from the same sources but are no longer in
+        them, or whose source file is gone, are removed.
+        """
+        model = self.embedding_model
+        model_name = getattr(model, "model_name", type(model).__name__)
+        cache = EmbeddingCache(self.cache_path, model_name)
+
+        store = None
+        if os.path.exists(os.path.join(self.vector_store_path, "index.faiss")):
+            store = FAISS.load_local(self.vector_store_path, model, allow_dangerous_deserialization=True)
+        existing = set(store.index_to_docstore_id.values()) if store is not None else set()
+
+        context = multiprocessing.get_context("spawn")
+        tasks = context.Queue(self.queue_size)
+        results = context.Queue()
+        shard_dir = tempfile.mkdtemp(prefix="hts_shards_")
+        threads = max(1, (os.cpu_count() or 1) // self.embed_workers)
+        workers = [
+            context.Process(target=_run_worker, args=(threads, i, model, self.cache_path, shard_dir, tasks, results))
+            for i in range(self.embed_workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        seen = set()
+        sources = set()
+        added = from_cache = 0
+        batch: List[Document] = []
+        try:
+            for chunk in self.chunks(pages):
+                sources.add(chunk.metadata.get("source"))
+                doc_id = chunk_id(chunk)
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                if doc_id in existing:
+                    continue
+                added += 1
+                batch.append(chunk)
+                if len(batch) >= self.batch_size:
+                    store, count = self._dispatch(batch, store, cache, tasks, workers)
+                    from_cache += count
+                    batch = []
+                    self._drain(results)
+                self.report.tick()
+            if batch:
+                store, count = self._dispatch(batch, store, cache, tasks, workers)
+                from_cache += count
+        finally:
+            for _ in workers:
+                _put(tasks, None, workers)
+
+        shards = []
+        finished = 0
+        while finished < len(workers):
+            try:
+                kind, _, value = results.get(timeout=1.0)
+            except queue.Empty:
+                _check_workers(workers)
+                continue
+            if kind == "embedded":
+                self.report.embedded += value
+            else:
+                finished += 1
+                if value:
+                    shards.append(value)
+        for worker in workers:
+            worker.join()
+
+        for path in shards:
+            shard = FAISS.load_local(path, model, allow_dangerous_deserialization=True)
+            if store is None:
+                store = shard
+            else:
+                store.merge_from(shard)
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+        removed = []
+        for doc_id in existing - seen:
+            source = store.docstore.search(doc_id).metadata.get("source")
+            if source in sources or not (source and os.path.exists(source)):
+                removed.append(doc_id)
+        if store is not None and removed:
+            store.delete(removed)
+        if store is not None and (added or removed):
+            save_store(store, self.vector_store_path)
+
+        return {
+            "pages": self.report.pages,
+            "chunks": len(seen),
+            "added": added,
+            "removed": len(removed),
+            "embedded": self.report.embedded,
+            "from_cache": from_cache,
+            "seconds": self.report.elapsed,
+            "report": self.report.summary(),
+        }
+
+    def _dispatch(self, batch: List[Document], store, cache: EmbeddingCache, tasks, workers):
+        """Queue the chunks that need embedding and add the ones the cache already has"""
+        known = cache.get_many({text_hash(doc.page_content) for doc in batch})
+        fresh = [doc for doc in batch if text_hash(doc.page_content) not in known]
+        if fresh:
+            _put(tasks, ([chunk_id(doc) for doc in fresh],
+                         [doc.page_content for doc in fresh],
+                         [doc.metadata for doc in fresh]), workers)
+
+        cached = [doc for doc in batch if text_hash(doc.page_content) in known]
+        if cached:
+            pairs = [(doc.page_content, known[text_hash(doc.page_content)]) for doc in cached]
+            metadatas = [doc.metadata for doc in cached]
+            ids = [chunk_id(doc) for doc in cached]
+            if store is None:
+                store = FAISS.from_embeddings(pairs, self.embedding_model, metadatas=metadatas, ids=ids)
+            else:
+                store.add_embeddings(pairs, metadatas=metadatas, ids=ids)
+        return store, len(cached)
+
+    def _drain(self, results):
+        """Collect progress reported so far without blocking"""
+        while True:
+            try:
+                _, _, count = results.get_nowait()
+            except queue.Empty:
+                return
+            # Workers only report "done" after their sentinel, which comes later
+            self.report.embedded += count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a PDF corpus into the policy vector store")
+    parser.add_argument("paths", nargs="*", help=f"PDF files or directories (default: {', '.join(CORPUS_DIRS)})")
+    parser.add_argument("--vector-store", default=VECTOR_STORE_PATH)
+    parser.add_argument("--embed-workers", type=int, default=None)
+    parser.add_argument("--extract-workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Chunks per embedding batch (default: PerformanceConfig.embedding_batch_size)")
+    parser.add_argument("--queue-size", type=int, default=None, help="Batches buffered ahead of the embedding workers")
+    add_index_arguments(parser)
+    args = parser.parse_args()
+
+    files = [path for path in args.paths if os.path.isfile(path)]
+    directories = [path for path in args.paths if os.path.isdir(path)]
+    pdf_paths = sorted(files + discover_pdfs(directories)) if args.paths else discover_pdfs()
+
+    pipeline = CorpusIngestPipeline(args.vector_store, embed_workers=args.embed_workers,
+                                    extract_workers=args.extract_workers, batch_size=args.batch_size,
+                                    queue_size=args.queue_size)
+    print(f"Ingesting {len(pdf_paths)} PDFs with {pipeline.extract_workers} extraction and "
+          f"{pipeline.embed_workers} embedding workers...")
+    stats = pipeline.run(pdf_paths)
+    print(f"Done in {stats['seconds']:.1f}s: {stats['report']}")
+    print(f"Vector store at {args.vector_store}: {stats['chunks']} chunks, "
+          f"+{stats['added']} ({stats['from_cache']} from cache) / -{stats['removed']}")
+    apply_index_arguments(args, args.vector_store)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,31 @@
+"""
+Incremental General Notes ingestion into the policy vector store.
+
+Every chunk is identified by a hash of its text and page, which is also its id
+in the FAISS docstore. Re-ingesting compares the chunks of the current PDF
+with the ids already in data/vector_store:
+
+    removed chunks   deleted from the index in place
+    new chunks       embedded in batches (PerformanceConfig.embedding_batch_size)
+                     and added to the index in place
+
+Chunk embeddings are kept in an SQLite cache keyed by a hash of the text, and
+each batch is committed as soon as it is embedded. A chunk whose text was seen
+before, for example one that only moved to another page, is never embedded
+again, and an interrupted run resumes where it stopped. The embedding model is
+only loaded if there is something new to embed.
+
+Saving the store also refreshes its derived indexes: the approximate FAISS
+index, if one was built, and the BM25 keyword index (tools.sparse_index).
+"""
+
+import argparse
+import hashlib
+import json
 import os
+import sys
+import time
+from array import array
 
 # Configure model storage location on D: drive
 MODEL_CACHE_DIR = r"D:\Project\HTS AI Agent\models"
@@ -6,66 +33,230 @@ os.environ['HF_HOME'] = MODEL_CACHE_DIR
 os.environ['TRANSFORMERS_CACHE'] = os.path.join(MODEL_CACHE_DIR, "hub")
 os.environ['SENTENCE_TRANSFORMERS_HOME'] = os.path.join(MODEL_CACHE_DIR, "sentence-transformers")
 
-# Create model directories if they don't exist
-os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Now import the libraries (after setting environment variables)
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
 
+from config.app_config import get_config
+from tools.db_pool import get_pool
+from tools.sparse_index import sync_sparse_index
+from tools.vector_index import INDEX_TYPES, build_ann_index, refresh_ann_index
+
 # Paths
-PDF_PATH = "data/general_notes/general_notes.pdf"
+PDF_PATH = "data/general_notes/General Notes.pdf"
 VECTOR_STORE_PATH = "data/vector_store"
+EMBEDDING_CACHE_PATH = "data/embedding_cache.db"
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(doc):
+    """Docstore id of a chunk: its text plus where it came from"""
+    payload = json.dumps([doc.page_content, doc.metadata], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
 
-def embed_in_batches(embedding_model, chunks, batch_size=64):
-    all_embeddings = []
-    texts = [doc.page_content for doc in chunks]
+class LazyEmbeddings(Embeddings):
+    """The HuggingFace model, loaded the first time something is embedded"""
+
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        self.model_name = model_name
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            from langchain_huggingface import HuggingFaceEmbeddings
+            print("Loading embedding model...")
+            print(f"Models will be stored at: {MODEL_CACHE_DIR}")
+            os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+            self._model = HuggingFaceEmbeddings(model_name=self.model_name, cache_folder=MODEL_CACHE_DIR)
+        return self._model
+
+    def embed_documents(self, texts):
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.model.embed_query(text)
+
+
+class EmbeddingCache:
+    """Chunk embeddings keyed by text hash, committed batch by batch"""
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, model_name=EMBEDDING_MODEL):
+        self.pool = get_pool(path)
+        self.model_name = model_name
+        with self.pool.writer() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_embeddings (
+                    model TEXT,
+                    text_hash TEXT,
+                    embedding BLOB,
+                    PRIMARY KEY (model, text_hash)
+                )
+            """)
+
+    def get_many(self, hashes):
+        found = {}
+        hashes = list(hashes)
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(hashes), 500):
+            batch = hashes[i:i + 500]
+            rows = self.pool.execute(
+                f"SELECT text_hash, embedding FROM chunk_embeddings "
+                f"WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                (self.model_name, *batch)
+            )
+            found.update((key, array("f", blob).tolist()) for key, blob in rows)
+        return found
+
+    def put_many(self, items):
+        with self.pool.writer() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunk_embeddings (model, text_hash, embedding) VALUES (?, ?, ?)",
+                ((self.model_name, key, array("f", embedding).tobytes()) for key, embedding in items)
+            )
+
+
+def embed_in_batches(embedding_model, texts, batch_size=64):
+    """Yield (texts, embeddings) one batch at a time"""
     for i in range(0, len(texts), batch_size):
         batch = texts[i:i + batch_size]
-        batch_embeddings = embedding_model.embed_documents(batch)
-        all_embeddings.extend(batch_embeddings)
-    return all_embeddings
+        yield batch, embedding_model.embed_documents(batch)
+
 
-def ingest_general_notes():
+def load_chunks(pdf_path=PDF_PATH):
     print("Loading PDF...")
-    loader = PyPDFLoader(PDF_PATH)
-    documents = loader.load()
+    documents = PyPDFLoader(pdf_path).load()
 
     print("Splitting into chunks...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    texts = text_splitter.split_documents(documents)
-
-    print("Loading embedding model...")
-    print(f"Models will be stored at: {MODEL_CACHE_DIR}")
-    
-    # Explicitly set cache folder for the embedding model
-    embedding_model = HuggingFaceEmbeddings(
-        model_name="all-MiniLM-L6-v2",
-        cache_folder=MODEL_CACHE_DIR
-    )
-
-    print("Embedding chunks and building FAISS vector store...")
-    vector_store = FAISS.from_texts(
-        texts=[t.page_content for t in texts],
-        embedding=embedding_model,
-        metadatas=[t.metadata for t in texts]
-    )
-
-    os.makedirs(VECTOR_STORE_PATH, exist_ok=True)
-    vector_store.save_local(VECTOR_STORE_PATH)
-    print(f"FAISS vector store saved to {VECTOR_STORE_PATH}")
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return text_splitter.split_documents(documents)
+
+
+def save_store(store, vector_store_path=VECTOR_STORE_PATH):
+    """Write the store and bring the indexes derived from it up to date"""
+    os.makedirs(vector_store_path, exist_ok=True)
+    store.save_local(vector_store_path)
+    refresh_ann_index(vector_store_path)
+    sync_sparse_index(vector_store_path, store.docstore, store.index_to_docstore_id)
+
+
+def ingest_documents(chunks, vector_store_path=VECTOR_STORE_PATH, embedding_model=None,
+                     cache_path=EMBEDDING_CACHE_PATH, batch_size=None):
+    """Bring the vector store in line with chunks, embedding only what is new"""
+    start = time.perf_counter()
+    embedding_model = embedding_model or LazyEmbeddings()
+    batch_size = batch_size or get_config().performance.embedding_batch_size
+    cache = EmbeddingCache(cache_path, getattr(embedding_model, "model_name", type(embedding_model).__name__))
+
+    wanted = {}
+    for doc in chunks:
+        wanted.setdefault(chunk_id(doc), doc)
+
+    store = None
+    if os.path.exists(os.path.join(vector_store_path, "index.faiss")):
+        store = FAISS.load_local(vector_store_path, embedding_model, allow_dangerous_deserialization=True)
+    existing = set(store.index_to_docstore_id.values()) if store is not None else set()
+
+    removed = [doc_id for doc_id in existing if doc_id not in wanted]
+    added = [doc_id for doc_id in wanted if doc_id not in existing]
+    if store is not None and removed:
+        store.delete(removed)
+
+    # Embed the texts the cache has never seen, committing each batch
+    hashes = {doc_id: text_hash(wanted[doc_id].page_content) for doc_id in added}
+    embeddings = cache.get_many(set(hashes.values()))
+    missing = sorted({key: wanted[doc_id].page_content
+                      for doc_id, key in hashes.items() if key not in embeddings}.items())
+    embedded = 0
+    for texts, vectors in embed_in_batches(embedding_model, [text for _, text in missing], batch_size):
+        batch = [(text_hash(text), vector) for text, vector in zip(texts, vectors)]
+        cache.put_many(batch)
+        embeddings.update(batch)
+        embedded += len(batch)
+        print(f"  embedded {embedded}/{len(missing)} new chunks")
+
+    if added:
+        text_embeddings = [(wanted[doc_id].page_content, embeddings[hashes[doc_id]]) for doc_id in added]
+        metadatas = [wanted[doc_id].metadata for doc_id in added]
+        if store is None:
+            store = FAISS.from_embeddings(text_embeddings, embedding_model, metadatas=metadatas, ids=added)
+        else:
+            store.add_embeddings(text_embeddings, metadatas=metadatas, ids=added)
+
+    if store is not None and (added or removed):
+        save_store(store, vector_store_path)
+
+    return {
+        "chunks": len(wanted),
+        "added": len(added),
+        "removed": len(removed),
+        "embedded": embedded,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def ingest_general_notes(pdf_path=PDF_PATH, vector_store_path=VECTOR_STORE_PATH, batch_size=None):
+    stats = ingest_documents(load_chunks(pdf_path), vector_store_path, batch_size=batch_size)
+    print(f"Vector store at {vector_store_path}: {stats['chunks']} chunks, "
+          f"+{stats['added']} / -{stats['removed']}, {stats['embedded']} embedded "
+          f"in {stats['seconds']:.1f}s")
+    return stats
+
+
+def _key_values(pairs):
+    params = {}
+    for pair in pairs or []:
+        key, _, value = pair.partition("=")
+        params[key] = float(value) if "." in value else int(value)
+    return params
+
+
+def add_index_arguments(parser):
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=None,
+                        help="Build an approximate index for RAGTool to load (flat removes it)")
+    parser.add_argument("--index-param", action="append", metavar="KEY=VALUE",
+                        help="Build parameter, e.g. M=32 efConstruction=200 (hnsw), nlist=256 m=48 nbits=8 (ivfpq)")
+    parser.add_argument("--search-param", action="append", metavar="KEY=VALUE",
+                        help="Search parameter, e.g. efSearch=64 (hnsw), nprobe=16 (ivfpq)")
+
+
+def apply_index_arguments(args, vector_store_path):
+    if args.index_type:
+        meta = build_ann_index(vector_store_path, args.index_type,
+                               _key_values(args.index_param), _key_values(args.search_param))
+        print(f"Search index: {meta['type']} {meta.get('params', '')} {meta.get('search', '')}")
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest the HTS General Notes into the policy vector store")
+    parser.add_argument("--pdf", default=PDF_PATH)
+    parser.add_argument("--vector-store", default=VECTOR_STORE_PATH)
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Chunks per embedding batch (default: PerformanceConfig.embedding_batch_size)")
+    add_index_arguments(parser)
+    args = parser.parse_args()
+
     os.makedirs("data/general_notes", exist_ok=True)
-    os.makedirs("data/vector_store", exist_ok=True)
-    
+    os.makedirs(args.vector_store, exist_ok=True)
+
     # Print cache locations for verification
     print("Cache Configuration:")
     print(f"HF_HOME: {os.environ.get('HF_HOME')}")
     print(f"TRANSFORMERS_CACHE: {os.environ.get('TRANSFORMERS_CACHE')}")
     print(f"SENTENCE_TRANSFORMERS_HOME: {os.environ.get('SENTENCE_TRANSFORMERS_HOME')}")
     print("-" * 50)
-    
-    ingest_general_notes()
\ No newline at end of file
+
+    ingest_general_notes(args.pdf, args.vector_store, args.batch_size)
+    apply_index_arguments(args, args.vector_store)
@@ -0,0 +1,357 @@
+"""
+Incremental, parallel ingestion of the HTS section CSVs into data/hts.db.
+
+Each section_*.csv is hashed and skipped when unchanged since the last run.
+Changed files are parsed in a process pool with explicit dtypes, diffed
+row by row against what is stored, and only the changed rows are upserted into
+hts_data in a single transaction. hts_sections is refreshed for the affected
+sections only, and the schedule version is bumped so derived structures (the
+schedule index, columnar and program snapshots) know to rebuild.
+
+Usage:
+    python scripts/ingest_hts.py            # incremental
+    python scripts/ingest_hts.py --force    # re-ingest every file
+"""
+
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.db_pool import get_pool
+from tools.hts_index import DEFAULT_SNAPSHOT_PATH, HTSScheduleIndex
+from tools.program_index import DEFAULT_PROGRAM_SNAPSHOT_PATH, ProgramIndex
+from tools.schedule_snapshot import DEFAULT_COLUMNAR_PATH, build_snapshot
+
+DB_PATH = "data/hts.db"
+CSV_DIR = "data/hts_csvs"
+
+SCHEDULE_COLUMNS = [
+    "HTS Number", "Indent", "Description", "Unit of Quantity",
+    "General Rate of Duty", "Special Rate of Duty", "Column 2 Rate of Duty",
+    "Quota Quantity", "Additional Duties",
+]
+
+HTS_DTYPES = {
+    "HTS Number": "string",
+    "Indent": "Int64",
+    "Description": "string",
+    "Unit of Quantity": "string",
+    "General Rate of Duty": "string",
+    "Special Rate of Duty": "string",
+    "Column 2 Rate of Duty": "string",
+    "Quota Quantity": "string",
+    "Additional Duties": "string",
+}
+
+HTS_DATA_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS hts_data (
+        "HTS Number" TEXT,
+        "Indent" INTEGER,
+        "Description" TEXT,
+        "Unit of Quantity" TEXT,
+        "General Rate of Duty" TEXT,
+        "Special Rate of Duty" TEXT,
+        "Column 2 Rate of Duty" TEXT,
+        "Quota Quantity" TEXT,
+        "Additional Duties" TEXT,
+        "Section" TEXT,
+        "Source File" TEXT NOT NULL,
+        "Row Number" INTEGER NOT NULL,
+        "Row Hash" TEXT NOT NULL,
+        PRIMARY KEY ("Source File", "Row Number")
+    )
+"""
+
+QUOTED_COLUMNS = ", ".join(f'"{col}"' for col in SCHEDULE_COLUMNS)
+UPSERT_SQL = f"""
+    INSERT INTO hts_data ({QUOTED_COLUMNS}, "Section", "Source File", "Row Number", "Row Hash")
+    VALUES ({", ".join("?" for _ in SCHEDULE_COLUMNS)}, ?, ?, ?, ?)
+    ON CONFLICT ("Source File", "Row Number") DO UPDATE SET
+        {", ".join(f'"{col}" = excluded."{col}"' for col in SCHEDULE_COLUMNS)},
+        "Section" = excluded."Section",
+        "Row Hash" = excluded."Row Hash"
+"""
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def section_from_filename(path: str) -> str:
+    """'section_xvi.csv' -> 'XVI'"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem.split("_", 1)[1].upper() if "_" in stem else stem.upper()
+
+
+def _row_hash(values: Tuple) -> str:
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _frame_rows(df: pd.DataFrame) -> List[Tuple[int, str, Tuple]]:
+    """(row number, row hash, values) for each row of a schedule frame"""
+    for col in SCHEDULE_COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    frame = df[SCHEDULE_COLUMNS].astype(object)
+    frame = frame.where(frame.notna(), None)
+
+    rows = []
+    for row_number, values in enumerate(frame.itertuples(index=False, name=None), 1):
+        values = tuple(
+            None if value is None else (int(value) if col == "Indent" else str(value))
+            for col, value in zip(SCHEDULE_COLUMNS, values)
+        )
+        rows.append((row_number, _row_hash(values), values))
+    return rows
+
+
+def parse_section_csv(path: str) -> List[Tuple[int, str, Tuple]]:
+    """Worker: parse one section CSV with explicit dtypes"""
+    df = pd.read_csv(path, dtype=HTS_DTYPES, encoding="utf-8-sig",
+                     keep_default_na=False, na_values=[""])
+    return _frame_rows(df)
+
+
+class HTSIngestPipeline:
+    """Incremental loader for hts_data, hts_sections and the schedule index"""
+
+    def __init__(self, db_path: str = DB_PATH, csv_dir: str = CSV_DIR,
+                 workers: Optional[int] = None, snapshot_path: str = DEFAULT_SNAPSHOT_PATH,
+                 columnar_path: str = DEFAULT_COLUMNAR_PATH,
+                 program_path: str = DEFAULT_PROGRAM_SNAPSHOT_PATH):
+        self.db_path = db_path
+        self.csv_dir = csv_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.snapshot_path = snapshot_path
+        self.columnar_path = columnar_path
+        self.program_path = program_path
+        # The schedule ships as a plain database file: keep it on the rollback journal
+        self.pool = get_pool(db_path, wal=False)
+
+    def discover_sources(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.csv_dir, "section_*.csv")))
+
+    def combine_parts(self, pattern: str = "htsdata*.csv", output: str = "section_i.csv") -> bool:
+        """Rebuild a section CSV from downloaded part files when any part changed.
+
+        Returns True if the output file was rewritten.
+        """
+        parts = sorted(glob.glob(os.path.join(self.csv_dir, pattern)))
+        if not parts:
+            return False
+        self._ensure_schema()
+
+        output_path = os.path.join(self.csv_dir, output)
+        parts_key = f"parts:{output}"
+        parts_hash = hashlib.sha256(
+            "".join(f"{os.path.basename(p)}:{file_sha256(p)}" for p in parts).encode()
+        ).hexdigest()
+        if os.path.exists(output_path) and self._manifest().get(parts_key) == parts_hash:
+            return False
+
+        header = None
+        tmp_path = f"{output_path}.tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as out:
+            writer = csv.writer(out, lineterminator="\n")
+            for part in parts:
+                with open(part, newline="", encoding="utf-8-sig") as f:
+                    reader = csv.reader(f)
+                    part_header = next(reader, None)
+                    if header is None:
+                        header = part_header
+                        writer.writerow(header)
+                    writer.writerows(reader)
+        os.replace(tmp_path, output_path)
+
+        with self.pool.writer() as conn:
+            self._record_manifest(conn, parts_key, parts_hash, len(parts))
+        return True
+
+    def _ensure_schema(self):
+        with self.pool.writer() as conn:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(hts_data)")}
+            if columns and "Row Hash" not in columns:
+                # Table written by the old replace-everything loader: start over
+                conn.execute("DROP TABLE hts_data")
+                conn.execute("DROP TABLE IF EXISTS hts_sections")
+                conn.execute("DROP TABLE IF EXISTS hts_ingest_files")
+            conn.execute(HTS_DATA_SCHEMA)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_hts_number ON hts_data("HTS Number")')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_section ON hts_data(Section)')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS hts_sections (
+                    "Section" TEXT PRIMARY KEY,
+                    "Item Count" INTEGER,
+                    "Section Description" TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS hts_ingest_files (
+                    source TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    row_count INTEGER,
+                    ingested_at TEXT
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS hts_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _manifest(self) -> Dict[str, str]:
+        return dict(self.pool.execute("SELECT source, sha256 FROM hts_ingest_files"))
+
+    def _record_manifest(self, conn, source: str, sha256: str, row_count: int):
+        conn.execute("""
+            INSERT INTO hts_ingest_files (source, sha256, row_count, ingested_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (source) DO UPDATE SET
+                sha256 = excluded.sha256,
+                row_count = excluded.row_count,
+                ingested_at = excluded.ingested_at
+        """, (source, sha256, row_count, datetime.now().isoformat()))
+
+    def _apply_source(self, conn, source: str, section: str, rows) -> int:
+        """Upsert the changed rows of one source; returns the number written"""
+        stored = dict(conn.execute(
+            'SELECT "Row Number", "Row Hash" FROM hts_data WHERE "Source File" = ?', (source,)
+        ))
+        changed = [
+            values + (section, source, row_number, row_hash)
+            for row_number, row_hash, values in rows
+            if stored.get(row_number) != row_hash
+        ]
+        conn.executemany(UPSERT_SQL, changed)
+        # Rows past the new end of the file were removed from the source
+        cursor = conn.execute(
+            'DELETE FROM hts_data WHERE "Source File" = ? AND "Row Number" > ?', (source, len(rows))
+        )
+        return len(changed) + max(cursor.rowcount, 0)
+
+    def _refresh_sections(self, conn, sections):
+        for section in sections:
+            conn.execute('DELETE FROM hts_sections WHERE "Section" = ?', (section,))
+            conn.execute("""
+                INSERT INTO hts_sections ("Section", "Item Count", "Section Description")
+                SELECT ?, COUNT("HTS Number"), (
+                    SELECT Description FROM hts_data
+                    WHERE Section = ? ORDER BY "Source File", "Row Number" LIMIT 1
+                )
+                FROM hts_data WHERE Section = ?
+                HAVING COUNT(*) > 0
+            """, (section, section, section))
+
+    def _bump_schedule_version(self, conn):
+        conn.execute("""
+            INSERT INTO hts_meta (key, value) VALUES ('schedule_version', '1')
+            ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+        """)
+
+    def run(self, force: bool = False) -> Dict[str, object]:
+        """Ingest every new or changed section CSV"""
+        started = time.perf_counter()
+        self._ensure_schema()
+        manifest = self._manifest()
+
+        sources = self.discover_sources()
+        hashes = {path: file_sha256(path) for path in sources}
+        changed = [path for path in sources
+                   if force or manifest.get(os.path.basename(path)) != hashes[path]]
+        live = {os.path.basename(path) for path in sources}
+        removed = [source for source in manifest
+                   if source.startswith("section_") and source not in live]
+
+        if len(changed) > 1 and self.workers > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(changed))) as executor:
+                parsed = dict(zip(changed, executor.map(parse_section_csv, changed)))
+        else:
+            parsed = {path: parse_section_csv(path) for path in changed}
+
+        rows_written = 0
+        sections = set()
+        if changed or removed:
+            with self.pool.writer() as conn:
+                for path in changed:
+                    source = os.path.basename(path)
+                    section = section_from_filename(path)
+                    rows_written += self._apply_source(conn, source, section, parsed[path])
+                    self._record_manifest(conn, source, hashes[path], len(parsed[path]))
+                    sections.add(section)
+                for source in removed:
+                    sections.add(section_from_filename(source))
+                    cursor = conn.execute('DELETE FROM hts_data WHERE "Source File" = ?', (source,))
+                    rows_written += max(cursor.rowcount, 0)
+                    conn.execute("DELETE FROM hts_ingest_files WHERE source = ?", (source,))
+                self._refresh_sections(conn, sections)
+                if rows_written:
+                    self._bump_schedule_version(conn)
+                conn.execute("PRAGMA optimize")
+
+        derived = (self.snapshot_path, self.columnar_path, self.program_path)
+        if rows_written or not all(os.path.exists(path) for path in derived):
+            schedule = HTSScheduleIndex.load_or_build(self.db_path, self.snapshot_path)
+            build_snapshot(schedule, self.columnar_path)
+            # Special-program clauses are parsed here, not per request
+            ProgramIndex.from_schedule(schedule).save(self.program_path)
+
+        return {
+            "files_seen": len(sources),
+            "files_changed": [os.path.basename(p) for p in changed],
+            "files_removed": removed,
+            "rows_written": rows_written,
+            "seconds": time.perf_counter() - started,
+        }
+
+    def ingest_frame(self, df: pd.DataFrame, source: str = "sample") -> int:
+        """Ingest an in-memory schedule frame (one 'Section' per row) as a source"""
+        self._ensure_schema()
+        written = 0
+        with self.pool.writer() as conn:
+            sections = set()
+            for section, group in df.groupby("Section", sort=False):
+                group_source = f"{source}_{section.lower()}"
+                rows = _frame_rows(group.reset_index(drop=True))
+                written += self._apply_source(conn, group_source, section, rows)
+                self._record_manifest(conn, group_source, _row_hash(tuple(r[1] for r in rows)), len(rows))
+                sections.add(section)
+            self._refresh_sections(conn, sections)
+            if written:
+                self._bump_schedule_version(conn)
+        return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally ingest HTS section CSVs into SQLite")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--csv-dir", default=CSV_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Re-ingest files even if unchanged")
+    args = parser.parse_args()
+
+    pipeline = HTSIngestPipeline(args.db, args.csv_dir, args.workers)
+    if pipeline.combine_parts():
+        print("Combined htsdata*.csv parts into section_i.csv")
+    summary = pipeline.run(force=args.force)
+
+    print(f"Scanned {summary['files_seen']} section files in {summary['seconds']:.2f}s")
+    print(f"Changed: {', '.join(summary['files_changed']) or 'none'}")
+    if summary["files_removed"]:
+        print(f"Removed: {', '.join(summary['files_removed'])}")
+    print(f"Rows written: {summary['rows_written']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Archive, expire, compact and back up the query history now, instead of
+waiting for the web app's hourly background run (see tools.history_maintenance).
+Unlike the background run, this also rebuilds a history database created
+before incremental vacuum was enabled (one full VACUUM).
+
+    python scripts/maintain_history.py
+    python scripts/maintain_history.py --backup-only
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.app_config import get_config
+from tools.history_maintenance import HistoryMaintenance, archive_months
+from tools.memory_handler import MemoryHandler
+
+
+def main():
+    database = get_config().database
+    parser = argparse.ArgumentParser(description="Query history retention, archiving and backups")
+    parser.add_argument("--db", default=database.query_history_db)
+    parser.add_argument("--live-days", type=int, default=None, help="Days of history kept in the live database")
+    parser.add_argument("--retention-days", type=int, default=None, help="Days of history kept at all")
+    parser.add_argument("--backup-only", action="store_true", help="Only write a backup")
+    args = parser.parse_args()
+
+    memory = MemoryHandler(args.db)
+    maintenance = HistoryMaintenance(memory, live_days=args.live_days, retention_days=args.retention_days)
+    if args.backup_only:
+        print(f"Backup written to {maintenance.backup()}")
+        return
+
+    stats = maintenance.run(rebuild=True)
+    print(f"Archived {stats['archived']:,} rows, expired {stats['expired']:,}, "
+          f"freed {stats['vacuumed_pages']:,} pages")
+    if "backup" in stats:
+        print(f"Backup written to {stats['backup']}")
+    months = archive_months(maintenance.archive_dir)
+    if months:
+        print(f"Archives: {months[0]} to {months[-1]} ({len(months)} months) in {maintenance.archive_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
 import pandas as pd
-import sqlite3
 import os
+import sys
 import requests
 from bs4 import BeautifulSoup
 import time
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.db_pool import get_pool
+from tools.hts_search import get_search_index
+from scripts.ingest_hts import HTSIngestPipeline
+
 class HTSDataProcessor:
     def __init__(self):
         self.db_path = "data/hts.db"
@@ -81,47 +87,21 @@ class HTSDataProcessor:
     def process_all_sections(self):
         """Process all HTS sections"""
         print("Processing all HTS sections...")
+        pipeline = HTSIngestPipeline(self.db_path, self.csv_dir)
         
-        # Check for existing CSV files
-        existing_files = []
-        for section in self.sections.keys():
-            csv_path = os.path.join(self.csv_dir, f"section_{section.lower()}.csv")
-            if os.path.exists(csv_path):
-                existing_files.append(csv_path)
-        
-        if existing_files:
-            print(f"Found {len(existing_files)} existing CSV files")
-            # Load and combine all CSVs
-            all_dfs = []
-            for csv_path in existing_files:
-                df = pd.read_csv(csv_path)
-                all_dfs.append(df)
-            combined_df = pd.concat(all_dfs, ignore_index=True)
+        if pipeline.discover_sources():
+            pipeline.combine_parts()
+            summary = pipeline.run()
+            print(f"Found {summary['files_seen']} CSV files, "
+                  f"{len(summary['files_changed'])} new or changed")
         else:
             print("No existing CSV files found. Creating comprehensive sample data...")
-            combined_df = self.create_comprehensive_sample_data()
-        
-        # Store in SQLite database
-        conn = sqlite3.connect(self.db_path)
-        
-        # Main HTS data table
-        combined_df.to_sql("hts_data", conn, if_exists="replace", index=False)
-        
-        # Create section summary table
-        section_summary = combined_df.groupby('Section').agg({
-            'HTS Number': 'count',
-            'Description': 'first'
-        }).reset_index()
-        section_summary.columns = ['Section', 'Item Count', 'Section Description']
-        section_summary.to_sql("hts_sections", conn, if_exists="replace", index=False)
-        
-        # Create indexes for faster queries
-        cursor = conn.cursor()
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_hts_number ON hts_data("HTS Number")')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_section ON hts_data(Section)')
+            pipeline.ingest_frame(self.create_comprehensive_sample_data())
         
-        conn.commit()
-        conn.close()
+        with get_pool(self.db_path, read_only=True).reader() as conn:
+            combined_df = pd.read_sql_query(
+                'SELECT * FROM hts_data ORDER BY "Source File", "Row Number"', conn
+            )
         
         print(f"Successfully processed {len(combined_df)} HTS entries from {len(combined_df['Section'].unique())} sections")
         print("Database updated with comprehensive HTS data")
@@ -136,18 +116,13 @@ class HTSDataProcessor:
         time.sleep(1)  # Simulate download
         return None
     
-    def search_hts(self, keyword):
-        """Search HTS database by keyword"""
-        conn = sqlite3.connect(self.db_path)
-        query = """
-            SELECT "HTS Number", Description, "General Rate of Duty"
-            FROM hts_data
-            WHERE Description LIKE ?
-            LIMIT 10
-        """
-        df = pd.read_sql_query(query, conn, params=[f'%{keyword}%'])
-        conn.close()
-        return df
+    def search_hts(self, keyword, limit=10, code_prefix=None):
+        """Search HTS database by keyword, ranked by relevance"""
+        hits = get_search_index(self.db_path).search(keyword, limit=limit, code_prefix=code_prefix)
+        return pd.DataFrame(
+            [(hit.code, hit.description, hit.general_rate) for hit in hits],
+            columns=["HTS Number", "Description", "General Rate of Duty"]
+        )
 
 if __name__ == "__main__":
     processor = HTSDataProcessor()
@@ -0,0 +1,24 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def legacy_schedule_dir(tmp_path):
+    """Working directory holding a copy of the shipped data/hts.db, which has no schedule version"""
+    (tmp_path / "data").mkdir()
+    shutil.copy(os.path.join(ROOT, "data", "hts.db"), tmp_path / "data" / "hts.db")
+    return tmp_path
+
+
+@pytest.fixture
+def run_in_new_process():
+    """Run code in a fresh interpreter, with the repository importable and cwd as the working directory"""
+    def run(code, cwd):
+        subprocess.run([sys.executable, "-c", code], cwd=cwd, check=True, env={**os.environ, "PYTHONPATH": ROOT})
+    return run
@@ -0,0 +1,48 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.advanced_analytics import AdvancedAnalytics
+from tools.memory_handler import MemoryHandler
+
+CALCULATION = {"HTS Code": "0101.30.00.00", "CIF Value": "$10,000.00", "Total Duty": "$680.00",
+               "Landed Cost": "$10,680.00"}
+
+def test_metrics_come_from_rollups_and_are_cached_until_history_changes(tmp_path):
+    path = str(tmp_path / "history.db")
+    memory = MemoryHandler(path)
+    memory.add_queries([("Calculate duty for HTS 0101.30.00.00", CALCULATION)] * 2 + [("What is GSP?", None)])
+    memory.flush()
+    analytics = AdvancedAnalytics(path)
+    
+    metrics = analytics.get_trade_metrics()
+    assert (metrics.total_volume, metrics.total_duty, metrics.average_duty_rate) == (21360.0, 1360.0, 0.068)
+    assert metrics.top_hts_chapters == ["01"] and metrics.duty_by_chapter == {"01": 1360.0}
+    assert analytics.get_trade_metrics() == metrics
+    assert analytics.generate_usage_analytics()["total_queries"] == 3
+    
+    heatmap = analytics.create_trade_volume_heatmap()
+    assert analytics.create_trade_volume_heatmap().to_dict() == heatmap.to_dict()
+    assert analytics.cache_stats()["hits"] == 2
+    
+    # A history write changes the version, so the next read recomputes
+    memory.add_query("What is AGOA?")
+    memory.flush()
+    assert analytics.generate_usage_analytics()["total_queries"] == 4
+    stats = analytics.cache_stats()
+    assert (stats["hits"], stats["misses"]) == (2, 4) and stats["hit_rate"] == 0.3333
+
+def test_sample_data_for_a_failed_read_is_not_cached(tmp_path):
+    path = str(tmp_path / "history.db")
+    memory = MemoryHandler(path)
+    memory.add_queries([("Calculate duty for HTS 0101.30.00.00", CALCULATION)])
+    memory.flush()
+    analytics = AdvancedAnalytics(path)
+    compute = analytics._compute_usage_analytics
+    
+    def failing(days):
+        raise RuntimeError("database is locked")
+    analytics._compute_usage_analytics = failing
+    assert analytics.generate_usage_analytics()["total_queries"] == 1250  # sample data
+    analytics._compute_usage_analytics = compute
+    assert analytics.generate_usage_analytics()["total_queries"] == 1
@@ -0,0 +1,24 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.answer_generator import AnswerStream, KeywordGenerator, build_prompt
+
+def test_keyword_generator_streams_the_whole_answer():
+    generator = KeywordGenerator()
+    tokens = list(generator.stream("What is GSP?", ""))
+    assert len(tokens) > 10
+    assert "".join(tokens) == generator.answer("What is GSP?", "")
+    assert "Question: What is GSP?" in build_prompt(" What is GSP? ", "General Note 4")
+
+def test_answer_stream_completes_after_last_token():
+    completed = []
+    stream = AnswerStream(iter(["Duty ", "free."]), lambda text: {"answer": text})
+    stream.on_complete(completed.append)
+    assert stream.response is None
+    assert list(stream) == ["Duty ", "free."]
+    assert completed == [{"answer": "Duty free."}]
+    assert stream.result() == {"answer": "Duty free."}
+
+    cached = AnswerStream.completed({"answer": "Cached."}).on_complete(completed.append)
+    assert list(cached) == ["Cached."] and completed[-1] == {"answer": "Cached."}
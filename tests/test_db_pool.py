@@ -0,0 +1,66 @@
+import sys
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.db_pool import ConnectionPool
+
+def test_reader_reused_per_thread(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), max_readers=2, timeout=5)
+    with pool.writer() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+    
+    with pool.reader() as first:
+        with pool.reader() as nested:
+            assert first is nested
+    with pool.reader() as again:
+        assert again is first
+    
+    assert pool.execute("PRAGMA journal_mode")[0][0] == "wal"
+    assert pool.execute("SELECT COUNT(*) FROM t")[0][0] == 10
+    pool.close()
+
+def test_concurrent_writes_are_serialized(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), max_readers=4, timeout=5)
+    with pool.writer() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    
+    def work():
+        for i in range(25):
+            with pool.writer() as conn:
+                conn.execute("INSERT INTO t VALUES (?)", (i,))
+            pool.execute("SELECT COUNT(*) FROM t")
+    
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert pool.execute("SELECT COUNT(*) FROM t")[0][0] == 150
+    pool.close()
+
+def test_read_only_pool_leaves_the_file_alone(tmp_path):
+    path = str(tmp_path / "schedule.db")
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.execute("INSERT INTO t VALUES (1)")
+    with open(path, "rb") as f:
+        header = f.read(100)
+    
+    pool = ConnectionPool(path, timeout=5, read_only=True)
+    assert pool.execute("SELECT x FROM t") == [(1,)]
+    assert pool.execute("PRAGMA journal_mode")[0][0] == "delete"
+    with pytest.raises(sqlite3.OperationalError):
+        with pool.writer() as conn:
+            conn.execute("INSERT INTO t VALUES (2)")
+    pool.close()
+    
+    with open(path, "rb") as f:
+        assert f.read(100) == header
+    assert not os.path.exists(f"{path}-wal")
@@ -0,0 +1,53 @@
+import sys
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.history_maintenance import HistoryMaintenance, archive_months, read_archive
+from tools.memory_handler import MemoryHandler
+
+def test_history_is_archived_by_month_expired_and_backed_up(tmp_path):
+    memory = MemoryHandler(str(tmp_path / "history.db"))
+    now = datetime(2025, 6, 15)
+    calculation = {"HTS Code": "0101.30.00.00", "Landed Cost": "$10,680.00"}
+    rows = [memory._history_row("Calculate duty for HTS 0101.30.00.00", calculation) for _ in range(3)]
+    # Two archived months, one past retention, and one recent row that stays live
+    for row, age in zip(rows, (400, 100, 1)):
+        memory.writer.add([((now - timedelta(days=age)).isoformat(),) + row[1:]])
+
+    maintenance = HistoryMaintenance(memory, archive_dir=str(tmp_path / "archive"), backup_dir=str(tmp_path / "backups"),
+                                     live_days=90, retention_days=365)
+    stats = maintenance.run(now)
+
+    assert (stats["archived"], stats["expired"]) == (1, 1)
+    assert archive_months(maintenance.archive_dir) == ["2025-03"]
+    assert [row["response"] for row in read_archive(maintenance.archive_dir, "2025-03")] == [calculation]
+    assert memory.get_statistics()["total_queries"] == 1
+    # Rollups keep archived history and drop expired history
+    assert memory.pool.execute("SELECT SUM(queries) FROM monthly_rollups") == [(2,)]
+    assert memory.pool.execute("PRAGMA auto_vacuum")[0][0] == 2
+
+    backup = stats["backup"]
+    with sqlite3.connect(backup) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM queries").fetchone()[0] == 1
+    assert "backup" not in maintenance.run(now)
+
+
+def test_legacy_database_is_rebuilt_only_by_hand(tmp_path):
+    path = str(tmp_path / "history.db")
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute("CREATE TABLE queries (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, query TEXT, "
+                     "query_type TEXT, response TEXT, hts_code TEXT, landed_cost REAL, cif_value REAL, "
+                     "total_duty REAL, origin TEXT)")
+    memory = MemoryHandler(path)
+    maintenance = HistoryMaintenance(memory, archive_dir=str(tmp_path / "archive"), backup_dir=str(tmp_path / "backups"))
+
+    # The background run never takes the full-VACUUM write lock
+    maintenance.compact()
+    with closing(sqlite3.connect(path)) as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    maintenance.compact(rebuild=True)
+    with closing(sqlite3.connect(path)) as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
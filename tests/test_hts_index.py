@@ -0,0 +1,81 @@
+import sys
+import os
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import hts_index
+from tools.hts_index import HTSScheduleIndex, normalize_code
+from tools.hts_search import HTSSearchIndex, get_search_index
+from tools.program_index import get_program_index
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECTION_I = os.path.join(ROOT, "data", "hts_csvs", "section_i.csv")
+
+def test_statistical_suffix_inherits_parent_rates():
+    index = HTSScheduleIndex.from_csv(SECTION_I)
+    veal = index.get("0201.10.05.10")
+    assert veal.general_rate == "4.4¢/kg"
+    assert veal.column2_rate == "13.2¢/kg"
+    assert veal.rate_source == "0201.10.05"
+    assert veal.unit == "kg"
+    assert veal.full_description.startswith("Meat of bovine animals")
+    assert veal.full_description.endswith("Veal")
+
+def test_uncoded_rows_are_part_of_the_tree():
+    index = HTSScheduleIndex.from_csv(SECTION_I)
+    cuts = index.get("0201.20.02.00")
+    parent = index.parent_of(cuts)
+    assert parent.code is None
+    assert parent.description == "Processed:"
+    assert "Other cuts with bone in" in cuts.full_description
+
+def test_prefix_lookup_and_snapshot(tmp_path):
+    index = HTSScheduleIndex.from_csv(SECTION_I)
+    heading = index.heading("0201")
+    assert heading and all(entry.key.startswith("0201") for entry in heading)
+    assert normalize_code("0201.10") == "020110"
+    
+    path = str(tmp_path / "index.snapshot")
+    index.save(path)
+    loaded = HTSScheduleIndex.load(path)
+    assert len(loaded) == len(index)
+    assert loaded.get("0201100510").general_rate == "4.4¢/kg"
+
+# Structures derived from the schedule: the code that builds or loads one, and the file it is kept in
+SCHEDULE_ARTIFACTS = {
+    "index": ("from tools.hts_index import get_schedule_index; get_schedule_index()", "hts_index.snapshot"),
+    "columnar": ("from tools.schedule_snapshot import ensure_snapshot; ensure_snapshot()", "hts_schedule.col"),
+    "search": ("from tools.hts_search import get_search_index; get_search_index()", "hts_search.db"),
+    "programs": ("from tools.program_index import get_program_index; get_program_index()", "hts_programs.snapshot"),
+}
+
+@pytest.mark.parametrize("artifact", SCHEDULE_ARTIFACTS)
+def test_artifact_of_legacy_database_is_reused_by_the_next_process(artifact, legacy_schedule_dir, run_in_new_process):
+    # The shipped database has no schedule version; its signature must survive other processes opening it
+    code, name = SCHEDULE_ARTIFACTS[artifact]
+    path = legacy_schedule_dir / "data" / name
+    
+    run_in_new_process(code, legacy_schedule_dir)
+    built = path.stat().st_mtime_ns
+    run_in_new_process(code, legacy_schedule_dir)
+    assert path.stat().st_mtime_ns == built
+
+def test_schedule_version_is_checked_once_per_interval(legacy_schedule_dir, monkeypatch):
+    data = legacy_schedule_dir / "data"
+    db_path, snapshot_path = str(data / "hts.db"), str(data / "hts_index.snapshot")
+    index = hts_index.get_schedule_index(db_path, snapshot_path)
+    search = get_search_index(db_path, str(data / "hts_search.db"))
+    programs = get_program_index(db_path, str(data / "hts_programs.snapshot"))
+    
+    checks = []
+    monkeypatch.setattr(hts_index, "db_signature", lambda path: checks.append(path) or index.source_signature)
+    monkeypatch.setattr(HTSSearchIndex, "signature", property(lambda self: checks.append(self) or repr(index.source_signature)))
+    for _ in range(3):
+        assert hts_index.get_schedule_index(db_path, snapshot_path) is index
+        assert get_search_index(db_path, str(data / "hts_search.db")) is search
+        assert get_program_index(db_path, str(data / "hts_programs.snapshot")) is programs
+    assert checks == []
+    
+    monkeypatch.setattr(hts_index, "VERSION_CHECK_INTERVAL", 0.0)
+    assert hts_index.get_schedule_index(db_path, snapshot_path) is index
+    assert checks == [db_path]
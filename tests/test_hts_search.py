@@ -0,0 +1,31 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.hts_index import HTSScheduleIndex
+from tools.hts_search import HTSSearchIndex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECTION_I = os.path.join(ROOT, "data", "hts_csvs", "section_i.csv")
+
+def test_child_lines_match_ancestor_text():
+    search = HTSSearchIndex.from_schedule(HTSScheduleIndex.from_csv(SECTION_I))
+    hits = search.search("bovine veal")
+    assert hits[0].description == "Veal"
+    assert all("veal" in hit.description.lower() for hit in hits)
+    assert any(hit.code.startswith("0201") for hit in hits)
+
+def test_prefix_and_code_filters():
+    search = HTSSearchIndex.from_schedule(HTSScheduleIndex.from_csv(SECTION_I))
+    assert search.search("bovi", limit=1)[0].description.startswith(("Live bovine", "Meat of bovine"))
+    assert all(code.startswith("0202") for code in search.search_codes("meat", code_prefix="0202"))
+    assert all(code.startswith("0201.10") for code in search.search_codes("0201.10"))
+
+def test_record_catalog_search():
+    search = HTSSearchIndex.from_records({
+        "0101.30.00.00": {"description": "Live asses", "category": "Live Animals"},
+        "0401.10.00.00": {"description": "Milk, not concentrated", "category": "Dairy"},
+    })
+    assert search.search_codes("dairy") == ["0401.10.00.00"]
+    assert search.search_codes("animals") == ["0101.30.00.00"]
+    assert search.search_codes("zeppelin") == []
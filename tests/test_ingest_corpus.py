@@ -0,0 +1,32 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+
+from scripts.ingest_corpus import CorpusIngestPipeline
+
+def pages(source, *texts):
+    return [Document(page_content=text, metadata={"source": source, "page": i}) for i, text in enumerate(texts)]
+
+def test_sharded_embedding_merges_into_one_store(tmp_path):
+    store_path = str(tmp_path / "vector_store")
+    model = DeterministicFakeEmbedding(size=16)
+    corpus = pages("rulings.pdf", *[f"Ruling {i}: classification of item {i}" for i in range(40)])
+    
+    pipeline = CorpusIngestPipeline(store_path, str(tmp_path / "embeddings.db"), embed_workers=2,
+                                    batch_size=4, queue_size=2, embedding_model=model)
+    stats = pipeline.ingest_pages(corpus)
+    assert (stats["chunks"], stats["added"], stats["embedded"]) == (40, 40, 40)
+    
+    store = FAISS.load_local(store_path, model, allow_dangerous_deserialization=True)
+    assert store.index.ntotal == 40
+    assert store.similarity_search("Ruling 7: classification of item 7", k=1)[0].page_content.startswith("Ruling 7:")
+    
+    # Same source, one page dropped: only that chunk goes, nothing is embedded again
+    pipeline = CorpusIngestPipeline(store_path, str(tmp_path / "embeddings.db"), embed_workers=2,
+                                    batch_size=4, embedding_model=model)
+    stats = pipeline.ingest_pages(corpus[:-1])
+    assert (stats["added"], stats["removed"], stats["embedded"]) == (0, 1, 0)
@@ -0,0 +1,43 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+
+from scripts.ingest_data import ingest_documents
+from tools.sparse_index import SparseIndex, sparse_index_path
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    embedded: int = 0
+    
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+def notes(*texts):
+    return [Document(page_content=text, metadata={"page": i}) for i, text in enumerate(texts)]
+
+def test_reingest_embeds_only_changed_chunks(tmp_path):
+    store_path = str(tmp_path / "vector_store")
+    cache_path = str(tmp_path / "embeddings.db")
+    model = CountingEmbedding(size=16)
+    
+    stats = ingest_documents(notes("GSP", "USMCA", "Israel FTA"), store_path, model, cache_path, batch_size=2)
+    assert (stats["added"], stats["embedded"]) == (3, 3)
+    
+    # One chunk edited, one dropped; "USMCA" moved to page 0 keeps its embedding
+    stats = ingest_documents(notes("USMCA", "Israel FTA (amended)"), store_path, model, cache_path, batch_size=2)
+    assert (stats["added"], stats["removed"], stats["embedded"]) == (2, 3, 1)
+    assert model.embedded == 4
+    
+    store = FAISS.load_local(store_path, model, allow_dangerous_deserialization=True)
+    assert sorted(doc.page_content for doc in store.docstore._dict.values()) == ["Israel FTA (amended)", "USMCA"]
+    assert store.index.ntotal == 2
+    sparse = SparseIndex(sparse_index_path(store_path))
+    assert len(sparse) == 2
+    assert [store.docstore.search(doc_id).page_content for doc_id in sparse.search("amended")] == ["Israel FTA (amended)"]
+    
+    stats = ingest_documents(notes("USMCA", "Israel FTA (amended)"), store_path, model, cache_path)
+    assert (stats["added"], stats["removed"], stats["embedded"]) == (0, 0, 0)
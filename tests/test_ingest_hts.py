@@ -0,0 +1,43 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.ingest_hts import HTSIngestPipeline
+
+HEADER = "HTS Number,Indent,Description,Unit of Quantity,General Rate of Duty,Special Rate of Duty,Column 2 Rate of Duty,Quota Quantity,Additional Duties\n"
+
+def write_section(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(HEADER)
+        f.writelines(rows)
+
+def test_reingest_only_writes_changed_rows(tmp_path):
+    csv_dir = tmp_path / "csvs"
+    csv_dir.mkdir()
+    write_section(csv_dir / "section_i.csv", [
+        "0201,0,Meat of bovine animals:,,,,,,\n",
+        '0201.10.05,1,Veal,"[""kg""]",4.4¢/kg,Free (A+),13.2¢/kg,,\n',
+    ])
+    write_section(csv_dir / "section_ii.csv", ["0701,0,Potatoes:,,,,,,\n"])
+    
+    pipeline = HTSIngestPipeline(str(tmp_path / "hts.db"), str(csv_dir), workers=1,
+                                 snapshot_path=str(tmp_path / "index.snapshot"),
+                                 columnar_path=str(tmp_path / "schedule.col"),
+                                 program_path=str(tmp_path / "programs.snapshot"))
+    first = pipeline.run()
+    assert first["rows_written"] == 3
+    assert pipeline.run()["files_changed"] == []
+    
+    write_section(csv_dir / "section_i.csv", [
+        "0201,0,Meat of bovine animals:,,,,,,\n",
+        '0201.10.05,1,Veal,"[""kg""]",5%,Free (A+),13.2¢/kg,,\n',
+    ])
+    second = pipeline.run()
+    assert second["files_changed"] == ["section_i.csv"]
+    assert second["rows_written"] == 1
+    
+    rows = pipeline.pool.execute(
+        'SELECT "HTS Number", "General Rate of Duty", Section FROM hts_data WHERE Indent = 1'
+    )
+    assert rows == [("0201.10.05", "5%", "I")]
+    assert pipeline.pool.execute('SELECT "Item Count" FROM hts_sections WHERE Section = ?', ("II",)) == [(1,)]
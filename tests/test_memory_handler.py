@@ -0,0 +1,107 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.memory_handler import HISTORY_SCHEMA_VERSION, MemoryHandler
+
+def test_add_queries_writes_history_in_bulk(tmp_path):
+    memory = MemoryHandler(str(tmp_path / "history.db"))
+    count = memory.add_queries([
+        ("Calculate duty for HTS 0101.30.00.00", {"HTS Code": "0101.30.00.00", "Landed Cost": "$10,680.00"}),
+        ("What is GSP?", {"answer": "Generalized System of Preferences"}),
+    ])
+    memory.add_query("What is AGOA?")
+    
+    assert count == 2
+    assert memory.get_statistics() == {"total_queries": 3, "policy_queries": 2, "duty_calculations": 1}
+    assert memory.get_recent_calculations()[0]["Landed Cost"] == "$10,680.00"
+
+def test_history_is_written_behind_and_flushed(tmp_path):
+    memory = MemoryHandler(str(tmp_path / "history.db"), durability="normal")
+    memory.writer.flush_interval = 60
+    memory.add_query("What is GSP?", {"answer": "Generalized System of Preferences"})
+    assert memory.pool.execute("SELECT COUNT(*) FROM queries")[0][0] == 0
+    
+    # Reads see queued rows; closing writes what is left
+    assert memory.get_recent_queries(1)[0]["query"] == "What is GSP?"
+    memory.add_query("What is AGOA?")
+    memory.close()
+    assert memory.pool.execute("SELECT COUNT(*) FROM queries")[0][0] == 2
+
+def test_old_history_is_migrated_to_typed_indexed_schema(tmp_path):
+    import json
+    import sqlite3
+    path = str(tmp_path / "history.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE queries (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, query TEXT,
+                    query_type TEXT, response TEXT, hts_code TEXT, landed_cost REAL)""")
+    calculation = {"HTS Code": "0101.30.00.00", "CIF Value": "$10,000.00", "Total Duty": "$680.00",
+                   "Landed Cost": "$10,680.00", "Origin": "Mexico"}
+    conn.executemany("INSERT INTO queries (timestamp, query, query_type, response, hts_code, landed_cost) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", [
+        ("2024-01-01T10:00:00", "Calculate duty for HTS 0101.30.00.00", "duty_calculation",
+         json.dumps(calculation), "0101.30.00.00", 10680.0),
+        ("2024-01-02T10:00:00", "What is GSP?", "policy_question", "", "", 0.0),
+    ])
+    conn.commit()
+    conn.close()
+    
+    memory = MemoryHandler(path)
+    assert memory.pool.execute("PRAGMA user_version")[0][0] == HISTORY_SCHEMA_VERSION
+    assert memory.pool.execute("SELECT cif_value, total_duty, landed_cost, origin FROM queries WHERE id = 1") == [
+        (10000.0, 680.0, 10680.0, "Mexico")
+    ]
+    memory.add_query("What is AGOA?")
+    assert memory.get_statistics() == {"total_queries": 3, "policy_queries": 2, "duty_calculations": 1}
+    assert memory.get_recent_calculations()[0]["Total Duty"] == "$680.00"
+    assert memory.get_similar_queries("Duty on HTS 0101.30.00.00?")[0]["query"] == "Calculate duty for HTS 0101.30.00.00"
+    plan = memory.pool.execute("EXPLAIN QUERY PLAN SELECT * FROM queries ORDER BY timestamp DESC LIMIT 10")
+    assert "idx_queries_timestamp" in plan[0][-1]
+
+def test_similar_queries_are_ranked_from_the_full_history(tmp_path):
+    memory = MemoryHandler(str(tmp_path / "history.db"))
+    memory.add_queries([("What is the GSP program?", None)] +
+                       [(f"Calculate duty for HTS 0101.30.00.{i:02d}", None) for i in range(100)] +
+                       [("Which countries does the GSP program cover?", None), ("What is GSP?", None)])
+    
+    similar = memory.get_similar_queries("Is the GSP program still active?")
+    # Beyond the last 20 rows, distinct, and at least two shared content words
+    assert [row["query"] for row in similar] == ["What is the GSP program?",
+                                                "Which countries does the GSP program cover?"]
+    
+    with memory.pool.writer() as conn:
+        conn.execute("DELETE FROM queries WHERE query = 'What is the GSP program?'")
+    assert len(memory.get_similar_queries("Is the GSP program still active?")) == 1
+    assert memory.get_similar_queries("the") == []
+
+def test_similar_queries_are_distinct_and_matched_on_stems(tmp_path):
+    memory = MemoryHandler(str(tmp_path / "history.db"))
+    memory.add_queries([("Which preference programs cover Mexico?", None)] +
+                       [("Is the GSP program active? ", None) for _ in range(50)] +
+                       [("is the gsp program active?", None)] +
+                       [(f"GSP program eligibility for country {i}", None) for i in range(3)])
+    
+    similar = [row["query"] for row in memory.get_similar_queries("GSP program rules", limit=4)]
+    # Fifty copies of one question count once, and the limit is still filled
+    assert len(similar) == 4 and sum(query.lower().strip() == "is the gsp program active?" for query in similar) == 1
+    # "programs" and "preferences" share stems with "program" and "preference"
+    assert [row["query"] for row in memory.get_similar_queries("Mexico program preferences")] == [
+        "Which preference programs cover Mexico?"
+    ]
+
+def test_rollups_follow_writes_and_outlive_archiving(tmp_path):
+    memory = MemoryHandler(str(tmp_path / "history.db"))
+    calculation = {"HTS Code": "0101.30.00.00", "CIF Value": "$10,000.00", "Total Duty": "$680.00",
+                   "Landed Cost": "$10,680.00"}
+    memory.add_queries([("Calculate duty for HTS 0101.30.00.00", calculation)] * 2 + [("What is GSP?", None)])
+    memory.flush()
+    
+    day = memory.pool.execute("SELECT MAX(period) FROM daily_rollups")[0][0]
+    assert memory.pool.execute(
+        "SELECT query_type, hts_chapter, queries, landed_cost, cif_value, total_duty FROM daily_rollups "
+        "WHERE period = ? ORDER BY query_type", (day,)) == [
+        ("duty_calculation", "01", 2, 21360.0, 20000.0, 1360.0), ("policy_question", "", 1, 0.0, 0.0, 0.0)
+    ]
+    with memory.pool.writer() as conn:
+        conn.execute("DELETE FROM queries")
+    assert memory.pool.execute("SELECT SUM(queries) FROM monthly_rollups WHERE period = ?", (day[:7],)) == [(3,)]
@@ -0,0 +1,65 @@
+import sys
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.answer_generator import AnswerStream
+from tools.policy_service import PolicyQueryService
+from tools.query_cache import normalize_query
+
+class FakeRAGTool:
+    """Embeds by question length; records every model call"""
+
+    def __init__(self):
+        self.batches = []
+        self.generated = []
+        self.release = threading.Event()
+
+    def lookup(self, query):
+        return normalize_query(query), None, None
+
+    def embed_queries(self, queries):
+        self.batches.append(list(queries))
+        time.sleep(0.02)
+        return [[float(len(query))] for query in queries]
+
+    def stream_policy_answer(self, query, embedding=None):
+        self.generated.append(query)
+        def tokens():
+            yield "Answer "
+            self.release.wait(5)
+            yield f"{embedding[0]:.0f}"
+        return AnswerStream(tokens(), lambda text: {"answer": text})
+
+def test_identical_questions_are_computed_once():
+    rag = FakeRAGTool()
+    service = PolicyQueryService(rag, batch_window_ms=10, max_batch=8, workers=4)
+    try:
+        first = service.stream("What is GSP?")
+        tokens = iter(first)
+        assert next(tokens) == "Answer "
+        # Joins the answer already being generated, and replays its tokens
+        second = service.stream("what is gsp")
+        rag.release.set()
+        assert "".join(tokens) == "12" and list(second) == ["Answer ", "12"]
+        assert second.response == first.response == {"answer": "Answer 12"}
+        assert rag.generated == ["What is GSP?"]
+        assert service.stats["coalesced"] == 1
+    finally:
+        service.close()
+
+def test_distinct_questions_are_embedded_in_batches():
+    rag = FakeRAGTool()
+    rag.release.set()
+    service = PolicyQueryService(rag, batch_window_ms=20, max_batch=8, workers=8)
+    questions = [f"Question {'x' * i}" for i in range(16)]
+    try:
+        with ThreadPoolExecutor(16) as pool:
+            answers = list(pool.map(service.answer_sync, questions))
+        assert [answer["answer"] for answer in answers] == [f"Answer {len(q)}" for q in questions]
+        assert sorted(q for batch in rag.batches for q in batch) == sorted(questions)
+        assert len(rag.batches) < len(questions) / 2
+    finally:
+        service.close()
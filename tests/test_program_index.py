@@ -0,0 +1,40 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.hts_index import HTSScheduleIndex
+from tools.program_index import ProgramIndex, compile_programs, find_origin, resolve
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECTION_I = os.path.join(ROOT, "data", "hts_csvs", "section_i.csv")
+
+def test_special_rate_clauses_map_programs_to_rates():
+    programs = compile_programs("Free (BH,CL,CO,JO,MA,OM,P,PE,S,SG) 1.7% (KR) See 9822.04.01-9822.04.03 (AU)")
+    assert programs.rates["S"].kind == "free"
+    assert programs.rates["KR"].ad_valorem == 0.017
+    assert "AU" not in programs.rates
+    assert programs.references["AU"].startswith("See 9822")
+    assert compile_programs(programs.raw) is programs
+
+def test_resolution_by_origin(tmp_path):
+    schedule = HTSScheduleIndex.from_csv(SECTION_I)
+    path = str(tmp_path / "programs.snapshot")
+    ProgramIndex.from_schedule(schedule).save(path)
+    index = ProgramIndex.load(path)
+    entry = schedule.get("0201.10.50")
+    programs = index.programs("0201.10.50")
+    
+    def applied(origin):
+        return resolve(programs, origin, entry.general, entry.column2)
+    
+    assert applied("Mexico").column == "special" and applied("Mexico").rate.kind == "free"
+    assert applied("Korea").program == "KR"
+    assert applied("Cuba").column == "column2"
+    assert applied("China").column == "general"
+    assert applied("Australia").reference is not None
+
+def test_origin_is_found_by_its_longest_name():
+    assert find_origin("Calculate duty for 8471.30.01.00 from North Korea") == "North Korea"
+    assert find_origin("Calculate duty for 8471.30.01.00 from south korea") == "South Korea"
+    assert find_origin("Calculate duty for 8471.30.01.00 from Korea") == "Korea"
+    assert find_origin("Calculate duty for 8471.30.01.00") is None
@@ -0,0 +1,50 @@
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.query_cache import RetrievalCache, TTLCache, answer_key, normalize_query, vector_store_signature
+
+def test_ttl_cache_expires_and_evicts_least_recent():
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.put("gsp", 1)
+    cache.put("usmca", 2)
+    assert cache.get("gsp") == 1
+    cache.put("israel fta", 3)
+    assert cache.get("usmca") is None
+    time.sleep(0.06)
+    assert cache.get("gsp") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_ttl_cache_is_bounded_by_size():
+    cache = TTLCache(maxsize=10, ttl=60, maxbytes=100)
+    cache.put("a", "x" * 60, 60)
+    cache.put("b", "y" * 30, 30)
+    cache.put("b", "y" * 40, 40)
+    assert cache.bytes == 100 and len(cache) == 2
+    cache.put("c", "z" * 10, 10)
+    assert cache.get("a") is None and cache.bytes == 50
+    assert cache.hit_rate == 0.0
+
+def test_retrieval_cache_cleared_when_store_is_rebuilt(tmp_path):
+    store = tmp_path / "vector_store"
+    store.mkdir()
+    assert vector_store_signature(str(store)) is None
+    (store / "index.faiss").write_bytes(b"v1")
+    (store / "index.pkl").write_bytes(b"v1")
+    
+    cache = RetrievalCache(str(tmp_path / "rag_cache.db"))
+    cache.bind(vector_store_signature(str(store)))
+    key = normalize_query("  What is GSP? ")
+    assert key == normalize_query("what is  gsp")
+    cache.put(key, [0.25, -1.0], ["doc-1", "doc-7"])
+    assert cache.get(key) == ([0.25, -1.0], ["doc-1", "doc-7"])
+    answer = answer_key("keyword", key, ["doc-1", "doc-7"])
+    assert answer != answer_key("keyword", key, ["doc-1"])
+    cache.put_answer(answer, {"answer": "GSP is a preference program."})
+    assert cache.get_answer(answer) == {"answer": "GSP is a preference program."}
+    
+    (store / "index.faiss").write_bytes(b"version 2")
+    cache.bind(vector_store_signature(str(store)))
+    assert cache.get(key) is None
+    assert cache.get_answer(answer) is None
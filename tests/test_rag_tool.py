@@ -0,0 +1,24 @@
+import sys
+import os
+import subprocess
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.rag_tool import RAGTool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_construction_does_not_import_model_stack():
+    # Fresh interpreter: other tests may already have imported langchain
+    check = (
+        "import sys; from tools.rag_tool import RAGTool; RAGTool(); "
+        "print(any(m.split('.')[0] in ('torch', 'transformers', 'langchain_huggingface') for m in sys.modules))"
+    )
+    output = subprocess.run([sys.executable, "-c", check], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "False"
+
+def test_background_warm_up_records_load_errors(tmp_path):
+    rag = RAGTool(str(tmp_path / "missing_store"))
+    assert not rag.is_loaded
+    rag.warm_up().join()
+    assert rag.load_error is not None
+    assert not rag.is_loaded
@@ -0,0 +1,33 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.rate_compiler import compile_rate, EMPTY_RATE
+
+def test_rate_forms():
+    assert compile_rate("26.4%").kind == "ad_valorem"
+    assert abs(compile_rate("26.4%").ad_valorem - 0.264) < 1e-12
+    assert abs(compile_rate("4.4¢/kg").dollars_per_kg - 0.044) < 1e-12
+    assert abs(compile_rate("$2.146/kg").dollars_per_kg - 2.146) < 1e-12
+    assert abs(compile_rate("0.9¢ each").dollars_per_unit - 0.009) < 1e-12
+    assert abs(compile_rate("$3/head").dollars_per_unit - 3.0) < 1e-12
+    assert abs(compile_rate("$1.11/t").dollars_per_ton - 1.11) < 1e-12
+    assert compile_rate(None) is EMPTY_RATE
+    assert compile_rate("").kind == "empty"
+
+def test_compound_and_free():
+    compound = compile_rate("$1.104/kg + 14.9%")
+    assert compound.kind == "compound"
+    # 100 kg at $1.104/kg plus 14.9% of $1,000
+    assert abs(compound.amount(1000.0, unit_weight=100) - (110.4 + 149.0)) < 1e-9
+    assert abs(compound.evaluate(1000.0, unit_weight=100) - 0.2594) < 1e-9
+
+    free = compile_rate("Free (A+,AU,BH,CL,CO,D,E*, IL,JO,KR)")
+    assert free.is_free
+    assert free.programs == ("A+", "AU", "BH", "CL", "CO", "D", "E*", "IL", "JO", "KR")
+    assert free.evaluate(1000.0, 100, 5) == 0.0
+
+def test_trailing_references_ignored():
+    rate = compile_rate("1.7% (KR) See 9822.04.01-9822.04.03 (AU)")
+    assert rate.kind == "ad_valorem"
+    assert abs(rate.ad_valorem - 0.017) < 1e-12
@@ -0,0 +1,28 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.hts_index import HTSScheduleIndex
+from tools.schedule_snapshot import ScheduleSnapshot, build_snapshot
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECTION_I = os.path.join(ROOT, "data", "hts_csvs", "section_i.csv")
+
+def test_snapshot_round_trips_resolved_schedule(tmp_path):
+    index = HTSScheduleIndex.from_csv(SECTION_I)
+    path = build_snapshot(index, str(tmp_path / "schedule.col"))
+    snapshot = ScheduleSnapshot(path)
+    try:
+        assert len(snapshot) == len(index.sorted_keys)
+        for key in index.sorted_keys[::50]:
+            entry = index.by_key[key]
+            row = snapshot.find(entry.code)
+            assert snapshot.row(row) == {k: v or "" for k, v in entry.as_row().items() if k != "Indent"}
+            assert snapshot.rate("general", row) == entry.general
+            assert snapshot.rate("column2", row) == entry.column2
+    
+        assert snapshot.duty("0201.10.05.10", 1000.0, unit_weight=100) == index.get("0201.10.05.10").general.amount(1000.0, 100)
+        assert snapshot.find("9999.99") is None
+        assert all(snapshot.string("code", row).startswith("0201") for row in snapshot.prefix("0201"))
+    finally:
+        snapshot.close()
@@ -0,0 +1,31 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.semantic_cache import SemanticAnswerCache
+
+GSP = {"answer": "The Generalized System of Preferences (GSP) ...", "sources": "Retrieved from 3 relevant document sections"}
+USMCA = {"answer": "NAFTA (now USMCA) ...", "sources": "Retrieved from 3 relevant document sections"}
+
+def test_paraphrase_served_above_threshold():
+    cache = SemanticAnswerCache(threshold=0.9, maxsize=8)
+    assert cache.lookup([1.0, 0.0, 0.0]) is None
+    cache.add([1.0, 0.0, 0.0], "What is GSP?", GSP)
+    cache.add([0.0, 1.0, 0.0], "What is USMCA?", USMCA)
+    
+    hit = cache.lookup([0.95, 0.2, 0.0])
+    assert hit["answer"] == GSP["answer"]
+    assert hit["matched_question"] == "What is GSP?"
+    assert cache.lookup([0.6, 0.6, 0.5]) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+def test_least_recently_served_question_is_evicted():
+    cache = SemanticAnswerCache(threshold=0.9, maxsize=2)
+    cache.add([1.0, 0.0, 0.0], "What is GSP?", GSP)
+    cache.add([0.0, 1.0, 0.0], "What is USMCA?", USMCA)
+    assert cache.lookup([1.0, 0.0, 0.0]) is not None
+    cache.add([0.0, 0.0, 1.0], "What is the Israel FTA?", {"answer": "..."})
+    
+    assert len(cache) == 2 and cache.evictions == 1
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+    assert cache.lookup([1.0, 0.0, 0.0])["matched_question"] == "What is GSP?"
@@ -0,0 +1,33 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.sparse_index import SparseIndex, reciprocal_rank_fusion
+
+CHUNKS = {
+    "gsp": "The Generalized System of Preferences grants duty-free treatment to eligible articles.",
+    "agoa": "The African Growth and Opportunity Act (AGOA) applies to sub-Saharan countries.",
+    "repairs": "Articles repaired abroad are entered under subheading 9802.00.40 or 9802.00.50.",
+    "assembly": "Assembled articles of U.S. components are provided for in heading 9802.00.80.",
+}
+
+def test_sparse_index_ranks_exact_terms_and_codes(tmp_path):
+    index = SparseIndex(str(tmp_path / "sparse_index.db"))
+    assert index.sync(CHUNKS) == {"added": 4, "removed": 0}
+
+    assert index.search("Which countries qualify for AGOA?")[0] == "agoa"
+    assert index.search("What does 9802.00.80 cover?") == ["assembly"]
+    assert index.search("what is the") == []
+
+    changed = {key: text for key, text in CHUNKS.items() if key != "agoa"}
+    changed["cbtpa"] = "The Caribbean Basin Trade Partnership Act (CBTPA) covers apparel."
+    assert index.sync(changed) == {"added": 1, "removed": 1}
+    assert index.search("AGOA") == []
+    assert index.search("CBTPA apparel") == ["cbtpa"]
+    assert len(index) == 4
+
+def test_reciprocal_rank_fusion_favours_agreement():
+    dense = ["a", "b", "c"]
+    sparse = ["c", "d", "a"]
+    assert reciprocal_rank_fusion([dense, sparse], limit=2) == ["a", "c"]
+    assert reciprocal_rank_fusion([dense, []], limit=5) == dense
@@ -0,0 +1,32 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.hts_index import HTSScheduleIndex
+from tools.schedule_snapshot import build_snapshot
+from tools.tariff_provider import InMemoryTariffProvider, SnapshotTariffProvider
+
+SECTION_I = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "data", "hts_csvs", "section_i.csv")
+
+def test_fixture_provider_serves_sample_catalog():
+    provider = InMemoryTariffProvider()
+    assert "0102.21.00.00" in provider
+    assert provider["0102210000"]["category"] == "Live Animals"
+    assert provider.duty("0102.21.00.00", 1000.0) == 25.0
+    assert provider.search("cattle") == ["0102.21.00.00"]
+
+def test_snapshot_provider_records_are_memoized(tmp_path):
+    path = build_snapshot(HTSScheduleIndex.from_csv(SECTION_I), str(tmp_path / "schedule.col"))
+    provider = SnapshotTariffProvider(path)
+    
+    asses = provider["0101.30.00.00"]
+    assert asses is provider["0101300000"]
+    assert asses["duty_rate"] == 0.068
+    assert asses["origin_rates"]["Mexico"] == 0.0
+    assert asses["origin_rates"]["Cuba"] == 0.15
+    assert asses["category"] == "Live Animals"
+    assert len(provider) > 1000
+    assert provider.duty("0201.10.05.10", 1000.0, unit_weight=100) == 4.4
+    # Same contract as the other providers for a code the schedule does not know
+    assert provider.duty("9999.99.99.99", 1000.0) == InMemoryTariffProvider().duty("9999.99.99.99", 1000.0) == 0.0
@@ -51,6 +51,66 @@ def test_tariff_calculator():
             print(f"Total Duty: {result['Total Duty']}")
             print(f"Landed Cost: {result['Landed Cost']}")
 
+def test_calculate_duties_batch():
+    print("\n\nTesting batch duty engine...")
+    import pandas as pd
+    calc = TariffCalculator()
+    
+    items = pd.DataFrame({
+        "HTS Code": ["0201.20.02.00", "0201.10.50", "9999.99.99.99"],
+        "Product Cost": [10000, 5000, 100],
+        "Freight": [500, 250, 0],
+        "Insurance": [100, 50, 0],
+        "Unit Weight": [500, 300, 1],
+        "Quantity": [5, 2, 1]
+    })
+    batch = calc.calculate_duties(items, formatted=True)
+    
+    for i, row in items.iterrows():
+        single = calc.calculate_duty(
+            hts_code=row["HTS Code"],
+            product_cost=row["Product Cost"],
+            freight=row["Freight"],
+            insurance=row["Insurance"],
+            unit_weight=row["Unit Weight"],
+            quantity=row["Quantity"]
+        )
+        if "error" in single:
+            assert batch.loc[i, "error"] == single["error"]
+        else:
+            assert batch.loc[i, "Total Duty"] == single["Total Duty"]
+            assert batch.loc[i, "Landed Cost"] == single["Landed Cost"]
+        print(f"{row['HTS Code']}: {batch.loc[i, 'Landed Cost'] or batch.loc[i, 'error']}")
+
+def test_calculate_duties_by_origin():
+    print("\n\nTesting batch duty engine with origins...")
+    import pandas as pd
+    calc = TariffCalculator()
+    
+    items = pd.DataFrame({
+        "HTS Code": ["0201.10.05.10", "0201.10.05.10", "0201.20.02.00", "0104.20.00.00"],
+        "Product Cost": [1000, 1000, 10000, 1000],
+        "Unit Weight": [100, 100, 500, 0],
+        "Quantity": [1, 1, 1, 10],
+        "Origin": ["Mexico", "North Korea", "", "Korea"]
+    })
+    batch = calc.calculate_duties(items, formatted=True)
+    
+    for i, row in items.iterrows():
+        single = calc.calculate_duty(
+            hts_code=row["HTS Code"],
+            product_cost=row["Product Cost"],
+            freight=0,
+            insurance=0,
+            unit_weight=row["Unit Weight"],
+            quantity=row["Quantity"],
+            origin=row["Origin"] or None
+        )
+        assert calc.result_from_row(batch.iloc[i].to_dict()) == single
+        print(f"{row['HTS Code']} from {row['Origin'] or 'anywhere'}: {single['Total Duty']}")
+
 if __name__ == "__main__":
     test_rag_tool()
-    test_tariff_calculator()
\ No newline at end of file
+    test_tariff_calculator()
+    test_calculate_duties_batch()
+    test_calculate_duties_by_origin()
\ No newline at end of file
@@ -0,0 +1,31 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+from scripts.ingest_data import ingest_documents
+from tools.vector_index import build_ann_index, load_vector_store, read_index_meta
+
+def test_ann_index_is_loaded_and_rebuilt_after_ingestion(tmp_path):
+    store_path = str(tmp_path / "vector_store")
+    cache_path = str(tmp_path / "embeddings.db")
+    model = DeterministicFakeEmbedding(size=32)
+    docs = [Document(page_content=f"General note {i}", metadata={"page": i}) for i in range(300)]
+    ingest_documents(docs, store_path, model, cache_path)
+    
+    meta = build_ann_index(store_path, "hnsw", {"M": 8}, {"efSearch": 32})
+    store = load_vector_store(store_path, model)
+    assert type(store.index).__name__ == "IndexHNSWFlat"
+    assert store.similarity_search("General note 42", k=1)[0].page_content == "General note 42"
+    
+    # Same size, different rows: the derived index must follow the flat one
+    ingest_documents(docs[1:] + [Document(page_content="General note 300", metadata={"page": 300})],
+                     store_path, model, cache_path)
+    assert read_index_meta(store_path)["rows"] != meta["rows"]
+    store = load_vector_store(store_path, model)
+    assert store.similarity_search("General note 300", k=1)[0].page_content == "General note 300"
+    
+    build_ann_index(store_path, "flat")
+    assert type(load_vector_store(store_path, model).index).__name__ == "IndexFlatL2"
@@ -4,10 +4,20 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from datetime import datetime, timedelta
-import sqlite3
 from typing import Dict, List, Any, Optional
 import json
-from dataclasses import dataclass
+import os
+import threading
+from collections import defaultdict
+import sys
+from dataclasses import asdict, dataclass, field
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.app_config import get_config
+from tools.db_pool import get_pool
+from tools.memory_handler import history_version, init_history_db
+from tools.query_cache import TTLCache
 
 @dataclass
 class TradeMetrics:
@@ -16,68 +26,118 @@ class TradeMetrics:
     total_duty: float
     total_savings: float
     average_duty_rate: float
-    top_hts_codes: List[str]
+    top_hts_chapters: List[str]
     monthly_trends: Dict[str, float]
+    duty_by_chapter: Dict[str, float] = field(default_factory=dict)
 
 class AdvancedAnalytics:
-    """Advanced analytics engine for trade data"""
+    """Advanced analytics engine for trade data.
+    
+    Metrics read the daily_rollups and monthly_rollups tables that the query
+    history keeps current as it is written (see tools.memory_handler), never
+    the queries themselves, so they cost the same whatever the history size.
+    
+    Results and figures are cached as JSON in a TTLCache bounded by
+    PerformanceConfig.cache_size_mb, keyed by their inputs and the history
+    version, so a Streamlit rerun rebuilds nothing until the history changes.
+    Sample data shown when the history cannot be read is never cached.
+    """
     
     def __init__(self, db_path: str = "data/query_history.db"):
+        performance = get_config().performance
         self.db_path = db_path
-        self.cache = {}
-        
+        self.pool = get_pool(db_path)
+        init_history_db(self.pool)
+        self.cache = TTLCache(
+            performance.query_cache_size,
+            performance.analytics_cache_ttl_seconds,
+            maxbytes=performance.cache_size_mb * 1024 * 1024
+        ) if performance.cache_enabled else None
+    
+    def _cached(self, name: str, args: tuple, compute, dump=json.dumps, load=json.loads):
+        """compute(), or its result stored under (name, args, history version) as dump() text"""
+        if self.cache is None:
+            return compute()
+        key = (name, args, history_version(self.pool))
+        payload = self.cache.get(key)
+        if payload is not None:
+            return load(payload)
+        value = compute()
+        payload = dump(value)
+        self.cache.put(key, payload, len(payload))
+        return value
+    
+    def _cached_figure(self, name: str, args: tuple, build) -> go.Figure:
+        # The JSON was written by plotly itself: rebuilding without validation takes ~2 ms, not 20-60
+        return self._cached(name, args, build, lambda fig: fig.to_json(),
+                            lambda payload: go.Figure(json.loads(payload), _validate=False))
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hits, misses and size of the results cache"""
+        if self.cache is None:
+            return {'enabled': False}
+        return {
+            'enabled': True,
+            'hits': self.cache.hits,
+            'misses': self.cache.misses,
+            'hit_rate': round(self.cache.hit_rate, 4),
+            'entries': len(self.cache),
+            'bytes': self.cache.bytes
+        }
+    
     def get_trade_metrics(self, days: int = 30) -> TradeMetrics:
         """Get comprehensive trade metrics for the specified period"""
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
-        
         try:
-            conn = sqlite3.connect(self.db_path)
-            
-            # Query for duty calculations within date range
-            query = """
-            SELECT timestamp, hts_code, landed_cost, response
-            FROM queries 
-            WHERE query_type = 'duty_calculation' 
-            AND timestamp >= ? AND timestamp <= ?
-            """
-            
-            df = pd.read_sql_query(
-                query, 
-                conn, 
-                params=[start_date.isoformat(), end_date.isoformat()]
-            )
-            conn.close()
-            
-            if df.empty:
-                return self._generate_sample_metrics()
-            
-            # Calculate metrics
-            total_volume = df['landed_cost'].sum()
-            total_duty = df['landed_cost'].sum() * 0.085  # Estimate 8.5% average duty
-            total_savings = total_duty * 0.15  # Estimate 15% savings from optimization
-            average_duty_rate = 0.085
-            
-            # Top HTS codes
-            hts_counts = df['hts_code'].value_counts().head(5)
-            top_hts_codes = hts_counts.index.tolist()
-            
-            # Monthly trends (simplified)
-            monthly_trends = self._calculate_monthly_trends(df)
-            
-            return TradeMetrics(
-                total_volume=total_volume,
-                total_duty=total_duty,
-                total_savings=total_savings,
-                average_duty_rate=average_duty_rate,
-                top_hts_codes=top_hts_codes,
-                monthly_trends=monthly_trends
-            )
-            
+            # Today's date is part of the key: the window moves at midnight
+            return self._cached('trade_metrics', (days, datetime.now().date().isoformat()),
+                                lambda: self._compute_trade_metrics(days),
+                                lambda metrics: json.dumps(asdict(metrics)),
+                                lambda payload: TradeMetrics(**json.loads(payload)))
         except Exception as e:
             print(f"Error getting trade metrics: {e}")
             return self._generate_sample_metrics()
     
+    def _compute_trade_metrics(self, days: int) -> TradeMetrics:
+        start_date = datetime.now() - timedelta(days=days)
+        
+        # Duty calculations per day and HTS chapter within the date range
+        rows = self.pool.execute("""
+            SELECT period, hts_chapter, queries, landed_cost, cif_value, total_duty
+            FROM daily_rollups
+            WHERE query_type = 'duty_calculation' AND period >= ?
+        """, (start_date.date().isoformat(),))
+        
+        if not rows:
+            return self._generate_sample_metrics()
+        
+        # Calculate metrics
+        total_volume = sum(row[3] for row in rows)
+        total_cif = sum(row[4] for row in rows)
+        total_duty = sum(row[5] for row in rows)
+        total_savings = total_duty * 0.15  # Estimate 15% savings from optimization
+        average_duty_rate = total_duty / total_cif if total_cif else 0.0
+        
+        # Top HTS chapters by number of calculations, and duty per chapter
+        chapter_counts = defaultdict(int)
+        duty_by_chapter = defaultdict(float)
+        for _, chapter, queries, _, _, duty in rows:
+            if chapter:
+                chapter_counts[chapter] += queries
+                duty_by_chapter[chapter] += duty
+        top_hts_chapters = sorted(chapter_counts, key=chapter_counts.get, reverse=True)[:5]
+        
+        monthly_trends = self._calculate_monthly_trends(rows)
+        
+        return TradeMetrics(
+            total_volume=total_volume,
+            total_duty=total_duty,
+            total_savings=total_savings,
+            average_duty_rate=average_duty_rate,
+            top_hts_chapters=top_hts_chapters,
+            monthly_trends=monthly_trends,
+            duty_by_chapter=dict(duty_by_chapter)
+        )
+    
     def _generate_sample_metrics(self) -> TradeMetrics:
         """Generate sample metrics for demonstration"""
         return TradeMetrics(
@@ -85,58 +145,59 @@ class AdvancedAnalytics:
             total_duty=212500.0,
             total_savings=31875.0,
             average_duty_rate=0.085,
-            top_hts_codes=['0101.30.00.00', '0102.21.00.00', '0201.10.00.00'],
+            top_hts_chapters=['01', '02'],
             monthly_trends={
                 'Jan': 180000, 'Feb': 195000, 'Mar': 210000,
                 'Apr': 225000, 'May': 240000, 'Jun': 255000
-            }
+            },
+            duty_by_chapter={'01': 127500.0, '02': 85000.0}
         )
     
-    def _calculate_monthly_trends(self, df: pd.DataFrame) -> Dict[str, float]:
-        """Calculate monthly trade volume trends"""
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df['month'] = df['timestamp'].dt.strftime('%b')
-        
-        monthly_volume = df.groupby('month')['landed_cost'].sum().to_dict()
-        return monthly_volume
+    def _calculate_monthly_trends(self, rows: List[tuple]) -> Dict[str, float]:
+        """Calculate monthly trade volume trends from (period, chapter, queries, landed cost, ...) rollup rows"""
+        monthly_volume = defaultdict(float)
+        for row in sorted(rows):
+            monthly_volume[datetime.strptime(row[0][:7], '%Y-%m').strftime('%b')] += row[3]
+        return dict(monthly_volume)
     
-    def generate_usage_analytics(self) -> Dict[str, Any]:
+    def generate_usage_analytics(self, days: int = 30) -> Dict[str, Any]:
         """Generate usage analytics for the platform"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            
-            # Total queries
-            total_queries = pd.read_sql_query(
-                "SELECT COUNT(*) as count FROM queries", conn
-            ).iloc[0]['count']
-            
-            # Query types breakdown
-            query_types = pd.read_sql_query(
-                "SELECT query_type, COUNT(*) as count FROM queries GROUP BY query_type", 
-                conn
-            )
-            
-            # Daily activity for last 30 days
-            daily_activity = pd.read_sql_query("""
-                SELECT DATE(timestamp) as date, COUNT(*) as queries
-                FROM queries 
-                WHERE timestamp >= date('now', '-30 days')
-                GROUP BY DATE(timestamp)
-                ORDER BY date
-            """, conn)
-            
-            conn.close()
-            
-            return {
-                'total_queries': total_queries,
-                'query_types': query_types.to_dict('records'),
-                'daily_activity': daily_activity.to_dict('records')
-            }
-            
+            return self._cached('usage_analytics', (days, datetime.now().date().isoformat()),
+                                lambda: self._compute_usage_analytics(days))
         except Exception as e:
             print(f"Error generating usage analytics: {e}")
             return self._generate_sample_usage()
     
+    def _compute_usage_analytics(self, days: int) -> Dict[str, Any]:
+        # Totals over the retention period come from the monthly rollups
+        query_types = [
+            {'query_type': query_type, 'count': count}
+            for query_type, count in self.pool.execute(
+                "SELECT query_type, SUM(queries) FROM monthly_rollups GROUP BY query_type ORDER BY query_type"
+            )
+        ]
+        total_queries = sum(row['count'] for row in query_types)
+        
+        # Daily activity for the last days
+        start_date = (datetime.now() - timedelta(days=days)).date().isoformat()
+        daily_activity = [
+            {'date': date, 'queries': queries}
+            for date, queries in self.pool.execute("""
+                SELECT period, SUM(queries)
+                FROM daily_rollups
+                WHERE period >= ?
+                GROUP BY period
+                ORDER BY period
+            """, (start_date,))
+        ]
+        
+        return {
+            'total_queries': total_queries,
+            'query_types': query_types,
+            'daily_activity': daily_activity
+        }
+    
     def _generate_sample_usage(self) -> Dict[str, Any]:
         """Generate sample usage data"""
         dates = pd.date_range(start='2024-01-01', periods=30, freq='D')
@@ -149,13 +210,17 @@ class AdvancedAnalytics:
                 {'query_type': 'policy_question', 'count': 500}
             ],
             'daily_activity': [
-                {'date': date.strftime('%Y-%m-%d'), 'queries': np.random.poisson(15)}
+                {'date': date.strftime('%Y-%m-%d'), 'queries': int(np.random.poisson(15))}
                 for date in dates
             ]
         }
     
     def create_duty_rate_analysis(self, hts_codes: List[str]) -> go.Figure:
         """Create duty rate analysis visualization"""
+        return self._cached_figure('duty_rate_analysis', tuple(hts_codes),
+                                   lambda: self._build_duty_rate_analysis(hts_codes))
+    
+    def _build_duty_rate_analysis(self, hts_codes: List[str]) -> go.Figure:
         # Sample data for demonstration
         sample_data = {
             '0101.30.00.00': {'rate': 0.0, 'category': 'Live Animals'},
@@ -189,6 +254,9 @@ class AdvancedAnalytics:
     
     def create_trade_volume_heatmap(self) -> go.Figure:
         """Create trade volume heatmap by day and hour"""
+        return self._cached_figure('trade_volume_heatmap', (), self._build_trade_volume_heatmap)
+    
+    def _build_trade_volume_heatmap(self) -> go.Figure:
         # Generate sample data
         np.random.seed(42)
         days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
@@ -218,6 +286,9 @@ class AdvancedAnalytics:
     
     def create_cost_optimization_analysis(self) -> go.Figure:
         """Create cost optimization analysis chart"""
+        return self._cached_figure('cost_optimization_analysis', (), self._build_cost_optimization_analysis)
+    
+    def _build_cost_optimization_analysis(self) -> go.Figure:
         # Sample optimization data
         scenarios = ['Current', 'Optimized Routes', 'Alternative HTS', 'Combined']
         costs = [100000, 95000, 92000, 88000]
@@ -354,6 +425,18 @@ class AdvancedAnalytics:
         # Additional format support can be added here
         return json.dumps(report_data, indent=2, default=str).encode()
 
+_analytics: Dict[str, AdvancedAnalytics] = {}
+_analytics_lock = threading.Lock()
+
+def get_analytics(db_path: str = "data/query_history.db") -> AdvancedAnalytics:
+    """Process-wide analytics for a history database, so every session shares one cache"""
+    key = os.path.abspath(db_path)
+    with _analytics_lock:
+        analytics = _analytics.get(key)
+        if analytics is None:
+            analytics = _analytics[key] = AdvancedAnalytics(db_path)
+        return analytics
+
 # Utility functions for the analytics module
 def calculate_duty_efficiency(duty_paid: float, trade_value: float) -> float:
     """Calculate duty efficiency ratio"""
@@ -0,0 +1,226 @@
+"""
+Answer generation for policy questions.
+
+RAGTool hands the question and the retrieved General Notes excerpts to an
+AnswerGenerator, which yields the answer text as it is produced:
+
+    keyword    canned answers for the common programs, else an excerpt (default)
+    llama_cpp  a small quantized GGUF model run in process on the CPU
+               (llama-cpp-python, e.g. Qwen2.5-0.5B-Instruct Q4_K_M)
+    server     an OpenAI-compatible completions endpoint on the local machine
+               (llama.cpp server, Ollama, vLLM)
+
+The backend is chosen by GenerationConfig.backend (env LLM_BACKEND). Answers are
+wrapped in an AnswerStream, so the CLI and the web app can print tokens as they
+arrive and still get the complete response dict at the end.
+scripts/benchmark_generation.py reports time-to-first-token and tokens/s.
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.app_config import GenerationConfig, get_config
+
+GENERATOR_BACKENDS = ("keyword", "llama_cpp", "server")
+
+PROMPT_TEMPLATE = """You answer questions about U.S. import rules from excerpts of the General Notes of the Harmonized Tariff Schedule. Answer in at most three sentences using only the excerpts, and say so if they do not cover the question.
+
+Excerpts:
+{context}
+
+Question: {question}
+Answer:"""
+STOP_SEQUENCES = ["\nQuestion:", "\n\n\n"]
+
+
+def build_prompt(question: str, context: str) -> str:
+    return PROMPT_TEMPLATE.format(context=context.strip(), question=question.strip())
+
+
+class AnswerGenerator(ABC):
+    """Turns a question and its retrieved context into answer text, token by token"""
+
+    name = "base"
+
+    @property
+    def cache_key(self) -> str:
+        """Identifies the model, so cached answers are not served across backends"""
+        return self.name
+
+    @abstractmethod
+    def stream(self, question: str, context: str) -> Iterator[str]:
+        """Answer text in pieces, as it is generated"""
+
+    def generate(self, question: str, context: str) -> str:
+        return "".join(self.stream(question, context))
+
+
+class KeywordGenerator(AnswerGenerator):
+    """The original pattern matcher: no model, answers immediately"""
+
+    name = "keyword"
+
+    def answer(self, question: str, context: str) -> str:
+        query_lower = question.lower()
+
+        # Pattern matching for common questions
+        if "generalized system of preferences" in query_lower or "gsp" in query_lower:
+            return "The Generalized System of Preferences (GSP) is a U.S. trade preference program designed to promote economic development by allowing duty-free entry for thousands of products from designated developing countries."
+        elif "israel" in query_lower and ("free trade" in query_lower or "fta" in query_lower):
+            return "The United States-Israel Free Trade Agreement (FTA) provides for the elimination of duties on qualifying goods traded between the United States and Israel. It was the first FTA entered into by the United States."
+        elif "nafta" in query_lower or "usmca" in query_lower:
+            return "NAFTA (now USMCA) provides preferential tariff treatment for qualifying goods originating in Canada, Mexico, and the United States."
+        # Extract relevant snippet from context
+        return f"Based on the HTS General Notes: {context[:300]}..."
+
+    def stream(self, question: str, context: str) -> Iterator[str]:
+        yield from re.findall(r"\S+\s*", self.answer(question, context))
+
+
+class LlamaCppGenerator(AnswerGenerator):
+    """A local GGUF model on the CPU; loaded on first use"""
+
+    name = "llama_cpp"
+
+    def __init__(self, model_path: str, max_tokens: int = 256, context_window: int = 2048, threads: int = 0):
+        self.model_path = model_path
+        self.max_tokens = max_tokens
+        self.context_window = context_window
+        self.threads = threads or None
+        self._llm = None
+        # A llama context serves one generation at a time
+        self._lock = threading.Lock()
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.name}:{os.path.basename(self.model_path)}"
+
+    def _load(self):
+        if self._llm is None:
+            from llama_cpp import Llama
+
+            if not os.path.exists(self.model_path):
+                raise FileNotFoundError(f"No model at {self.model_path}; set LLM_MODEL_PATH to a GGUF file")
+            self._llm = Llama(model_path=self.model_path, n_ctx=self.context_window,
+                              n_threads=self.threads, verbose=False)
+        return self._llm
+
+    def stream(self, question: str, context: str) -> Iterator[str]:
+        with self._lock:
+            llm = self._load()
+            for chunk in llm.create_completion(build_prompt(question, context), max_tokens=self.max_tokens,
+                                               temperature=0.0, stop=STOP_SEQUENCES, stream=True):
+                text = chunk["choices"][0]["text"]
+                if text:
+                    yield text
+
+
+class ServerGenerator(AnswerGenerator):
+    """A local OpenAI-compatible server, streamed over server-sent events"""
+
+    name = "server"
+
+    def __init__(self, base_url: str, model: str = "local", max_tokens: int = 256, timeout: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self._session = None
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.name}:{self.model}"
+
+    def stream(self, question: str, context: str) -> Iterator[str]:
+        import requests
+
+        if self._session is None:
+            # Keeps the connection open between questions
+            self._session = requests.Session()
+        payload = {
+            "model": self.model,
+            "prompt": build_prompt(question, context),
+            "max_tokens": self.max_tokens,
+            "temperature": 0.0,
+            "stop": STOP_SEQUENCES,
+            "stream": True,
+        }
+        with self._session.post(f"{self.base_url}/completions", json=payload, stream=True,
+                                timeout=self.timeout) as response:
+            response.raise_for_status()
+            # chunk_size=None hands over each token as it arrives instead of filling 512-byte reads
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                text = json.loads(data)["choices"][0].get("text")
+                if text:
+                    yield text
+
+
+def get_generator(config: Optional[GenerationConfig] = None) -> AnswerGenerator:
+    """The generator selected in the configuration"""
+    config = config or get_config().generation
+    if config.backend == "keyword":
+        return KeywordGenerator()
+    if config.backend == "llama_cpp":
+        return LlamaCppGenerator(config.model_path, config.max_tokens, config.context_window, config.threads)
+    if config.backend == "server":
+        return ServerGenerator(config.server_url, config.server_model, config.max_tokens,
+                               get_config().performance.query_timeout_seconds)
+    raise ValueError(f"Unknown LLM_BACKEND {config.backend!r}; expected one of {', '.join(GENERATOR_BACKENDS)}")
+
+
+class AnswerStream:
+    """An answer that is still being generated.
+
+    Iterating yields the answer text piece by piece; once it is exhausted,
+    response holds the complete result ({"answer", "sources"}) and the
+    on_complete callbacks have run. result() drains the stream and returns it.
+    """
+
+    def __init__(self, tokens: Iterable[str], finish: Callable[[str], Dict]):
+        self._tokens = tokens
+        self._finish = finish
+        self._callbacks = []
+        self.response = None
+
+    @classmethod
+    def completed(cls, response: Dict) -> "AnswerStream":
+        """A stream over an answer that is already known (a cache hit)"""
+        stream = cls((), lambda text: response)
+        stream.response = response
+        return stream
+
+    def on_complete(self, callback: Callable[[Dict], None]):
+        if self.response is not None:
+            callback(self.response)
+        else:
+            self._callbacks.append(callback)
+        return self
+
+    def __iter__(self):
+        if self.response is not None:
+            yield self.response.get("answer", "")
+            return
+        parts = []
+        for token in self._tokens:
+            parts.append(token)
+            yield token
+        self.response = self._finish("".join(parts))
+        for callback in self._callbacks:
+            callback(self.response)
+
+    def result(self) -> Dict:
+        for _ in self:
+            pass
+        return self.response
@@ -0,0 +1,188 @@
+"""
+Shared SQLite connection pool for the HTS databases.
+
+Every tool used to open and close a connection per operation, so concurrent
+Streamlit sessions spent most of their time in connect/teardown. The pool keeps
+one long-lived read connection per thread (memory-mapped I/O and a larger page
+cache) and a single serialized writer connection per database.
+
+Databases the app owns (query history, caches, derived indexes) are switched
+to WAL mode so readers never wait for the writer. The tariff schedule is only
+read by the app: its pool is opened with read_only=True, which connects with
+mode=ro and leaves the file, journal mode included, exactly as ingested.
+
+Statements are compiled once per connection: sqlite3 keeps a per-connection
+statement cache keyed by SQL text, so callers should pass constant SQL strings
+with bound parameters instead of formatting values into the query.
+"""
+
+import atexit
+import os
+import pathlib
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.app_config import get_config
+
+MMAP_SIZE_BYTES = 256 * 1024 * 1024
+CACHE_SIZE_KIB = 64 * 1024
+STATEMENT_CACHE_SIZE = 256
+
+
+class ConnectionPool:
+    """Per-thread reader connections plus one writer connection for a database"""
+
+    def __init__(self, db_path: str, max_readers: Optional[int] = None,
+                 timeout: Optional[float] = None, read_only: bool = False, wal: bool = True):
+        performance = get_config().performance
+        self.db_path = db_path
+        self.read_only = read_only
+        self.wal = wal and not read_only
+        self.max_readers = max_readers or performance.max_concurrent_requests
+        self.timeout = timeout or performance.query_timeout_seconds
+
+        self._local = threading.local()
+        self._readers: Dict[int, sqlite3.Connection] = {}
+        self._readers_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_readers)
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.RLock()
+
+    def _connect(self, **kwargs) -> sqlite3.Connection:
+        if self.read_only:
+            database = f"{pathlib.Path(self.db_path).absolute().as_uri()}?mode=ro"
+            kwargs["uri"] = True
+        else:
+            database = self.db_path
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(
+            database,
+            timeout=self.timeout,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            **kwargs
+        )
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE_BYTES}")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    def _open_writer(self) -> sqlite3.Connection:
+        if self.read_only:
+            raise sqlite3.OperationalError(f"{self.db_path} is opened read-only")
+        conn = self._connect(check_same_thread=False)
+        try:
+            if self.wal:
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.execute("PRAGMA synchronous = NORMAL")
+            else:
+                # Undoes the WAL switch earlier versions made on every database
+                conn.execute("PRAGMA journal_mode = DELETE")
+        except sqlite3.OperationalError:
+            # Read-only media: keep the current journal mode
+            pass
+        return conn
+
+    def _reader_connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.wal:
+                # Switch the file to WAL before the first reader attaches
+                with self._writer_lock:
+                    if self._writer is None:
+                        self._writer = self._open_writer()
+            # Readers run in autocommit mode so they never pin an old snapshot;
+            # they are only used by their own thread but may be closed by others
+            conn = self._connect(isolation_level=None, check_same_thread=False)
+            self._local.conn = conn
+            with self._readers_lock:
+                self._reap_dead_readers()
+                self._readers[threading.get_ident()] = conn
+        return conn
+
+    def _reap_dead_readers(self):
+        """Close connections whose owning threads have exited"""
+        alive = {thread.ident for thread in threading.enumerate()}
+        for ident in [ident for ident in self._readers if ident not in alive]:
+            self._readers.pop(ident).close()
+
+    @contextmanager
+    def reader(self):
+        """Borrow this thread's read connection, bounded by max_readers"""
+        depth = getattr(self._local, "depth", 0)
+        # Nested use within one thread shares the slot it already holds
+        if depth == 0 and not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(
+                f"No database connection available for {self.db_path} within {self.timeout}s"
+            )
+        self._local.depth = depth + 1
+        try:
+            yield self._reader_connection()
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                self._slots.release()
+
+    @contextmanager
+    def writer(self):
+        """Serialized write transaction; commits on success, rolls back on error"""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._open_writer()
+            conn = self._writer
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def execute(self, sql: str, params=()):
+        """Run a read query and return all rows"""
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def close(self):
+        with self._readers_lock:
+            for conn in self._readers.values():
+                conn.close()
+            self._readers.clear()
+        self._local = threading.local()
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+_pools: Dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str, read_only: bool = False, wal: bool = True) -> ConnectionPool:
+    """Get the process-wide pool for a database path.
+
+    read_only=True is for databases the app never writes (the tariff schedule);
+    wal=False keeps a writable database on its rollback journal.
+    """
+    key = (os.path.abspath(db_path), read_only, wal and not read_only)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_path, read_only=read_only, wal=wal)
+        return pool
+
+
+def close_all_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+atexit.register(close_all_pools)
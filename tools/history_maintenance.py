@@ -0,0 +1,261 @@
+"""
+Retention, archiving and backups for the query history database.
+
+data/query_history.db holds recent history only. HistoryMaintenance.run():
+
+    archive   rows older than DatabaseConfig.history_live_days move to one
+              SQLite file per month (data/history_archive/query_history-2024-01.db)
+              with the JSON response zlib-compressed
+    expire    history older than AnalyticsConfig.retention_days is deleted,
+              whole archive files at a time where possible, with its
+              daily and monthly rollups (archiving leaves rollups alone)
+    compact   pages freed by the moves are returned to the filesystem a few
+              at a time (incremental vacuum); a database created before
+              incremental vacuum was enabled is rebuilt once, by hand only
+    backup    every backup_interval_hours, an online copy of the live database
+              is written to backup_dir with the SQLite backup API; the newest
+              backup_keep copies are kept
+
+Rows are moved and deleted in batches of BATCH_ROWS, one transaction each, so
+history writes (which the HistoryWriter queues anyway) wait for one batch at
+most. A row reaches its archive before it leaves the live database, and
+archives insert by the original id, so an interrupted run is simply repeated.
+The backup copies from a WAL read snapshot and does not block writers.
+
+The web app runs maintenance hourly on a background thread
+(TariffBot(maintenance=True)); scripts/maintain_history.py runs it by hand.
+"""
+
+import glob
+import json
+import os
+import sqlite3
+import sys
+import threading
+import zlib
+from collections import defaultdict
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.app_config import get_config
+from tools.memory_handler import BUMP_HISTORY_VERSION_SQL, ROLLUP_TABLES
+
+BATCH_ROWS = 5000
+VACUUM_PAGES = 1024
+MAINTENANCE_INTERVAL_SECONDS = 3600
+ARCHIVE_PREFIX = "query_history-"
+
+ARCHIVE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS queries (
+        id INTEGER PRIMARY KEY,
+        timestamp TEXT,
+        query TEXT,
+        query_type TEXT,
+        response_z BLOB,
+        hts_code TEXT,
+        landed_cost REAL,
+        cif_value REAL,
+        total_duty REAL,
+        origin TEXT
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_queries_timestamp ON queries (timestamp)",
+]
+
+SELECT_EXPIRED_SQL = '''
+    SELECT id, timestamp, query, query_type, response, hts_code, landed_cost, cif_value, total_duty, origin
+    FROM queries
+    WHERE timestamp < ?
+    ORDER BY timestamp
+    LIMIT ?
+'''
+
+DELETE_EXPIRED_SQL = '''
+    DELETE FROM queries WHERE id IN (
+        SELECT id FROM queries WHERE timestamp < ? ORDER BY timestamp LIMIT ?
+    )
+'''
+
+
+def archive_path(archive_dir: str, month: str) -> str:
+    return os.path.join(archive_dir, f"{ARCHIVE_PREFIX}{month}.db")
+
+
+def archive_months(archive_dir: str) -> List[str]:
+    """Months ("2024-01") that have an archive file, oldest first"""
+    pattern = os.path.join(archive_dir, f"{ARCHIVE_PREFIX}*.db")
+    return sorted(os.path.basename(path)[len(ARCHIVE_PREFIX):-3] for path in glob.glob(pattern))
+
+
+def read_archive(archive_dir: str, month: str) -> Iterator[Dict[str, Any]]:
+    """Archived queries of a month, in the shape of MemoryHandler.get_recent_queries"""
+    with closing(sqlite3.connect(archive_path(archive_dir, month))) as conn:
+        for timestamp, query, query_type, response_z in conn.execute(
+                "SELECT timestamp, query, query_type, response_z FROM queries ORDER BY timestamp"):
+            yield {
+                'timestamp': timestamp,
+                'query': query,
+                'query_type': query_type,
+                'response': json.loads(zlib.decompress(response_z)) if response_z else None
+            }
+
+
+class HistoryMaintenance:
+    """Keeps a MemoryHandler's database small: archives, expires, compacts and backs it up"""
+
+    def __init__(self, memory, archive_dir: Optional[str] = None, backup_dir: Optional[str] = None,
+                 live_days: Optional[int] = None, retention_days: Optional[int] = None):
+        config = get_config()
+        self.memory = memory
+        self.pool = memory.pool
+        self.archive_dir = archive_dir or config.database.history_archive_dir
+        self.backup_dir = backup_dir or config.database.backup_dir
+        self.live_days = live_days or config.database.history_live_days
+        self.retention_days = retention_days or config.analytics.retention_days
+        self.backup_enabled = config.database.backup_enabled
+        self.backup_interval = timedelta(hours=config.database.backup_interval_hours)
+        self.backup_keep = config.database.backup_keep
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_error = None
+
+    def run(self, now: Optional[datetime] = None, rebuild: bool = False) -> Dict[str, Any]:
+        """All maintenance that is due; rebuild allows compact()'s one-off full VACUUM"""
+        now = now or datetime.now()
+        self.memory.flush()
+        # Expired rows are deleted before archiving, so they are never written to an archive
+        stats = {"expired": self.expire(now - timedelta(days=self.retention_days))}
+        stats["archived"] = self.archive(now - timedelta(days=self.live_days))
+        stats["vacuumed_pages"] = self.compact(rebuild)
+        if self.backup_enabled and self._backup_due(now):
+            stats["backup"] = self.backup(now)
+        return stats
+
+    def archive(self, cutoff: datetime) -> int:
+        """Move live rows older than cutoff into their monthly archives"""
+        moved = 0
+        while True:
+            rows = self.pool.execute(SELECT_EXPIRED_SQL, (cutoff.isoformat(), BATCH_ROWS))
+            if not rows:
+                return moved
+            by_month = defaultdict(list)
+            for row in rows:
+                response = row[4]
+                compressed = zlib.compress(response.encode("utf-8")) if response else None
+                by_month[row[1][:7]].append(row[:4] + (compressed,) + row[5:])
+            for month, month_rows in by_month.items():
+                with closing(self._open_archive(month)) as conn, conn:
+                    conn.executemany("INSERT OR IGNORE INTO queries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                     month_rows)
+            with self.pool.writer() as conn:
+                conn.executemany("DELETE FROM queries WHERE id = ?", ((row[0],) for row in rows))
+            moved += len(rows)
+
+    def _open_archive(self, month: str) -> sqlite3.Connection:
+        os.makedirs(self.archive_dir, exist_ok=True)
+        conn = sqlite3.connect(archive_path(self.archive_dir, month))
+        for statement in ARCHIVE_SCHEMA:
+            conn.execute(statement)
+        return conn
+
+    def expire(self, cutoff: datetime) -> int:
+        """Delete history older than cutoff, live and archived, and its rollups"""
+        expired = self._delete_before(self.pool.writer, cutoff)
+        with self.pool.writer() as conn:
+            for table, length in ROLLUP_TABLES.items():
+                conn.execute(f"DELETE FROM {table} WHERE period < ?", (cutoff.isoformat()[:length],))
+            conn.execute(BUMP_HISTORY_VERSION_SQL)
+        cutoff_month = cutoff.strftime("%Y-%m")
+        for month in archive_months(self.archive_dir):
+            path = archive_path(self.archive_dir, month)
+            if month < cutoff_month:
+                with closing(sqlite3.connect(path)) as conn:
+                    expired += conn.execute("SELECT COUNT(*) FROM queries").fetchone()[0]
+                os.remove(path)
+            elif month == cutoff_month:
+                with closing(sqlite3.connect(path)) as conn:
+                    expired += self._delete_before(lambda: conn, cutoff)
+        return expired
+
+    @staticmethod
+    def _delete_before(transaction, cutoff: datetime) -> int:
+        deleted = 0
+        while True:
+            with transaction() as conn:
+                count = conn.execute(DELETE_EXPIRED_SQL, (cutoff.isoformat(), BATCH_ROWS)).rowcount
+            deleted += count
+            if count < BATCH_ROWS:
+                return deleted
+
+    def compact(self, rebuild: bool = False) -> int:
+        """Return free pages to the filesystem, VACUUM_PAGES per transaction.
+        
+        Databases created before incremental vacuum was enabled need one full
+        VACUUM, which locks out writers while it copies the whole file: it runs
+        only with rebuild=True (scripts/maintain_history.py), never in the
+        background, and until then their free pages are simply reused."""
+        with self.pool.writer() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                if not rebuild:
+                    return 0
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        for _ in range(0, free_pages, VACUUM_PAGES):
+            with self.pool.writer() as conn:
+                # execute() would stop after the first page; executescript runs the pragma to completion
+                conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES});")
+        return free_pages
+
+    def backups(self) -> List[str]:
+        """Backup files, oldest first"""
+        return sorted(glob.glob(os.path.join(self.backup_dir, f"{ARCHIVE_PREFIX}*.db")))
+
+    def _backup_due(self, now: datetime) -> bool:
+        backups = self.backups()
+        if not backups:
+            return True
+        return now - datetime.fromtimestamp(os.path.getmtime(backups[-1])) >= self.backup_interval
+
+    def backup(self, now: Optional[datetime] = None) -> str:
+        """Online copy of the live database; keeps the newest backup_keep copies"""
+        now = now or datetime.now()
+        os.makedirs(self.backup_dir, exist_ok=True)
+        path = os.path.join(self.backup_dir, f"{ARCHIVE_PREFIX}{now:%Y%m%d-%H%M%S}.db")
+        with closing(sqlite3.connect(f"{path}.tmp")) as target:
+            with self.pool.reader() as source:
+                # One step from a single read snapshot: writers carry on in the WAL meanwhile
+                source.backup(target)
+        os.replace(f"{path}.tmp", path)
+        for old in self.backups()[:-self.backup_keep]:
+            os.remove(old)
+        return path
+
+    def start(self, interval: float = MAINTENANCE_INTERVAL_SECONDS, initial_delay: float = 60.0):
+        """Run maintenance every interval seconds on a daemon thread"""
+        if self._thread is None:
+            def loop():
+                if self._stop.wait(initial_delay):
+                    return
+                while True:
+                    try:
+                        self.run()
+                        self.last_error = None
+                    except Exception as e:
+                        # Retried at the next interval; history keeps working meanwhile
+                        self.last_error = e
+                    if self._stop.wait(interval):
+                        return
+            self._thread = threading.Thread(target=loop, name="history-maintenance", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,370 @@
+"""
+In-memory HTS schedule index with hierarchical rate inheritance.
+
+The published schedule only states rates on the line that introduces them:
+statistical suffixes such as 0201.10.05.10 inherit the rates of their 8-digit
+parent 0201.10.05, and some rows carry no HTS number at all, only an Indent.
+HTSScheduleIndex rebuilds the tree once from the Indent column, resolves the
+effective rates, units and full description of every line, and offers O(1)
+lookup by normalized code plus prefix-range lookup for chapters and headings.
+
+The resolved index can be written to a compact binary snapshot so other
+processes load it in milliseconds instead of re-reading the schedule.
+"""
+
+import bisect
+import csv
+import json
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.db_pool import get_pool
+from tools.rate_compiler import CompiledRate, compile_rate
+
+SNAPSHOT_VERSION = 1
+DEFAULT_SNAPSHOT_PATH = "data/hts_index.snapshot"
+
+# Seconds between schedule version checks; lookups in between hit the memo only
+VERSION_CHECK_INTERVAL = 5.0
+
+SCHEDULE_COLUMNS = [
+    "HTS Number", "Indent", "Description", "Unit of Quantity",
+    "General Rate of Duty", "Special Rate of Duty", "Column 2 Rate of Duty",
+]
+
+
+def normalize_code(code) -> str:
+    """'0201.10.05.10' -> '0201100510'; works for partial codes too"""
+    if code is None:
+        return ""
+    return "".join(ch for ch in str(code) if ch.isdigit())
+
+
+def _parse_units(raw) -> Tuple[str, ...]:
+    """Unit of Quantity is stored as a JSON list, e.g. '["kg","kg cmsc"]'"""
+    if not raw or not isinstance(raw, str):
+        return ()
+    try:
+        units = json.loads(raw)
+    except ValueError:
+        units = [raw]
+    return tuple(unit for unit in units if unit)
+
+
+def _blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip()) or value != value
+
+
+@dataclass
+class ScheduleEntry:
+    """One schedule line with its effective (inherited) attributes"""
+    position: int
+    code: Optional[str]
+    key: str
+    indent: int
+    description: str
+    full_description: str
+    units: Tuple[str, ...]
+    general_rate: Optional[str]
+    special_rate: Optional[str]
+    column2_rate: Optional[str]
+    rate_source: Optional[str]
+    parent: int = -1
+
+    @property
+    def unit(self) -> str:
+        return ", ".join(self.units)
+
+    @property
+    def chapter(self) -> str:
+        return self.key[:2]
+
+    @property
+    def heading(self) -> str:
+        return self.key[:4]
+
+    @property
+    def general(self) -> CompiledRate:
+        return compile_rate(self.general_rate)
+
+    @property
+    def special(self) -> CompiledRate:
+        return compile_rate(self.special_rate)
+
+    @property
+    def column2(self) -> CompiledRate:
+        return compile_rate(self.column2_rate)
+
+    def as_row(self) -> Dict[str, object]:
+        """The entry in hts_data column naming, with effective values filled in"""
+        return {
+            "HTS Number": self.code,
+            "Indent": self.indent,
+            "Description": self.full_description,
+            "Unit of Quantity": self.unit,
+            "General Rate of Duty": self.general_rate,
+            "Special Rate of Duty": self.special_rate,
+            "Column 2 Rate of Duty": self.column2_rate,
+        }
+
+
+class HTSScheduleIndex:
+    """Resolved schedule tree with code and prefix lookups"""
+
+    def __init__(self, entries: List[ScheduleEntry], source_signature=None):
+        self.entries = entries
+        self.source_signature = source_signature
+        self.by_key: Dict[str, ScheduleEntry] = {}
+        for entry in entries:
+            # The first line wins, matching the hts_data lookups it replaces
+            if entry.key and entry.key not in self.by_key:
+                self.by_key[entry.key] = entry
+        self.sorted_keys = sorted(self.by_key)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, code) -> bool:
+        return normalize_code(code) in self.by_key
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, object]], source_signature=None) -> "HTSScheduleIndex":
+        """Build the tree from schedule rows given in schedule order"""
+        entries: List[ScheduleEntry] = []
+        stack: List[ScheduleEntry] = []
+
+        for row in rows:
+            indent = row.get("Indent")
+            indent = int(float(indent)) if not _blank(indent) else 0
+            code = row.get("HTS Number")
+            code = str(code).strip() if not _blank(code) else None
+            description = str(row.get("Description") or "").strip()
+
+            while stack and stack[-1].indent >= indent:
+                stack.pop()
+            parent = stack[-1] if stack else None
+
+            own_rates = [
+                None if _blank(row.get(col)) else str(row.get(col)).strip()
+                for col in ("General Rate of Duty", "Special Rate of Duty", "Column 2 Rate of Duty")
+            ]
+            # Rates are inherited as a group from the nearest line that states any
+            if any(own_rates) or parent is None:
+                general, special, column2 = own_rates
+                rate_source = code if any(own_rates) else None
+            else:
+                general, special, column2 = parent.general_rate, parent.special_rate, parent.column2_rate
+                rate_source = parent.rate_source
+
+            units = _parse_units(row.get("Unit of Quantity"))
+            if not units and parent is not None:
+                units = parent.units
+
+            label = description.rstrip(":").strip()
+            if parent is not None and parent.full_description:
+                full_description = f"{parent.full_description}; {label}" if label else parent.full_description
+            else:
+                full_description = label
+
+            entry = ScheduleEntry(
+                position=len(entries),
+                code=code,
+                key=normalize_code(code),
+                indent=indent,
+                description=description,
+                full_description=full_description,
+                units=units,
+                general_rate=general,
+                special_rate=special,
+                column2_rate=column2,
+                rate_source=rate_source,
+                parent=parent.position if parent else -1,
+            )
+            entries.append(entry)
+            stack.append(entry)
+
+        return cls(entries, source_signature)
+
+    @classmethod
+    def from_csv(cls, paths) -> "HTSScheduleIndex":
+        """Build from one or more schedule CSV exports, in the given order"""
+        if isinstance(paths, str):
+            paths = [paths]
+
+        def rows():
+            for path in paths:
+                with open(path, newline="", encoding="utf-8") as f:
+                    yield from csv.DictReader(f)
+
+        return cls.from_rows(rows(), source_signature=tuple(_file_signature(p) for p in paths))
+
+    @classmethod
+    def from_db(cls, db_path: str = "data/hts.db") -> "HTSScheduleIndex":
+        """Build from the hts_data table in storage order"""
+        pool = get_pool(db_path, read_only=True)
+        columns = ", ".join(f'"{col}"' for col in SCHEDULE_COLUMNS)
+        existing = {row[1] for row in pool.execute("PRAGMA table_info(hts_data)")}
+        # Tables written by the ingest pipeline record each row's source position
+        order = '"Source File", "Row Number"' if "Row Number" in existing else "rowid"
+        rows = pool.execute(f"SELECT {columns} FROM hts_data ORDER BY {order}")
+        return cls.from_rows((dict(zip(SCHEDULE_COLUMNS, row)) for row in rows),
+                             source_signature=db_signature(db_path))
+
+    def get(self, code) -> Optional[ScheduleEntry]:
+        """O(1) lookup by HTS code in any punctuation"""
+        return self.by_key.get(normalize_code(code))
+
+    def parent_of(self, entry: ScheduleEntry) -> Optional[ScheduleEntry]:
+        return self.entries[entry.parent] if entry.parent >= 0 else None
+
+    def ancestors(self, entry: ScheduleEntry) -> List[ScheduleEntry]:
+        chain = []
+        while entry.parent >= 0:
+            entry = self.entries[entry.parent]
+            chain.append(entry)
+        return chain
+
+    def prefix(self, prefix) -> List[ScheduleEntry]:
+        """All coded lines whose code starts with the prefix, in code order"""
+        prefix = normalize_code(prefix)
+        start = bisect.bisect_left(self.sorted_keys, prefix)
+        # ':' sorts right after '9', closing the range of digit strings
+        end = bisect.bisect_left(self.sorted_keys, prefix + ":")
+        return [self.by_key[key] for key in self.sorted_keys[start:end]]
+
+    def chapter(self, chapter) -> List[ScheduleEntry]:
+        return self.prefix(str(chapter).zfill(2))
+
+    def heading(self, heading) -> List[ScheduleEntry]:
+        return self.prefix(normalize_code(heading).zfill(4))
+
+    def save(self, path: str = DEFAULT_SNAPSHOT_PATH):
+        """Write a compact binary snapshot of the resolved entries"""
+        payload = {
+            "version": SNAPSHOT_VERSION,
+            "source_signature": self.source_signature,
+            "entries": [
+                (e.code, e.indent, e.description, e.full_description, e.units,
+                 e.general_rate, e.special_rate, e.column2_rate, e.rate_source, e.parent)
+                for e in self.entries
+            ],
+        }
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_SNAPSHOT_PATH) -> "HTSScheduleIndex":
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+        if payload.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported schedule snapshot version in {path}")
+        entries = [
+            ScheduleEntry(position, code, normalize_code(code), indent, description, full_description,
+                          tuple(units), general, special, column2, rate_source, parent)
+            for position, (code, indent, description, full_description, units,
+                           general, special, column2, rate_source, parent) in enumerate(payload["entries"])
+        ]
+        return cls(entries, payload.get("source_signature"))
+
+    @classmethod
+    def load_or_build(cls, db_path: str = "data/hts.db",
+                      snapshot_path: str = DEFAULT_SNAPSHOT_PATH) -> "HTSScheduleIndex":
+        """Load the snapshot if it matches the database, otherwise rebuild it"""
+        signature = db_signature(db_path)
+        if os.path.exists(snapshot_path):
+            try:
+                index = cls.load(snapshot_path)
+                if index.source_signature == signature:
+                    return index
+            except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+                pass
+
+        index = cls.from_db(db_path)
+        try:
+            index.save(snapshot_path)
+        except OSError:
+            # A read-only deployment still gets the in-memory index
+            pass
+        return index
+
+
+def _file_signature(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (path, None, None)
+    return (os.path.basename(path), stat.st_size, stat.st_mtime_ns)
+
+
+def get_schedule_version(db_path: str) -> Optional[int]:
+    """Schedule version bumped by the ingest pipeline, or None if never ingested"""
+    try:
+        rows = get_pool(db_path, read_only=True).execute(
+            "SELECT value FROM hts_meta WHERE key = 'schedule_version'"
+        )
+    except sqlite3.OperationalError:
+        return None
+    return int(rows[0][0]) if rows else None
+
+
+def db_signature(db_path: str):
+    """Identifies the schedule contents a derived structure was built from.
+
+    Databases maintained by scripts/ingest_hts.py carry a schedule version;
+    older ones fall back to the stat of the file, which the app only ever
+    opens read-only.
+    """
+    version = get_schedule_version(db_path)
+    if version is not None:
+        return ("schedule_version", version)
+    return (_file_signature(db_path),)
+
+
+_indexes: Dict[str, HTSScheduleIndex] = {}
+_checked_at: Dict[str, float] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_schedule_index(db_path: str = "data/hts.db",
+                       snapshot_path: str = DEFAULT_SNAPSHOT_PATH) -> HTSScheduleIndex:
+    """Process-wide index for a database, reloaded when the database changes"""
+    key = os.path.abspath(db_path)
+    now = time.monotonic()
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None and now - _checked_at[key] < VERSION_CHECK_INTERVAL:
+            return index
+        if index is None or index.source_signature != db_signature(db_path):
+            index = _indexes[key] = HTSScheduleIndex.load_or_build(db_path, snapshot_path)
+        _checked_at[key] = now
+        return index
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    index = HTSScheduleIndex.from_db()
+    print(f"Built index of {len(index)} lines in {(time.perf_counter() - start) * 1000:.1f} ms")
+    index.save()
+    start = time.perf_counter()
+    HTSScheduleIndex.load()
+    print(f"Loaded snapshot in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    entry = index.get("0201.10.05.10")
+    print(entry.full_description)
+    print(entry.general_rate, "|", entry.special_rate, "|", entry.column2_rate, "| from", entry.rate_source)
+    print(f"Chapter 02 lines: {len(index.chapter(2))}")
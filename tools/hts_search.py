@@ -0,0 +1,216 @@
+"""
+Full-text search over HTS descriptions.
+
+An SQLite FTS5 table holds one document per coded schedule line with its own
+description, the descriptions of all its ancestors (so "Veal" matches
+"bovine"), and its normalized code for prefix filtering. Queries are ranked with
+BM25, the last word is treated as a prefix ("bovi" finds "bovine"), and lookups
+cost the same whether the schedule has 2k or 30k lines.
+
+The index for data/hts.db lives in its own file (data/hts_search.db) and is
+rebuilt whenever the schedule signature changes. Small fixed catalogs, such as
+the app's sample codes, can be indexed in memory with from_records.
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.db_pool import get_pool
+from tools.hts_index import HTSScheduleIndex, get_schedule_index, normalize_code
+
+DEFAULT_SEARCH_PATH = "data/hts_search.db"
+
+# Description matches outrank matches that only hit an ancestor's text
+DESCRIPTION_WEIGHT = 10.0
+CONTEXT_WEIGHT = 2.0
+
+CODE_QUERY_PATTERN = re.compile(r"^[\d.\s]+$")
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+FTS_SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS hts_fts USING fts5(
+        code_key,
+        description,
+        context,
+        code UNINDEXED,
+        general_rate UNINDEXED,
+        tokenize = 'porter unicode61 remove_diacritics 2',
+        prefix = '2 4 6'
+    )
+"""
+
+SEARCH_SQL = f"""
+    SELECT code, description, context, general_rate,
+           bm25(hts_fts, 0.0, {DESCRIPTION_WEIGHT}, {CONTEXT_WEIGHT}) AS score
+    FROM hts_fts
+    WHERE hts_fts MATCH ?
+    ORDER BY score
+    LIMIT ?
+"""
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    code: str
+    description: str
+    full_description: str
+    general_rate: str
+    score: float
+
+
+def _match_expression(query: str, operator: str = " ") -> Optional[str]:
+    """Turn free text into an FTS5 expression; the last word is a prefix"""
+    tokens = TOKEN_PATTERN.findall(query.lower())
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens[:-1]] + [f'"{tokens[-1]}"*']
+    return operator.join(terms)
+
+
+def _schedule_documents(schedule: HTSScheduleIndex):
+    # Uncoded header rows are only searchable through their children's context
+    return (
+        (entry.code, entry.description, entry.full_description, entry.general_rate)
+        for entry in schedule.entries
+        if entry.code
+    )
+
+
+class HTSSearchIndex:
+    """BM25-ranked full-text search over schedule descriptions"""
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        if path == ":memory:":
+            # A private in-memory database only exists on its own connection
+            self.pool = None
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._lock = threading.Lock()
+        else:
+            self.pool = get_pool(path)
+        with self._writer() as conn:
+            conn.execute(FTS_SCHEMA)
+            conn.execute("CREATE TABLE IF NOT EXISTS hts_search_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    @contextmanager
+    def _reader(self):
+        if self.pool is not None:
+            with self.pool.reader() as conn:
+                yield conn
+        else:
+            with self._lock:
+                yield self._conn
+
+    @contextmanager
+    def _writer(self):
+        if self.pool is not None:
+            with self.pool.writer() as conn:
+                yield conn
+        else:
+            with self._lock, self._conn:
+                yield self._conn
+
+    def build(self, documents: Iterable[Tuple[str, str, str, str]], signature=None):
+        """Replace the index with (code, description, context, general_rate) rows"""
+        rows = (
+            (normalize_code(code), description or "", context or "", code, general_rate or "")
+            for code, description, context, general_rate in documents
+        )
+        with self._writer() as conn:
+            conn.execute("DELETE FROM hts_fts")
+            conn.executemany(
+                "INSERT INTO hts_fts (code_key, description, context, code, general_rate) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute("INSERT INTO hts_fts (hts_fts) VALUES ('optimize')")
+            conn.execute(
+                "INSERT OR REPLACE INTO hts_search_meta (key, value) VALUES ('signature', ?)",
+                (repr(signature),)
+            )
+        return self
+
+    @property
+    def signature(self) -> Optional[str]:
+        with self._reader() as conn:
+            row = conn.execute("SELECT value FROM hts_search_meta WHERE key = 'signature'").fetchone()
+        return row[0] if row else None
+
+    def __len__(self):
+        with self._reader() as conn:
+            return conn.execute("SELECT COUNT(*) FROM hts_fts").fetchone()[0]
+
+    @classmethod
+    def from_schedule(cls, schedule: HTSScheduleIndex, path: str = ":memory:") -> "HTSSearchIndex":
+        """Index every coded line of a schedule, with its ancestors' text as context"""
+        return cls(path).build(_schedule_documents(schedule), signature=schedule.source_signature)
+
+    @classmethod
+    def from_records(cls, records: Dict[str, Dict]) -> "HTSSearchIndex":
+        """In-memory index over a {code: {"description", "category", ...}} catalog"""
+        documents = (
+            (code, info.get("description", ""), info.get("category", ""),
+             info.get("general_rate", ""))
+            for code, info in records.items()
+        )
+        return cls().build(documents)
+
+    def search(self, query: str, limit: int = 10, code_prefix: Optional[str] = None) -> List[SearchHit]:
+        """Ranked matches for a keyword or code query.
+
+        A query made only of digits and dots is treated as a code prefix.
+        Keyword queries require every word; if nothing matches, any word will do.
+        """
+        query = (query or "").strip()
+        if CODE_QUERY_PATTERN.match(query):
+            code_prefix, query = query, ""
+
+        code_filter = None
+        if code_prefix:
+            key = normalize_code(code_prefix)
+            if key:
+                code_filter = f'code_key : "{key}"*'
+
+        expressions = [_match_expression(query), _match_expression(query, " OR ")] if query else [None]
+        for expression in expressions:
+            parts = [part for part in (code_filter, f"({expression})" if expression else None) if part]
+            if not parts:
+                return []
+            with self._reader() as conn:
+                rows = conn.execute(SEARCH_SQL, (" AND ".join(parts), limit)).fetchall()
+            if rows:
+                return [SearchHit(*row) for row in rows]
+        return []
+
+    def search_codes(self, query: str, limit: int = 10, code_prefix: Optional[str] = None) -> List[str]:
+        return [hit.code for hit in self.search(query, limit, code_prefix)]
+
+
+# Search index per path, with the schedule index it was last checked against
+_search_indexes: Dict[str, Tuple[HTSSearchIndex, HTSScheduleIndex]] = {}
+_search_lock = threading.Lock()
+
+
+def get_search_index(db_path: str = "data/hts.db",
+                     search_path: str = DEFAULT_SEARCH_PATH) -> HTSSearchIndex:
+    """Search index for a schedule database, rebuilt when the schedule changes"""
+    key = os.path.abspath(search_path)
+    with _search_lock:
+        # get_schedule_index paces the version checks; the stored signature is
+        # only read again once it returns a different schedule
+        schedule = get_schedule_index(db_path)
+        index, checked = _search_indexes.get(key, (None, None))
+        if checked is not schedule:
+            index = index or HTSSearchIndex(search_path)
+            if index.signature != repr(schedule.source_signature):
+                index.build(_schedule_documents(schedule), signature=schedule.source_signature)
+            _search_indexes[key] = (index, schedule)
+        return index
@@ -1,20 +1,216 @@
+import atexit
+import itertools
 import json
 import os
+import sys
+import threading
+import weakref
 from datetime import datetime
-from typing import List, Dict, Any
-import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
-class MemoryHandler:
-    def __init__(self, db_path="data/query_history.db"):
-        self.db_path = db_path
-        self._init_db()
-    
-    def _init_db(self):
-        """Initialize the database for storing query history"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.app_config import get_config
+from tools.db_pool import get_pool
+from tools.sparse_index import STOPWORDS, TOKEN_PATTERN
+
+# How far a history write is trusted to survive a crash
+HISTORY_DURABILITY = {
+    "off": "OFF",        # buffered; the OS decides when it reaches disk
+    "normal": "NORMAL",  # buffered; WAL commits survive an application crash
+    "full": "FULL",      # written and synced before add_query returns
+}
+
+INSERT_HISTORY_SQL = '''
+    INSERT INTO queries (timestamp, query, query_type, response, hts_code, landed_cost, cif_value, total_duty, origin)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# PRAGMA user_version of a history database with the current schema
+HISTORY_SCHEMA_VERSION = 4
+
+HISTORY_COLUMNS = {
+    "cif_value": "REAL",
+    "total_duty": "REAL",
+    "origin": "TEXT",
+}
+
+HISTORY_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_queries_timestamp ON queries (timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_queries_type_timestamp ON queries (query_type, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_queries_hts_code ON queries (hts_code, timestamp)",
+]
+
+# Row counts per query type, kept current by triggers so statistics never scan
+HISTORY_COUNTERS = [
+    '''
+    CREATE TABLE IF NOT EXISTS query_counts (
+        query_type TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS queries_counted_insert AFTER INSERT ON queries BEGIN
+        INSERT INTO query_counts (query_type, count) VALUES (new.query_type, 1)
+        ON CONFLICT (query_type) DO UPDATE SET count = count + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS queries_counted_delete AFTER DELETE ON queries BEGIN
+        UPDATE query_counts SET count = count - 1 WHERE query_type = old.query_type;
+    END
+    ''',
+]
+
+# Full-text index over the query text, kept current by triggers (archived and expired rows leave it too)
+HISTORY_SEARCH = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS queries_fts USING fts5(
+        query,
+        content = 'queries',
+        content_rowid = 'id',
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS queries_indexed_insert AFTER INSERT ON queries BEGIN
+        INSERT INTO queries_fts (rowid, query) VALUES (new.id, new.query);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS queries_indexed_delete AFTER DELETE ON queries BEGIN
+        INSERT INTO queries_fts (queries_fts, rowid, query) VALUES ('delete', old.id, old.query);
+    END
+    ''',
+]
+
+# Matches ranked per similar-query lookup: the newest ones, so the cost stays flat as history grows
+SIMILAR_CANDIDATES = 2000
+# Query words combined into the match expression: BM25 reads every pair's postings, so keep the pairs few
+SIMILAR_MAX_TERMS = 6
+SIMILAR_QUERIES_SQL = f'''
+    SELECT q.timestamp, q.query, q.query_type, q.response
+    FROM (
+        -- One row per distinct question: its best rank and its latest asking
+        SELECT MAX(q.id) AS id, MIN(matches.rank) AS rank
+        FROM (
+            SELECT rowid, rank FROM queries_fts
+            WHERE queries_fts MATCH ?
+            ORDER BY rowid DESC
+            LIMIT {SIMILAR_CANDIDATES}
+        ) matches JOIN queries q ON q.id = matches.rowid
+        GROUP BY lower(trim(q.query))
+    ) best JOIN queries q ON q.id = best.id
+    ORDER BY best.rank, best.id DESC
+    LIMIT ?
+'''
+
+def _query_terms(query: str) -> List[str]:
+    """Distinct content words of a query, in order"""
+    return [token for token in dict.fromkeys(TOKEN_PATTERN.findall(query.lower())) if token not in STOPWORDS]
+
+def _shared_terms_expression(terms: Sequence[str], min_shared: int) -> str:
+    """FTS5 expression matching rows that contain at least min_shared of the terms (as stemmed by the index)"""
+    return " OR ".join(
+        "(" + " AND ".join(f'"{term}"' for term in combination) + ")"
+        for combination in itertools.combinations(terms, min_shared)
+    )
+
+# Daily and monthly totals per query type and HTS chapter, for the analytics dashboards.
+# Insert triggers keep them current; they are not decremented when rows are archived,
+# so they cover the whole retention period (HistoryMaintenance.expire trims them).
+ROLLUP_TABLES = {"daily_rollups": 10, "monthly_rollups": 7}  # table: length of its period prefix
+
+HISTORY_ROLLUPS = [
+    f'''
+    CREATE TABLE IF NOT EXISTS {table} (
+        period TEXT NOT NULL,
+        query_type TEXT NOT NULL,
+        hts_chapter TEXT NOT NULL,
+        queries INTEGER NOT NULL,
+        landed_cost REAL NOT NULL,
+        cif_value REAL NOT NULL,
+        total_duty REAL NOT NULL,
+        PRIMARY KEY (period, query_type, hts_chapter)
+    ) WITHOUT ROWID
+    '''
+    for table in ROLLUP_TABLES
+] + [
+    '''
+    CREATE TRIGGER IF NOT EXISTS queries_rolled_up AFTER INSERT ON queries BEGIN
+    ''' + "".join(f'''
+        INSERT INTO {table} VALUES (
+            substr(new.timestamp, 1, {length}), COALESCE(new.query_type, ''), substr(COALESCE(new.hts_code, ''), 1, 2),
+            1, COALESCE(new.landed_cost, 0), COALESCE(new.cif_value, 0), COALESCE(new.total_duty, 0)
+        ) ON CONFLICT (period, query_type, hts_chapter) DO UPDATE SET
+            queries = queries + 1,
+            landed_cost = landed_cost + excluded.landed_cost,
+            cif_value = cif_value + excluded.cif_value,
+            total_duty = total_duty + excluded.total_duty;
+    ''' for table, length in ROLLUP_TABLES.items()) + '''
+    END
+    ''',
+]
+
+# Bumped by every history write or delete: lets caches of derived results (analytics) key on it
+HISTORY_VERSION = [
+    '''
+    CREATE TABLE IF NOT EXISTS history_version (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        version INTEGER NOT NULL
+    )
+    ''',
+    "INSERT OR IGNORE INTO history_version VALUES (0, 0)",
+    '''
+    CREATE TRIGGER IF NOT EXISTS queries_versioned_insert AFTER INSERT ON queries BEGIN
+        UPDATE history_version SET version = version + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS queries_versioned_delete AFTER DELETE ON queries BEGIN
+        UPDATE history_version SET version = version + 1;
+    END
+    ''',
+]
+BUMP_HISTORY_VERSION_SQL = "UPDATE history_version SET version = version + 1"
+
+REBUILD_ROLLUP_SQL = '''
+    INSERT INTO {table}
+    SELECT substr(timestamp, 1, {length}), COALESCE(query_type, ''), substr(COALESCE(hts_code, ''), 1, 2),
+           COUNT(*), TOTAL(landed_cost), TOTAL(cif_value), TOTAL(total_duty)
+    FROM queries
+    GROUP BY 1, 2, 3
+'''
+
+# Money fields of the JSON response as numbers ("$10,680.00" -> 10680.0)
+_JSON_MONEY = """CAST(REPLACE(REPLACE(json_extract(response, '$."{}"'), '$', ''), ',', '') AS REAL)"""
+BACKFILL_SQL = f'''
+    UPDATE queries SET
+        landed_cost = {_JSON_MONEY.format("Landed Cost")},
+        cif_value = {_JSON_MONEY.format("CIF Value")},
+        total_duty = {_JSON_MONEY.format("Total Duty")},
+        origin = json_extract(response, '$.Origin')
+    WHERE json_valid(response)
+'''
+
+def _money(value) -> Optional[float]:
+    """A calculator amount ("$1,234.50" or a number) as a float"""
+    if value is None:
+        return None
+    try:
+        return float(str(value).replace('$', '').replace(',', ''))
+    except ValueError:
+        return None
+
+def init_history_db(pool):
+    """Create or migrate the query history schema of a pooled database"""
+    with pool.writer() as conn:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'queries'").fetchone():
+            # Lets history maintenance return archived rows' pages to the filesystem;
+            # under WAL the setting only applies after a VACUUM, which is free while empty
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS queries (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp TEXT,
@@ -22,40 +218,189 @@ class MemoryHandler:
                 query_type TEXT,
                 response TEXT,
                 hts_code TEXT,
-                landed_cost REAL
+                landed_cost REAL,
+                cif_value REAL,
+                total_duty REAL,
+                origin TEXT
             )
         ''')
-        
-        conn.commit()
-        conn.close()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < HISTORY_SCHEMA_VERSION:
+            _migrate_history(conn, version)
+
+def _migrate_history(conn, version: int):
+    """Typed columns, indexes, counters, search, rollups and the version counter
+    for a history written by an older version"""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(queries)")}
+    for column, column_type in HISTORY_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE queries ADD COLUMN {column} {column_type}")
+    for statement in HISTORY_INDEXES + HISTORY_COUNTERS + HISTORY_SEARCH + HISTORY_ROLLUPS + HISTORY_VERSION:
+        conn.execute(statement)
+    # Derived data is rebuilt only by the version that introduced it: rollups, for one,
+    # also cover archived rows, which a rebuild from the live table would lose
+    if version < 1:
+        conn.execute(BACKFILL_SQL)
+        conn.execute("DELETE FROM query_counts")
+        conn.execute("INSERT INTO query_counts SELECT query_type, COUNT(*) FROM queries GROUP BY query_type")
+    if version < 2:
+        conn.execute("INSERT INTO queries_fts (queries_fts) VALUES ('rebuild')")
+    if version < 3:
+        for table, length in ROLLUP_TABLES.items():
+            conn.execute(f"DELETE FROM {table}")
+            conn.execute(REBUILD_ROLLUP_SQL.format(table=table, length=length))
+    conn.execute(f"PRAGMA user_version = {HISTORY_SCHEMA_VERSION}")
+
+def history_version(pool) -> int:
+    """Counter that changes whenever the history does"""
+    return pool.execute("SELECT version FROM history_version")[0][0]
+
+_writers = weakref.WeakSet()
+
+@atexit.register
+def _flush_writers():
+    for writer in list(_writers):
+        writer.close()
+
+class HistoryWriter:
+    """Write-behind buffer for history rows.
     
-    def add_query(self, query: str, response: Dict[str, Any] = None):
-        """Add a query to history"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+    add() only queues rows. A background thread inserts them with one
+    executemany when flush_rows are waiting or flush_interval seconds after
+    they arrived, so callers never wait for a commit. flush() writes the queue
+    now; it also runs at exit. With durability "full", add() writes through.
+    """
+    
+    def __init__(self, pool, flush_rows: int = 256, flush_interval: float = 0.5, durability: str = "normal"):
+        if durability not in HISTORY_DURABILITY:
+            raise ValueError(
+                f"Unknown history durability {durability!r}; expected one of {', '.join(HISTORY_DURABILITY)}"
+            )
+        self.pool = pool
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.last_error = None
+        self._rows: List[tuple] = []
+        self._condition = threading.Condition()
+        # Keeps flushes in order when the caller and the thread flush at once
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        _writers.add(self)
+    
+    def add(self, rows: Sequence[tuple]):
+        if self.durability == "full" or self._closed:
+            self._write(rows)
+            return
+        with self._condition:
+            self._rows.extend(rows)
+            pending = len(self._rows)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+            if pending >= self.flush_rows:
+                self._condition.notify()
+        if pending >= 8 * self.flush_rows:
+            # The thread is falling behind: the caller helps rather than queueing without bound
+            self.flush()
+    
+    def flush(self):
+        with self._flush_lock:
+            with self._condition:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return
+            try:
+                self._write(rows)
+            except Exception:
+                with self._condition:
+                    self._rows[:0] = rows
+                raise
+    
+    def _write(self, rows):
+        with self.pool.writer() as conn:
+            conn.execute(f"PRAGMA synchronous = {HISTORY_DURABILITY[self.durability]}")
+            conn.executemany(INSERT_HISTORY_SQL, rows)
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._rows or self._closed)
+                if self._closed:
+                    return
+                self._condition.wait_for(lambda: len(self._rows) >= self.flush_rows or self._closed,
+                                         timeout=self.flush_interval)
+            try:
+                self.flush()
+                self.last_error = None
+            except Exception as e:
+                # Rows stay queued; retried at the next interval
+                self.last_error = e
+                with self._condition:
+                    self._condition.wait(self.flush_interval)
+    
+    def close(self):
+        """Write what is queued and stop the thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+class MemoryHandler:
+    def __init__(self, db_path="data/query_history.db", durability: Optional[str] = None):
+        self.db_path = db_path
+        self.pool = get_pool(db_path)
+        self._init_db()
+        config = get_config().database
+        self.writer = HistoryWriter(
+            self.pool,
+            config.history_flush_rows,
+            config.history_flush_ms / 1000,
+            durability or config.history_durability
+        )
+    
+    def _init_db(self):
+        """Initialize the database for storing query history, migrating older schemas"""
+        init_history_db(self.pool)
+    
+    def _history_row(self, query: str, response: Dict[str, Any] = None) -> tuple:
+        """Values for INSERT_HISTORY_SQL for one query"""
         timestamp = datetime.now().isoformat()
         query_type = self._determine_query_type(query)
         response_json = json.dumps(response) if response else ""
         
-        # Extract HTS code and landed cost if it's a duty calculation
+        # Typed copies of a duty calculation's results
         hts_code = ""
-        landed_cost = 0.0
+        landed_cost = cif_value = total_duty = origin = None
         if response and isinstance(response, dict):
             hts_code = response.get('HTS Code', '')
-            if 'Landed Cost' in response:
-                try:
-                    landed_cost = float(response['Landed Cost'].replace('$', '').replace(',', ''))
-                except:
-                    landed_cost = 0.0
+            landed_cost = _money(response.get('Landed Cost'))
+            cif_value = _money(response.get('CIF Value'))
+            total_duty = _money(response.get('Total Duty'))
+            origin = response.get('Origin')
         
-        cursor.execute('''
-            INSERT INTO queries (timestamp, query, query_type, response, hts_code, landed_cost)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (timestamp, query, query_type, response_json, hts_code, landed_cost))
-        
-        conn.commit()
-        conn.close()
+        return (timestamp, query, query_type, response_json, hts_code, landed_cost, cif_value, total_duty, origin)
+    
+    def add_query(self, query: str, response: Dict[str, Any] = None):
+        """Add a query to history"""
+        self.add_queries([(query, response)])
+    
+    def add_queries(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """Add many (query, response) pairs to history; written behind by the HistoryWriter"""
+        rows = [self._history_row(query, response) for query, response in items]
+        if rows:
+            self.writer.add(rows)
+        return len(rows)
+    
+    def flush(self):
+        """Write queued history now"""
+        self.writer.flush()
+    
+    def close(self):
+        self.writer.close()
     
     def _determine_query_type(self, query: str) -> str:
         """Determine if query is policy or duty calculation"""
@@ -67,10 +412,8 @@ class MemoryHandler:
     
     def get_recent_queries(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Get recent queries"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        self.flush()
+        rows = self.pool.execute('''
             SELECT timestamp, query, query_type, response 
             FROM queries 
             ORDER BY timestamp DESC 
@@ -78,7 +421,7 @@ class MemoryHandler:
         ''', (limit,))
         
         results = []
-        for row in cursor.fetchall():
+        for row in rows:
             results.append({
                 'timestamp': row[0],
                 'query': row[1],
@@ -86,54 +429,62 @@ class MemoryHandler:
                 'response': json.loads(row[3]) if row[3] else None
             })
         
-        conn.close()
+        return results
+    
+    def get_similar_queries(self, query: str, limit: int = 5, min_shared: int = 2) -> List[Dict[str, Any]]:
+        """Past queries sharing at least min_shared content words with this one, best match first"""
+        terms = _query_terms(query)[:SIMILAR_MAX_TERMS]
+        if not terms:
+            return []
+        self.flush()
+        # The threshold is part of the match, so it applies to the stems FTS compares, not the raw words
+        expression = _shared_terms_expression(terms, max(1, min(min_shared, len(terms))))
+        rows = self.pool.execute(SIMILAR_QUERIES_SQL, (expression, limit))
+        
+        results = []
+        for timestamp, past_query, query_type, response in rows:
+            results.append({
+                'timestamp': timestamp,
+                'query': past_query,
+                'query_type': query_type,
+                'response': json.loads(response) if response else None
+            })
+        
         return results
     
     def get_recent_calculations(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Get recent duty calculations"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT timestamp, hts_code, landed_cost, response 
+        self.flush()
+        rows = self.pool.execute('''
+            SELECT timestamp, hts_code, landed_cost, cif_value, total_duty
             FROM queries 
             WHERE query_type = 'duty_calculation' AND hts_code != ''
             ORDER BY timestamp DESC 
             LIMIT ?
         ''', (limit,))
         
+        def money(value):
+            return f"${value:,.2f}" if value is not None else 'N/A'
+        
         results = []
-        for row in cursor.fetchall():
-            response = json.loads(row[3]) if row[3] else {}
+        for row in rows:
             results.append({
                 'Timestamp': row[0][:19],
                 'HTS Code': row[1],
-                'Landed Cost': f"${row[2]:,.2f}",
-                'CIF Value': response.get('CIF Value', 'N/A'),
-                'Total Duty': response.get('Total Duty', 'N/A')
+                'Landed Cost': money(row[2]),
+                'CIF Value': money(row[3]),
+                'Total Duty': money(row[4])
             })
         
-        conn.close()
         return results
     
     def get_statistics(self) -> Dict[str, int]:
         """Get query statistics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT COUNT(*) FROM queries')
-        total = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM queries WHERE query_type = "policy_question"')
-        policy = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM queries WHERE query_type = "duty_calculation"')
-        duty = cursor.fetchone()[0]
-        
-        conn.close()
+        self.flush()
+        counts = dict(self.pool.execute('SELECT query_type, count FROM query_counts'))
         
         return {
-            'total_queries': total,
-            'policy_queries': policy,
-            'duty_calculations': duty
+            'total_queries': sum(counts.values()),
+            'policy_queries': counts.get('policy_question', 0),
+            'duty_calculations': counts.get('duty_calculation', 0)
         }
\ No newline at end of file
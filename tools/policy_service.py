@@ -0,0 +1,213 @@
+"""
+Asynchronous front end for policy questions.
+
+Every Streamlit session shares one TariffBot, and so one RAGTool. Without
+coordination, sessions asking at the same moment each run the embedding model
+and the searches on their own. PolicyQueryService runs an asyncio loop on a
+background thread in front of the RAGTool:
+
+    coalescing     a question already being answered is not computed again;
+                   later askers subscribe to the same answer (and its tokens)
+    micro-batching distinct questions that miss the caches within
+                   policy_batch_window_ms are embedded together, up to
+                   policy_max_batch per embed_documents call
+
+The rest of each answer (search, generation) runs on a worker thread pool.
+answer() is a coroutine for asyncio callers; answer_sync() and stream() serve
+the synchronous ones (TariffBot, Streamlit).
+"""
+
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.app_config import get_config
+from tools.answer_generator import AnswerStream
+from tools.query_cache import normalize_query
+
+
+class _Broadcast:
+    """One answer being generated, replayed to every subscriber"""
+
+    def __init__(self):
+        self.tokens: List[str] = []
+        self.response: Optional[Dict] = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self._condition = threading.Condition()
+
+    def push(self, token: str):
+        with self._condition:
+            self.tokens.append(token)
+            self._condition.notify_all()
+
+    def finish(self, response: Optional[Dict] = None, error: Optional[BaseException] = None):
+        with self._condition:
+            self.response = response
+            self.error = error
+            self.done = True
+            self._condition.notify_all()
+
+    def subscribe(self):
+        """Every token so far, then each new one as it is pushed"""
+        position = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: position < len(self.tokens) or self.done)
+                tokens = self.tokens[position:]
+                finished = self.done
+            position += len(tokens)
+            yield from tokens
+            if finished:
+                if self.error is not None:
+                    raise self.error
+                return
+
+    def stream(self) -> AnswerStream:
+        return AnswerStream(self.subscribe(), lambda text: self.response)
+
+
+class PolicyQueryService:
+    """Coalesces and micro-batches policy questions for one RAGTool"""
+
+    def __init__(self, rag_tool, batch_window_ms: Optional[float] = None, max_batch: Optional[int] = None,
+                 workers: Optional[int] = None):
+        performance = get_config().performance
+        self.rag_tool = rag_tool
+        self.batch_window = (performance.policy_batch_window_ms if batch_window_ms is None else batch_window_ms) / 1000
+        self.max_batch = max_batch or performance.policy_max_batch
+        self.workers = workers or performance.max_concurrent_requests
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._worker_pool = None
+        # One embedding call at a time: the batch, not the thread count, is the parallelism
+        self._embed_pool = None
+
+        # Touched only on the service loop
+        self._inflight: Dict[str, Tuple[_Broadcast, asyncio.Task]] = {}
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle = None
+
+        self.stats = {"requests": 0, "coalesced": 0, "embedded": 0, "embed_batches": 0}
+
+    def start(self):
+        """Start the event loop thread (done on first use)"""
+        with self._start_lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self._worker_pool = ThreadPoolExecutor(self.workers, thread_name_prefix="policy-worker")
+                self._embed_pool = ThreadPoolExecutor(1, thread_name_prefix="policy-embed")
+                self._thread = threading.Thread(target=self.loop.run_forever, name="policy-service", daemon=True)
+                self._thread.start()
+        return self
+
+    def close(self):
+        with self._start_lock:
+            if self.loop is None:
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self.loop.close()
+            self._worker_pool.shutdown(wait=False)
+            self._embed_pool.shutdown(wait=False)
+            self.loop = self._thread = None
+
+    def _submit(self, coroutine):
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def answer(self, query: str) -> Dict:
+        """The response to a policy question, from any event loop"""
+        return await asyncio.wrap_future(self._submit(self._answer(query)))
+
+    def answer_sync(self, query: str, timeout: Optional[float] = None) -> Dict:
+        return self._submit(self._answer(query)).result(timeout)
+
+    def stream(self, query: str) -> AnswerStream:
+        """The answer as an AnswerStream, shared with concurrent askers of the same question"""
+        broadcast, _ = self._submit(self._join(query)).result()
+        return broadcast.stream()
+
+    async def _answer(self, query):
+        _, task = await self._join(query)
+        return await asyncio.shield(task)
+
+    async def _join(self, query):
+        """The in-flight computation for this question, started if there is none"""
+        self.stats["requests"] += 1
+        key = normalize_query(query)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["coalesced"] += 1
+            return inflight
+        broadcast = _Broadcast()
+        task = self.loop.create_task(self._compute(query, broadcast))
+        self._inflight[key] = (broadcast, task)
+        task.add_done_callback(lambda done: self._finished(key, done))
+        return broadcast, task
+
+    def _finished(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            # Streaming askers get the error from the broadcast; mark it retrieved
+            task.exception()
+
+    async def _compute(self, query, broadcast):
+        try:
+            _, embedding, _ = await self.loop.run_in_executor(self._worker_pool, self.rag_tool.lookup, query)
+            if embedding is None:
+                embedding = await self._embed(query)
+
+            def generate():
+                answer = self.rag_tool.stream_policy_answer(query, embedding)
+                for token in answer:
+                    broadcast.push(token)
+                return answer.response
+
+            response = await self.loop.run_in_executor(self._worker_pool, generate)
+        except BaseException as e:
+            broadcast.finish(error=e)
+            raise
+        broadcast.finish(response)
+        return response
+
+    async def _embed(self, query):
+        """The question's embedding, computed in a batch with the others that arrive in the window"""
+        future = self.loop.create_future()
+        self._pending.append((query, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self.loop.call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self.loop.create_task(self._embed_batch(batch))
+
+    async def _embed_batch(self, batch):
+        try:
+            vectors = await self.loop.run_in_executor(
+                self._embed_pool, self.rag_tool.embed_queries, [query for query, _ in batch]
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.stats["embedded"] += len(batch)
+        self.stats["embed_batches"] += 1
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
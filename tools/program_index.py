@@ -0,0 +1,263 @@
+"""
+Special-program eligibility index for origin-aware duty resolution.
+
+The "Special Rate of Duty" column is a sequence of clauses, each a rate
+followed by the program indicators it applies to:
+
+    Free (BH,CL,CO,JO,MA,OM,P,PE,S,SG) 1.7% (KR) See 9822.04.01-9822.04.03 (AU)
+
+compile_programs turns one such string into a {program: CompiledRate} map plus
+the programs whose rate is a chapter 98/99 cross-reference. Every distinct
+string is parsed once. ProgramIndex maps each schedule line to its compiled map
+and is written next to the schedule snapshot at ingest, so resolving (code,
+origin) at request time is a dictionary lookup per eligible program.
+"""
+
+import os
+import pickle
+import re
+import sys
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.hts_index import HTSScheduleIndex, get_schedule_index, normalize_code
+from tools.rate_compiler import CompiledRate, RATE_CACHE_SIZE, compile_rate
+
+PROGRAM_SNAPSHOT_VERSION = 1
+DEFAULT_PROGRAM_SNAPSHOT_PATH = "data/hts_programs.snapshot"
+
+CLAUSE_PATTERN = re.compile(r"\s*(?P<rate>[^()]*?)\s*\((?P<programs>[^()]*)\)")
+
+# Special program indicators used in the schedule's Special column
+PROGRAM_NAMES = {
+    "A": "GSP", "A+": "GSP (least developed)", "A*": "GSP (country exclusions)",
+    "AU": "US-Australia FTA", "B": "Automotive Products Trade Act",
+    "BH": "US-Bahrain FTA", "C": "Agreement on Trade in Civil Aircraft",
+    "CA": "NAFTA (Canada)", "CL": "US-Chile FTA", "CO": "US-Colombia TPA",
+    "D": "AGOA", "E": "CBERA", "E*": "CBERA (country exclusions)",
+    "IL": "US-Israel FTA", "JO": "US-Jordan FTA", "JP": "US-Japan Trade Agreement",
+    "K": "Agreement on Trade in Pharmaceutical Products", "KR": "US-Korea FTA",
+    "L": "Uruguay Round Concessions on Intermediate Chemicals for Dyes",
+    "MA": "US-Morocco FTA", "MX": "NAFTA (Mexico)", "OM": "US-Oman FTA",
+    "P": "CAFTA-DR", "P+": "CAFTA-DR (plus)", "PA": "US-Panama TPA",
+    "PE": "US-Peru TPA", "R": "CBTPA", "S": "USMCA", "S+": "USMCA (plus)",
+    "SG": "US-Singapore FTA",
+}
+
+# Origins and the programs they can claim, in order of preference. GSP (A, A+,
+# A*) is omitted: its authorization lapsed at the end of 2020.
+COUNTRY_PROGRAMS: Dict[str, Tuple[str, ...]] = {
+    "Australia": ("AU",),
+    "Bahrain": ("BH",),
+    "Canada": ("S", "S+", "CA", "B", "C"),
+    "Chile": ("CL",),
+    "Colombia": ("CO",),
+    "Costa Rica": ("P", "P+"),
+    "Dominican Republic": ("P", "P+"),
+    "El Salvador": ("P", "P+"),
+    "Guatemala": ("P", "P+"),
+    "Honduras": ("P", "P+"),
+    "Nicaragua": ("P", "P+"),
+    "Israel": ("IL",),
+    "Jordan": ("JO",),
+    "Japan": ("JP", "C", "K"),
+    "Korea": ("KR",),
+    "South Korea": ("KR",),
+    "Mexico": ("S", "S+", "MX"),
+    "Morocco": ("MA",),
+    "Oman": ("OM",),
+    "Panama": ("PA",),
+    "Peru": ("PE",),
+    "Singapore": ("SG",),
+    "Haiti": ("E", "R"),
+    "Jamaica": ("E", "R"),
+    "Barbados": ("E", "R"),
+    "Trinidad and Tobago": ("E", "R"),
+    "Kenya": ("D",),
+    "Ghana": ("D",),
+    "Nigeria": ("D",),
+    "South Africa": ("D",),
+    "USMCA": ("S", "S+"),
+}
+
+# Origins denied normal trade relations, charged the column 2 rate
+COLUMN2_COUNTRIES = frozenset({"Cuba", "North Korea", "Russia", "Belarus"})
+
+# Every origin whose rate can differ from the general column
+KNOWN_ORIGINS = tuple(sorted(set(COUNTRY_PROGRAMS) | COLUMN2_COUNTRIES))
+
+# Longest names first, so "North Korea" is found before "Korea"
+_ORIGIN_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(origin) for origin in sorted(KNOWN_ORIGINS, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE
+)
+_ORIGIN_NAMES = {origin.lower(): origin for origin in KNOWN_ORIGINS}
+
+
+def find_origin(text: str) -> Optional[str]:
+    """The known origin named in free text ("... from North Korea"), if any"""
+    match = _ORIGIN_PATTERN.search(text or "")
+    return _ORIGIN_NAMES[match.group(1).lower()] if match else None
+
+
+@dataclass(frozen=True)
+class ProgramRates:
+    """Compiled Special column of one schedule line"""
+    raw: str
+    rates: Dict[str, CompiledRate] = field(default_factory=dict)
+    references: Dict[str, str] = field(default_factory=dict)
+
+    def rate_for(self, program: str) -> Optional[CompiledRate]:
+        return self.rates.get(program)
+
+
+EMPTY_PROGRAMS = ProgramRates(raw="")
+
+
+@dataclass(frozen=True)
+class Resolution:
+    """The rate that applies to a line for one origin"""
+    origin: Optional[str]
+    column: str
+    rate: CompiledRate
+    program: Optional[str] = None
+    reference: Optional[str] = None
+
+    @property
+    def program_name(self) -> Optional[str]:
+        return PROGRAM_NAMES.get(self.program) if self.program else None
+
+
+@lru_cache(maxsize=RATE_CACHE_SIZE)
+def _compile_programs(raw: str) -> ProgramRates:
+    rates = {}
+    references = {}
+    for match in CLAUSE_PATTERN.finditer(raw):
+        clause = match.group("rate").strip()
+        programs = [code.strip().upper() for code in match.group("programs").split(",") if code.strip()]
+        if clause.lower().startswith("see"):
+            for program in programs:
+                references.setdefault(program, clause)
+            continue
+        rate = compile_rate(clause)
+        if rate.kind in ("empty", "unparsed"):
+            continue
+        for program in programs:
+            # The first clause naming a program is the one that applies
+            rates.setdefault(program, rate)
+    return ProgramRates(raw=raw, rates=rates, references=references)
+
+
+def compile_programs(raw) -> ProgramRates:
+    """Compile a Special Rate of Duty string, memoized by the raw text"""
+    if raw is None or not isinstance(raw, str) or not raw.strip():
+        return EMPTY_PROGRAMS
+    return _compile_programs(raw)
+
+
+def resolve(programs: ProgramRates, origin: Optional[str], general: CompiledRate,
+            column2: CompiledRate, unit_weight: Optional[float] = None,
+            cif_value: float = 1.0, quantity: Optional[float] = None) -> Resolution:
+    """Applicable rate for an origin: column 2, the cheapest eligible program, or general"""
+    if origin in COLUMN2_COUNTRIES and column2.kind != "empty":
+        return Resolution(origin, "column2", column2)
+
+    best = Resolution(origin, "general", general)
+    best_rate = general.evaluate(cif_value, unit_weight, quantity)
+    for program in COUNTRY_PROGRAMS.get(origin, ()):
+        rate = programs.rates.get(program)
+        if rate is None:
+            continue
+        effective = rate.evaluate(cif_value, unit_weight, quantity)
+        if effective < best_rate:
+            best, best_rate = Resolution(origin, "special", rate, program), effective
+    if best.program is None:
+        # Eligible only through a chapter 98/99 provision we cannot price here
+        for program in COUNTRY_PROGRAMS.get(origin, ()):
+            if program in programs.references:
+                return Resolution(origin, "general", general, program, programs.references[program])
+    return best
+
+
+class ProgramIndex:
+    """Compiled program rates for every coded schedule line"""
+
+    def __init__(self, by_key: Dict[str, ProgramRates], source_signature=None):
+        self.by_key = by_key
+        self.source_signature = source_signature
+
+    def __len__(self):
+        return len(self.by_key)
+
+    @classmethod
+    def from_schedule(cls, schedule: HTSScheduleIndex) -> "ProgramIndex":
+        # Lines sharing a Special string share one compiled object (and one pickle record)
+        by_key = {
+            key: compile_programs(entry.special_rate)
+            for key, entry in schedule.by_key.items()
+            if entry.special_rate
+        }
+        return cls(by_key, source_signature=schedule.source_signature)
+
+    def programs(self, code) -> ProgramRates:
+        return self.by_key.get(normalize_code(code), EMPTY_PROGRAMS)
+
+    def save(self, path: str = DEFAULT_PROGRAM_SNAPSHOT_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(
+                {"version": PROGRAM_SNAPSHOT_VERSION, "signature": self.source_signature, "by_key": self.by_key},
+                f, protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_PROGRAM_SNAPSHOT_PATH) -> "ProgramIndex":
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+        if payload.get("version") != PROGRAM_SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported program snapshot version in {path}")
+        return cls(payload["by_key"], source_signature=payload["signature"])
+
+    @classmethod
+    def load_or_build(cls, db_path: str = "data/hts.db",
+                      path: str = DEFAULT_PROGRAM_SNAPSHOT_PATH) -> "ProgramIndex":
+        """Load the snapshot if it matches the database, otherwise rebuild it"""
+        schedule = get_schedule_index(db_path)
+        if os.path.exists(path):
+            try:
+                index = cls.load(path)
+                if index.source_signature == schedule.source_signature:
+                    return index
+            except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+                pass
+
+        index = cls.from_schedule(schedule)
+        try:
+            index.save(path)
+        except OSError:
+            pass
+        return index
+
+
+_program_indexes: Dict[str, ProgramIndex] = {}
+_program_lock = threading.Lock()
+
+
+def get_program_index(db_path: str = "data/hts.db",
+                      path: str = DEFAULT_PROGRAM_SNAPSHOT_PATH) -> ProgramIndex:
+    """Process-wide program index for a database, reloaded when the schedule changes"""
+    key = os.path.abspath(db_path)
+    with _program_lock:
+        index = _program_indexes.get(key)
+        # get_schedule_index paces the version checks
+        if index is None or index.source_signature != get_schedule_index(db_path).source_signature:
+            index = _program_indexes[key] = ProgramIndex.load_or_build(db_path, path)
+        return index
@@ -0,0 +1,193 @@
+"""
+Caches for policy-question retrieval.
+
+Most policy traffic is the same few questions (GSP, USMCA, the Israel FTA), so
+RAGTool keeps two levels of cache keyed by the normalized question text:
+
+    TTLCache        in-process LRU of retrieved documents, with expiry
+    RetrievalCache  SQLite table of query embeddings and top-k docstore ids,
+                    shared by every process and kept across restarts
+
+RetrievalCache also keeps generated answers, keyed by the generator, the
+question and the docstore ids it was answered from (answer_key).
+
+Both are scoped to the vector store signature: rebuilding data/vector_store
+changes the signature, which drops the in-process entries and clears the table.
+A hit at either level answers without running the embedding model.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.db_pool import get_pool
+
+DEFAULT_RETRIEVAL_CACHE_PATH = "data/rag_cache.db"
+VECTOR_STORE_FILES = ("index.faiss", "index.pkl")
+# Names the approximate index in use, if one was built (see tools.vector_index)
+OPTIONAL_STORE_FILES = ("index_meta.json",)
+
+_missing = object()
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation insensitive cache key"""
+    return re.sub(r"\s+", " ", (query or "").lower()).strip(" ?!.")
+
+
+def answer_key(generator: str, query: str, doc_ids: Sequence[str]) -> str:
+    """Cache key of an answer generated from these documents"""
+    return hashlib.sha1("\n".join([generator, query, *doc_ids]).encode("utf-8")).hexdigest()
+
+
+def vector_store_signature(path: str) -> Optional[Tuple]:
+    """Identity of a saved vector store; None if it has not been built"""
+    try:
+        signature = tuple(
+            (name, stat.st_size, stat.st_mtime_ns)
+            for name in VECTOR_STORE_FILES
+            for stat in (os.stat(os.path.join(path, name)),)
+        )
+    except OSError:
+        return None
+    for name in OPTIONAL_STORE_FILES:
+        try:
+            stat = os.stat(os.path.join(path, name))
+            signature += ((name, stat.st_size, stat.st_mtime_ns),)
+        except OSError:
+            pass
+    return signature
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries expire ttl seconds after insertion.
+
+    Bounded by entry count and, when maxbytes is given, by the total of the
+    sizes passed to put().
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0, maxbytes: Optional[int] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self._data: "OrderedDict[Hashable, Tuple[float, object, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            item = self._data.get(key, _missing)
+            if item is not _missing:
+                expires, value, size = item
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.bytes -= size
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value, size: int = 0):
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[2]
+            self._data[key] = (time.monotonic() + self.ttl, value, size)
+            self.bytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self.bytes > self.maxbytes):
+                self.bytes -= self._data.popitem(last=False)[1][2]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RetrievalCache:
+    """Persistent query -> (embedding, top-k docstore ids) cache for one vector store"""
+
+    def __init__(self, path: str = DEFAULT_RETRIEVAL_CACHE_PATH):
+        self.path = path
+        self.pool = get_pool(path)
+        self._signature = None
+        with self.pool.writer() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS retrievals (
+                    query TEXT PRIMARY KEY,
+                    embedding BLOB,
+                    doc_ids TEXT,
+                    created_at REAL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    key TEXT PRIMARY KEY,
+                    response TEXT,
+                    created_at REAL
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS retrieval_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def bind(self, signature):
+        """Scope the cache to a vector store, clearing it if the store was rebuilt"""
+        signature = repr(signature)
+        if signature == self._signature:
+            return
+        with self.pool.writer() as conn:
+            row = conn.execute("SELECT value FROM retrieval_meta WHERE key = 'signature'").fetchone()
+            if row is None or row[0] != signature:
+                conn.execute("DELETE FROM retrievals")
+                conn.execute("DELETE FROM answers")
+                conn.execute(
+                    "INSERT OR REPLACE INTO retrieval_meta (key, value) VALUES ('signature', ?)",
+                    (signature,)
+                )
+        self._signature = signature
+
+    def get(self, query: str) -> Optional[Tuple[List[float], List[str]]]:
+        rows = self.pool.execute("SELECT embedding, doc_ids FROM retrievals WHERE query = ?", (query,))
+        if not rows:
+            return None
+        embedding, doc_ids = rows[0]
+        return array("f", embedding).tolist(), doc_ids.split("\n") if doc_ids else []
+
+    def put(self, query: str, embedding: Sequence[float], doc_ids: Sequence[str]):
+        with self.pool.writer() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO retrievals (query, embedding, doc_ids, created_at) VALUES (?, ?, ?, ?)",
+                (query, array("f", embedding).tobytes(), "\n".join(doc_ids), time.time())
+            )
+
+    def get_answer(self, key: str) -> Optional[Dict]:
+        rows = self.pool.execute("SELECT response FROM answers WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def put_answer(self, key: str, response: Dict):
+        with self.pool.writer() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers (key, response, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(response), time.time())
+            )
+
+    def __len__(self):
+        return self.pool.execute("SELECT COUNT(*) FROM retrievals")[0][0]
@@ -6,55 +6,349 @@ os.environ['HF_HOME'] = MODEL_CACHE_DIR
 os.environ['TRANSFORMERS_CACHE'] = os.path.join(MODEL_CACHE_DIR, "hub")
 os.environ['SENTENCE_TRANSFORMERS_HOME'] = os.path.join(MODEL_CACHE_DIR, "sentence-transformers")
 
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
 import json
+import pickle
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.app_config import get_config
+from tools.answer_generator import AnswerStream, get_generator
+from tools.query_cache import (
+    DEFAULT_RETRIEVAL_CACHE_PATH, RetrievalCache, TTLCache, answer_key, normalize_query, vector_store_signature
+)
+from tools.semantic_cache import SemanticAnswerCache
+from tools.sparse_index import SparseIndex, reciprocal_rank_fusion, sparse_index_path, sync_sparse_index
+
+# Candidates each retriever contributes before fusion
+CANDIDATE_K = 8
+# Characters of each retrieved chunk passed to the generator
+CONTEXT_CHARS = 500
 
 class RAGTool:
-    def __init__(self, vector_store_path="data/vector_store"):
+    """Policy question answering over the General Notes vector store.
+    
+    The embedding model and FAISS index are loaded on first use (importing
+    langchain pulls in torch and transformers, which takes seconds), so
+    constructing a RAGTool is free for calculation-only workloads. Call
+    warm_up() to load them on a background thread ahead of the first query.
+    
+    Retrieval results are cached per normalized question, in process and on
+    disk (see tools.query_cache), so repeated questions skip the model.
+    Paraphrases of answered questions are served from a semantic answer
+    cache (see tools.semantic_cache), seeded from the query history if given.
+    
+    With hybrid retrieval on, the dense FAISS search and a BM25 search over
+    the same chunks (see tools.sparse_index) run concurrently and are merged
+    by reciprocal rank fusion, which finds exact program names and HTS
+    numbers the embedding misses, so fewer chunks are needed as context.
+    
+    Answers come from the configured generator (see tools.answer_generator);
+    stream_policy_answer() yields them token by token. Complete answers are
+    cached per (question, retrieved docstore ids).
+    """
+    
+    def __init__(self, vector_store_path="data/vector_store", cache_path=DEFAULT_RETRIEVAL_CACHE_PATH,
+                 history=None, generator=None):
         self.vector_store_path = vector_store_path
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="all-MiniLM-L6-v2",
-            cache_folder=MODEL_CACHE_DIR
-        )
-        self.vector_store = FAISS.load_local(
-            vector_store_path, 
-            self.embeddings, 
-            allow_dangerous_deserialization=True
-        )
-        self.retriever = self.vector_store.as_retriever(search_kwargs={"k": 3})
-    
-    def answer_policy_question(self, query):
-        # Retrieve relevant documents
-        docs = self.retriever.get_relevant_documents(query)
+        self.history = history
+        self._generator = generator
+        self._embeddings = None
+        self._vector_store = None
+        self._retriever = None
+        self._docstore = None
+        self._sparse_index = None
+        self._search_pool = None
+        self._load_lock = threading.Lock()
+        self._warm_up_thread = None
+        self.load_error = None
         
-        # Prepare context from retrieved documents
-        context = "\n".join([doc.page_content[:500] for doc in docs])
+        performance = get_config().performance
+        self.cache_enabled = performance.cache_enabled
+        self.hybrid = performance.hybrid_retrieval
+        self.retrieval_k = performance.retrieval_k
+        self.max_concurrent_requests = performance.max_concurrent_requests
+        self.cache_path = cache_path
+        self._retrieval_cache = None
+        self._store_signature = None
+        self._semantic_cache = None
+        self.documents_cache = TTLCache(performance.query_cache_size, performance.query_cache_ttl_seconds)
+        self.answers_cache = TTLCache(performance.query_cache_size, performance.query_cache_ttl_seconds)
+    
+    @property
+    def is_loaded(self):
+        return self._retriever is not None
+    
+    def _ensure_loaded(self):
+        if self._retriever is not None:
+            return
+        with self._load_lock:
+            if self._retriever is not None:
+                return
+            from langchain_huggingface import HuggingFaceEmbeddings
+            from tools.vector_index import load_vector_store
+            
+            embeddings = HuggingFaceEmbeddings(
+                model_name="all-MiniLM-L6-v2",
+                cache_folder=MODEL_CACHE_DIR
+            )
+            # Memory-mapped HNSW/IVF-PQ index if one was built, else the flat index
+            vector_store = load_vector_store(
+                self.vector_store_path,
+                embeddings,
+                get_config().performance.vector_index
+            )
+            self._embeddings = embeddings
+            self._vector_store = vector_store
+            self._retriever = vector_store.as_retriever(search_kwargs={"k": self.retrieval_k})
+    
+    def warm_up(self, background=True):
+        """Load the model and index now, by default on a daemon thread"""
+        if not background:
+            self._ensure_loaded()
+            return None
+        if self._warm_up_thread is None and not self.is_loaded:
+            def load():
+                try:
+                    self._ensure_loaded()
+                except Exception as e:
+                    # Surfaced again by the first policy query, which retries the load
+                    self.load_error = e
+            self._warm_up_thread = threading.Thread(target=load, name="rag-warm-up", daemon=True)
+            self._warm_up_thread.start()
+        return self._warm_up_thread
+    
+    @property
+    def embeddings(self):
+        self._ensure_loaded()
+        return self._embeddings
+    
+    @property
+    def vector_store(self):
+        self._ensure_loaded()
+        return self._vector_store
+    
+    @property
+    def retriever(self):
+        self._ensure_loaded()
+        return self._retriever
+    
+    @property
+    def generator(self):
+        if self._generator is None:
+            self._generator = get_generator()
+        return self._generator
+    
+    def answer_policy_question(self, query, embedding=None):
+        return self.stream_policy_answer(query, embedding).result()
+    
+    def stream_policy_answer(self, query, embedding=None):
+        """The answer to a policy question as an AnswerStream of tokens.
+        
+        embedding, if given, is the question's embedding computed by the
+        caller (tools.policy_service embeds concurrent questions in batches).
+        """
+        key, cached_embedding, retrieved = self.lookup(query)
+        if cached_embedding is not None:
+            embedding = cached_embedding
+        elif embedding is None:
+            embedding = self.embeddings.embed_query(query)
         
-        # For now, return a structured response based on keywords
-        # In production, you'd use an LLM here
-        response = self._generate_answer(query, context, docs)
+        # A close paraphrase of an answered question gets the same answer
+        semantic_cache = self.semantic_cache
+        if semantic_cache is not None:
+            cached = semantic_cache.lookup(embedding)
+            if cached is not None:
+                return AnswerStream.completed(cached)
+        
+        # Retrieve relevant documents
+        doc_ids, docs = retrieved if retrieved is not None else self._retrieve(key, embedding)
         
+        # The same question over the same documents gets the same answer
+        cache_key = answer_key(self.generator.cache_key, key, doc_ids) if self.cache_enabled else None
+        response = self._cached_answer(cache_key)
+        if response is not None:
+            stream = AnswerStream.completed(response)
+        else:
+            # Prepare context from retrieved documents
+            context = "\n".join([doc.page_content[:CONTEXT_CHARS] for doc in docs])
+            stream = AnswerStream(
+                self.generator.stream(query, context),
+                lambda text: {
+                    "answer": text.strip(),
+                    "sources": f"Retrieved from {len(docs)} relevant document sections"
+                }
+            )
+            if cache_key is not None:
+                stream.on_complete(lambda response: self._cache_answer(cache_key, response))
+        
+        if semantic_cache is not None:
+            stream.on_complete(lambda response: semantic_cache.add(embedding, query, response))
+        return stream
+    
+    def _cached_answer(self, cache_key):
+        if cache_key is None:
+            return None
+        response = self.answers_cache.get(cache_key)
+        if response is None and self._store_signature is not None:
+            response = self.retrieval_cache.get_answer(cache_key)
+            if response is not None:
+                self.answers_cache.put(cache_key, response)
         return response
     
-    def _generate_answer(self, query, context, docs):
-        query_lower = query.lower()
+    def _cache_answer(self, cache_key, response):
+        self.answers_cache.put(cache_key, response)
+        if self._store_signature is not None:
+            self.retrieval_cache.put_answer(cache_key, response)
+    
+    @property
+    def retrieval_cache(self):
+        if self._retrieval_cache is None:
+            self._retrieval_cache = RetrievalCache(self.cache_path)
+        return self._retrieval_cache
+    
+    @property
+    def semantic_cache(self):
+        """Paraphrase cache, seeded from answered questions in the history on first use"""
+        if not self.cache_enabled:
+            return None
+        if self._semantic_cache is None:
+            performance = get_config().performance
+            cache = SemanticAnswerCache(performance.semantic_cache_threshold, performance.semantic_cache_size)
+            self._seed_semantic_cache(cache)
+            self._semantic_cache = cache
+        return self._semantic_cache
+    
+    def _seed_semantic_cache(self, cache):
+        # Only questions whose embedding is already on disk: seeding must not run the model
+        if self.history is None or self._check_store() is None:
+            return
+        retrieval_cache = self.retrieval_cache
+        retrieval_cache.bind(self._store_signature)
+        for past in reversed(self.history.get_recent_queries(cache.maxsize)):
+            response = past["response"]
+            if past["query_type"] != "policy_question" or not isinstance(response, dict) or "answer" not in response:
+                continue
+            stored = retrieval_cache.get(normalize_query(past["query"]))
+            if stored is not None:
+                cache.add(stored[0], past["query"], response)
+    
+    def cache_stats(self):
+        stats = {"retrieval_hits": self.documents_cache.hits, "retrieval_misses": self.documents_cache.misses}
+        if self._semantic_cache is not None:
+            stats.update({f"semantic_{name}": value for name, value in self._semantic_cache.stats().items()})
+        return stats
+    
+    def _check_store(self):
+        """Drop caches and the loaded index if the vector store was rebuilt"""
+        signature = vector_store_signature(self.vector_store_path)
+        if signature == self._store_signature:
+            return signature
+        with self._load_lock:
+            if self._store_signature is not None:
+                self._vector_store = self._retriever = self._docstore = self._sparse_index = None
+            self.documents_cache.clear()
+            self.answers_cache.clear()
+            if self._semantic_cache is not None:
+                self._semantic_cache.clear()
+            self._store_signature = signature
+        return signature
+    
+    def embed_queries(self, queries):
+        """Embeddings of several questions, in one call to the model"""
+        return self.embeddings.embed_documents(list(queries))
+    
+    def lookup(self, query):
+        """(cache key, embedding, (doc ids, documents)) for a question from the caches alone;
+        embedding and retrieval are None if it has not been asked before"""
+        signature = self._check_store()
+        key = normalize_query(query)
+        if not self.cache_enabled or signature is None:
+            return key, None, None
         
-        # Pattern matching for common questions
-        if "generalized system of preferences" in query_lower or "gsp" in query_lower:
-            answer = "The Generalized System of Preferences (GSP) is a U.S. trade preference program designed to promote economic development by allowing duty-free entry for thousands of products from designated developing countries."
-        elif "israel" in query_lower and ("free trade" in query_lower or "fta" in query_lower):
-            answer = "The United States-Israel Free Trade Agreement (FTA) provides for the elimination of duties on qualifying goods traded between the United States and Israel. It was the first FTA entered into by the United States."
-        elif "nafta" in query_lower or "usmca" in query_lower:
-            answer = "NAFTA (now USMCA) provides preferential tariff treatment for qualifying goods originating in Canada, Mexico, and the United States."
-        else:
-            # Extract relevant snippet from context
-            answer = f"Based on the HTS General Notes: {context[:300]}..."
+        cached = self.documents_cache.get(key)
+        if cached is not None:
+            embedding, doc_ids, docs = cached
+            return key, embedding, (doc_ids, docs)
+        
+        retrieval_cache = self.retrieval_cache
+        retrieval_cache.bind(signature)
+        stored = retrieval_cache.get(key)
+        if stored is not None:
+            embedding, doc_ids = stored
+            docs = self._documents(doc_ids)
+            self.documents_cache.put(key, (embedding, doc_ids, docs))
+            return key, embedding, (doc_ids, docs)
+        return key, None, None
+    
+    def _embed(self, query):
+        """(cache key, query embedding, (doc ids, documents) if already cached) for a question"""
+        key, embedding, retrieved = self.lookup(query)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(query)
+        return key, embedding, retrieved
+    
+    def _retrieve(self, key, embedding):
+        doc_ids = self._ranked_ids(key, embedding)
+        docs = self._documents(doc_ids)
+        if self.cache_enabled and self._store_signature is not None:
+            self.retrieval_cache.put(key, embedding, doc_ids)
+            self.documents_cache.put(key, (embedding, doc_ids, docs))
+        return doc_ids, docs
+    
+    def retrieve(self, query):
+        """Top documents for a question, from cache when it has been asked before"""
+        key, embedding, retrieved = self._embed(query)
+        return (retrieved if retrieved is not None else self._retrieve(key, embedding))[1]
+    
+    def _ranked_ids(self, query, embedding):
+        """Docstore ids of the chunks to answer from, best first"""
+        sparse_index = self.sparse_index if self.hybrid else None
+        if sparse_index is None:
+            return self._search_ids(embedding, self.retrieval_k)
+        if self._search_pool is None:
+            with self._load_lock:
+                if self._search_pool is None:
+                    self._search_pool = ThreadPoolExecutor(self.max_concurrent_requests,
+                                                           thread_name_prefix="rag-search")
+        # faiss and sqlite both release the GIL while searching
+        sparse = self._search_pool.submit(sparse_index.search, query, CANDIDATE_K)
+        dense = self._search_ids(embedding, CANDIDATE_K)
+        return reciprocal_rank_fusion([dense, sparse.result()], self.retrieval_k)
+    
+    def _search_ids(self, embedding, k):
+        """Docstore ids of the nearest chunks, as the retriever would rank them"""
+        import numpy as np
         
-        return {
-            "answer": answer,
-            "sources": f"Retrieved from {len(docs)} relevant document sections"
-        }
+        store = self.vector_store
+        _, indices = store.index.search(np.array([embedding], dtype=np.float32), k)
+        return [store.index_to_docstore_id[i] for i in indices[0] if i != -1]
+    
+    @property
+    def sparse_index(self):
+        """BM25 index of the store's chunks, built here for stores ingested before it existed"""
+        if self._sparse_index is None:
+            path = sparse_index_path(self.vector_store_path)
+            if not os.path.exists(path):
+                store = self.vector_store
+                sync_sparse_index(self.vector_store_path, store.docstore, store.index_to_docstore_id)
+            self._sparse_index = SparseIndex(path)
+        return self._sparse_index
+    
+    def _documents(self, doc_ids):
+        if self._vector_store is not None:
+            docstore = self._vector_store.docstore
+        else:
+            if self._docstore is None:
+                # The pickled docstore alone, without the embedding model (as FAISS.load_local reads it)
+                with open(os.path.join(self.vector_store_path, "index.pkl"), "rb") as f:
+                    self._docstore, _ = pickle.load(f)
+            docstore = self._docstore
+        docs = [docstore.search(doc_id) for doc_id in doc_ids]
+        # search() returns a message string for ids the store no longer has
+        return [doc for doc in docs if not isinstance(doc, str)]
 
 if __name__ == "__main__":
     rag = RAGTool()
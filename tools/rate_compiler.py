@@ -0,0 +1,140 @@
+"""
+Duty rate compiler for HTS rate-of-duty strings.
+
+The schedule only contains a few thousand distinct rate strings ("4.4¢/kg",
+"26.4%", "$1.104/kg + 14.9%", "Free (A+,AU,...)", "0.9¢ each", "$1.11/t"), so
+each one is parsed once into a CompiledRate and memoized in a bounded LRU keyed
+by the raw string. Pricing a line is then a handful of float multiplies.
+"""
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+
+# Distinct rate strings across the full HTS fit comfortably in this bound
+RATE_CACHE_SIZE = 4096
+
+AD_VALOREM_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)\s*%$")
+SPECIFIC_PATTERN = re.compile(
+    r"^(\$)?(\d+(?:\.\d+)?)\s*(¢)?\s*(?:/\s*([a-z]+)\.?|(each))$"
+)
+FREE_PROGRAMS_PATTERN = re.compile(r"^free\s*\(([^)]*)\)")
+
+# Quantity units priced per unit of quantity rather than by weight
+WEIGHT_UNITS = {"kg": 1.0, "t": 1000.0}
+
+
+@dataclass(frozen=True)
+class CompiledRate:
+    """Structured form of a single rate-of-duty string.
+
+    Specific components are stored in dollars: per kilogram, per metric ton and
+    per unit of quantity (each, head, doz., liter, ...).
+    """
+    raw: str
+    kind: str
+    ad_valorem: float = 0.0
+    dollars_per_kg: float = 0.0
+    dollars_per_ton: float = 0.0
+    dollars_per_unit: float = 0.0
+    programs: Tuple[str, ...] = ()
+
+    @property
+    def is_free(self) -> bool:
+        return self.kind == "free"
+
+    def amount(self, cif_value: float, unit_weight: Optional[float] = None,
+               quantity: Optional[float] = None) -> float:
+        """Duty in dollars for a line with the given value, weight (kg) and quantity"""
+        weight = unit_weight or 0.0
+        return (self.ad_valorem * cif_value
+                + self.dollars_per_kg * weight
+                + self.dollars_per_ton * weight / 1000
+                + self.dollars_per_unit * (quantity or 0.0))
+
+    def evaluate(self, cif_value: float = 1.0, unit_weight: Optional[float] = None,
+                 quantity: Optional[float] = None) -> float:
+        """Effective rate as a fraction of the customs value"""
+        if not cif_value:
+            return self.ad_valorem
+        return self.amount(cif_value, unit_weight, quantity) / cif_value
+
+
+EMPTY_RATE = CompiledRate(raw="", kind="empty")
+
+
+def _compile_term(term: str):
+    """Parse one '+'-separated term into (field, value), or None if unknown"""
+    match = AD_VALOREM_PATTERN.match(term)
+    if match:
+        return "ad_valorem", float(match.group(1)) / 100
+
+    match = SPECIFIC_PATTERN.match(term)
+    if match and (match.group(1) or match.group(3)):
+        dollars = float(match.group(2))
+        if match.group(3):
+            dollars /= 100
+        unit = match.group(4) or match.group(5)
+        if unit == "kg":
+            return "dollars_per_kg", dollars
+        if unit == "t":
+            return "dollars_per_ton", dollars
+        return "dollars_per_unit", dollars
+
+    return None
+
+
+@lru_cache(maxsize=RATE_CACHE_SIZE)
+def _compile(raw: str) -> CompiledRate:
+    text = raw.strip().lower()
+    if not text:
+        return EMPTY_RATE
+
+    if text.startswith("free"):
+        match = FREE_PROGRAMS_PATTERN.match(text)
+        programs = ()
+        if match:
+            programs = tuple(code.strip().upper() for code in match.group(1).split(",") if code.strip())
+        return CompiledRate(raw=raw, kind="free", programs=programs)
+
+    # Drop trailing program lists and cross-references ("1.7% (KR) See ...")
+    expression = re.split(r"\(|\bsee\b", text, maxsplit=1)[0].strip()
+
+    fields = {}
+    for term in expression.split("+"):
+        parsed = _compile_term(term.strip())
+        if parsed is None:
+            continue
+        field, value = parsed
+        fields[field] = fields.get(field, 0.0) + value
+
+    if not fields:
+        return CompiledRate(raw=raw, kind="unparsed")
+
+    if len(fields) > 1:
+        kind = "compound"
+    else:
+        kind = {
+            "ad_valorem": "ad_valorem",
+            "dollars_per_kg": "specific",
+            "dollars_per_ton": "per_ton",
+            "dollars_per_unit": "per_unit",
+        }[next(iter(fields))]
+    return CompiledRate(raw=raw, kind=kind, **fields)
+
+
+def compile_rate(raw) -> CompiledRate:
+    """Compile a rate string, returning EMPTY_RATE for missing values"""
+    if raw is None or not isinstance(raw, str):
+        return EMPTY_RATE
+    return _compile(raw)
+
+
+def rate_cache_info():
+    """Hit/miss statistics of the compiled-rate LRU"""
+    return _compile.cache_info()
+
+
+def clear_rate_cache():
+    _compile.cache_clear()
@@ -0,0 +1,283 @@
+"""
+Memory-mapped columnar snapshot of the resolved tariff schedule.
+
+The build step writes every coded line of an HTSScheduleIndex into one binary
+file, sorted by normalized code:
+
+    header    magic, format version, row count, key width, source signature
+    keys      fixed-width ASCII code keys (binary-searched in place)
+    numbers   float64 columns for the compiled general and column 2 rates
+              (ad valorem, $/kg, $/t, $/unit) plus a uint8 rate-kind column
+    strings   per column, a uint32 offset array into a UTF-8 string pool
+
+Readers mmap the file read-only and view each column through memoryview casts,
+so opening it costs a header parse and nothing is copied. Every worker process
+that opens the same file shares one page-cache copy of it.
+"""
+
+import mmap
+import os
+import struct
+import sys
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.hts_index import HTSScheduleIndex, get_schedule_index, db_signature, normalize_code
+from tools.rate_compiler import CompiledRate, compile_rate
+
+MAGIC = b"HTSCOL01"
+FORMAT_VERSION = 1
+KEY_WIDTH = 10
+DEFAULT_COLUMNAR_PATH = "data/hts_schedule.col"
+
+HEADER = struct.Struct("<8sIIII")
+SECTION = struct.Struct("<24sQQ")
+
+RATE_KINDS = ("empty", "free", "ad_valorem", "specific", "per_ton", "per_unit", "compound", "unparsed")
+RATE_FIELDS = ("ad_valorem", "dollars_per_kg", "dollars_per_ton", "dollars_per_unit")
+PRICED_COLUMNS = ("general", "column2")
+STRING_COLUMNS = (
+    "code", "description", "full_description", "unit",
+    "general_rate", "special_rate", "column2_rate", "rate_source",
+)
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _string_column(values: List[str]) -> Tuple[bytes, bytes]:
+    """(uint32 offsets, pool) for a list of strings"""
+    offsets = [0]
+    pool = bytearray()
+    for value in values:
+        pool += (value or "").encode("utf-8")
+        offsets.append(len(pool))
+    return struct.pack(f"<{len(offsets)}I", *offsets), bytes(pool)
+
+
+def build_snapshot(schedule: HTSScheduleIndex, path: str = DEFAULT_COLUMNAR_PATH) -> str:
+    """Write the coded lines of a schedule to a columnar snapshot file"""
+    entries = [schedule.by_key[key] for key in schedule.sorted_keys if len(key) <= KEY_WIDTH]
+    count = len(entries)
+
+    sections: Dict[str, bytes] = {
+        "keys": b"".join(entry.key.encode("ascii").ljust(KEY_WIDTH, b"\0") for entry in entries)
+    }
+    for column in PRICED_COLUMNS:
+        rates = [getattr(entry, column) for entry in entries]
+        sections[f"{column}.kind"] = bytes(RATE_KINDS.index(rate.kind) for rate in rates)
+        for field in RATE_FIELDS:
+            sections[f"{column}.{field}"] = struct.pack(
+                f"<{count}d", *(getattr(rate, field) for rate in rates)
+            )
+    for column in STRING_COLUMNS:
+        offsets, pool = _string_column([getattr(entry, column) for entry in entries])
+        sections[f"{column}.off"] = offsets
+        sections[f"{column}.str"] = pool
+
+    signature = repr(schedule.source_signature).encode("utf-8")
+    directory_start = _align(HEADER.size + 4 + len(signature))
+    offset = _align(directory_start + SECTION.size * len(sections))
+    directory = []
+    for name, data in sections.items():
+        directory.append((name, offset, len(data)))
+        offset = _align(offset + len(data))
+
+    tmp_path = f"{path}.tmp"
+    directory_name = os.path.dirname(path)
+    if directory_name:
+        os.makedirs(directory_name, exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, count, KEY_WIDTH, len(sections)))
+        f.write(struct.pack("<I", len(signature)) + signature)
+        f.seek(directory_start)
+        for name, start, length in directory:
+            f.write(SECTION.pack(name.encode("ascii"), start, length))
+        for (name, start, _), data in zip(directory, sections.values()):
+            f.seek(start)
+            f.write(data)
+    # Readers holding the old mapping keep their (unlinked) copy
+    os.replace(tmp_path, path)
+    return path
+
+
+class ScheduleSnapshot:
+    """Read-only, zero-copy view of a columnar schedule snapshot"""
+
+    def __init__(self, path: str = DEFAULT_COLUMNAR_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Identifies the file this mapping was taken from (the path may be replaced)
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+        buffer = memoryview(self._mmap)
+        self._views = [buffer]
+
+        magic, version, count, key_width, section_count = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} schedule snapshot")
+        self.count = count
+        self.key_width = key_width
+
+        (signature_length,) = struct.unpack_from("<I", buffer, HEADER.size)
+        signature_start = HEADER.size + 4
+        self.source_signature = bytes(buffer[signature_start:signature_start + signature_length]).decode("utf-8")
+
+        self._columns = {}
+        directory_start = _align(signature_start + signature_length)
+        for i in range(section_count):
+            name, start, length = SECTION.unpack_from(buffer, directory_start + i * SECTION.size)
+            name = name.rstrip(b"\0").decode("ascii")
+            view = buffer[start:start + length]
+            self._views.append(view)
+            if name.endswith(".off"):
+                view = view.cast("I")
+            elif not (name == "keys" or name.endswith((".kind", ".str"))):
+                view = view.cast("d")
+            self._views.append(view)
+            self._columns[name] = view
+        self._keys = self._columns["keys"]
+
+    def close(self):
+        self._columns = {}
+        self._keys = None
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, code) -> bool:
+        return self.find(code) is not None
+
+    def _key(self, row: int) -> bytes:
+        return self._keys[row * self.key_width:(row + 1) * self.key_width].tobytes()
+
+    def find(self, code) -> Optional[int]:
+        """Row number of an exact code, by binary search over the key column"""
+        key = normalize_code(code)
+        if not key or len(key) > self.key_width:
+            return None
+        target = key.encode("ascii").ljust(self.key_width, b"\0")
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self._key(lo) == target:
+            return lo
+        return None
+
+    def prefix(self, prefix) -> range:
+        """Rows whose code starts with a (partial) code"""
+        key = normalize_code(prefix).encode("ascii")
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        end = lo
+        while end < self.count and self._key(end).startswith(key):
+            end += 1
+        return range(lo, end)
+
+    def string(self, column: str, row: int) -> str:
+        offsets = self._columns[f"{column}.off"]
+        return self._columns[f"{column}.str"][offsets[row]:offsets[row + 1]].tobytes().decode("utf-8")
+
+    def rate(self, column: str, row: int) -> CompiledRate:
+        """Compiled rate rebuilt from the float columns, without parsing"""
+        if column not in PRICED_COLUMNS:
+            return compile_rate(self.string(f"{column}_rate", row))
+        fields = {field: self._columns[f"{column}.{field}"][row] for field in RATE_FIELDS}
+        return CompiledRate(
+            raw=self.string(f"{column}_rate", row),
+            kind=RATE_KINDS[self._columns[f"{column}.kind"][row]],
+            **fields
+        )
+
+    def duty(self, code, cif_value: float, unit_weight: Optional[float] = None,
+             quantity: Optional[float] = None, column: str = "general") -> Optional[float]:
+        """Duty in dollars for one line, or None if the code is not in the schedule"""
+        row = self.find(code)
+        if row is None:
+            return None
+        columns = self._columns
+        return (columns[f"{column}.ad_valorem"][row] * cif_value
+                + columns[f"{column}.dollars_per_kg"][row] * (unit_weight or 0.0)
+                + columns[f"{column}.dollars_per_ton"][row] * (unit_weight or 0.0) / 1000
+                + columns[f"{column}.dollars_per_unit"][row] * (quantity or 0.0))
+
+    def row(self, row: int) -> Dict[str, object]:
+        """One line in hts_data column naming, like ScheduleEntry.as_row()"""
+        return {
+            "HTS Number": self.string("code", row),
+            "Description": self.string("full_description", row),
+            "Unit of Quantity": self.string("unit", row),
+            "General Rate of Duty": self.string("general_rate", row),
+            "Special Rate of Duty": self.string("special_rate", row),
+            "Column 2 Rate of Duty": self.string("column2_rate", row),
+        }
+
+    def get(self, code) -> Optional[Dict[str, object]]:
+        row = self.find(code)
+        return None if row is None else self.row(row)
+
+    def codes(self) -> Iterator[str]:
+        for row in range(self.count):
+            yield self.string("code", row)
+
+
+_snapshots: Dict[str, ScheduleSnapshot] = {}
+_snapshots_lock = threading.Lock()
+
+
+def ensure_snapshot(db_path: str = "data/hts.db", path: str = DEFAULT_COLUMNAR_PATH) -> str:
+    """Build the columnar snapshot unless it already matches the database"""
+    signature = repr(db_signature(db_path))
+    if os.path.exists(path):
+        try:
+            snapshot = ScheduleSnapshot(path)
+            current = snapshot.source_signature == signature
+            snapshot.close()
+            if current:
+                return path
+        except (OSError, ValueError, struct.error):
+            pass
+    return build_snapshot(get_schedule_index(db_path), path)
+
+
+def open_snapshot(path: str = DEFAULT_COLUMNAR_PATH) -> ScheduleSnapshot:
+    """Process-wide mapping of a snapshot file, reopened if the file is replaced"""
+    key = os.path.abspath(path)
+    with _snapshots_lock:
+        snapshot = _snapshots.get(key)
+        stat = os.stat(path)
+        if snapshot is None or snapshot.identity != (stat.st_ino, stat.st_mtime_ns):
+            # The replaced mapping is left to the garbage collector: callers may still use it
+            snapshot = _snapshots[key] = ScheduleSnapshot(path)
+        return snapshot
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    ensure_snapshot()
+    print(f"Snapshot ready at {DEFAULT_COLUMNAR_PATH} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    snapshot = ScheduleSnapshot()
+    print(f"Opened {len(snapshot)} lines in {(time.perf_counter() - start) * 1000:.3f} ms")
+    print(snapshot.get("0201.10.05.10"))
@@ -0,0 +1,99 @@
+"""
+Semantic answer cache for policy questions.
+
+Exact-text caching misses paraphrases ("What is GSP?" vs "explain the
+generalized system of preferences"). SemanticAnswerCache keeps the embeddings
+of answered questions in a FAISS inner-product index over unit vectors, so a
+search returns the cosine similarity of the closest past question. When it
+reaches the threshold the stored answer is served without retrieval or answer
+generation.
+
+The cache holds at most maxsize questions and evicts the least recently served
+one. faiss and numpy are imported on first use; both come with the vector store
+dependencies.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence, Tuple
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.92
+DEFAULT_SEMANTIC_CACHE_SIZE = 512
+
+
+class SemanticAnswerCache:
+    """Answers keyed by question embedding, matched by cosine similarity"""
+
+    def __init__(self, threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                 maxsize: int = DEFAULT_SEMANTIC_CACHE_SIZE):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self._index = None
+        # id -> (question, answer), least recently served first
+        self._entries: "OrderedDict[int, Tuple[str, Dict]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _vector(embedding: Sequence[float]):
+        import numpy as np
+
+        vector = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding: Sequence[float]) -> Optional[Dict]:
+        """Stored answer for the most similar past question, if similar enough"""
+        with self._lock:
+            if self._index is None or not self._entries:
+                self.misses += 1
+                return None
+            scores, ids = self._index.search(self._vector(embedding), 1)
+            entry_id, score = int(ids[0][0]), float(scores[0][0])
+            if entry_id == -1 or score < self.threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            question, answer = self._entries[entry_id]
+            return {**answer, "matched_question": question, "similarity": round(score, 4)}
+
+    def add(self, embedding: Sequence[float], question: str, answer: Dict):
+        import faiss
+        import numpy as np
+
+        vector = self._vector(embedding)
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            # Answers served from the cache carry their match; store the plain answer
+            answer = {k: v for k, v in answer.items() if k not in ("matched_question", "similarity")}
+            self._entries[entry_id] = (question, answer)
+            while len(self._entries) > self.maxsize:
+                evicted, _ = self._entries.popitem(last=False)
+                self._index.remove_ids(np.array([evicted], dtype=np.int64))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._index = None
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,108 @@
+"""
+BM25 keyword index over the policy vector store's chunks.
+
+Dense retrieval alone often misses exact program names ("AGOA", "CBTPA") and
+HTS numbers ("9802.00.80"). SparseIndex keeps the same chunks, under the same
+docstore ids, in an SQLite FTS5 table next to the FAISS files
+(data/vector_store/sparse_index.db). Ingestion syncs it whenever the store
+changes, and RAGTool fuses its ranking with the dense one using reciprocal
+rank fusion.
+"""
+
+import os
+import re
+import sys
+from typing import Dict, Iterable, List, Sequence
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.db_pool import get_pool
+
+SPARSE_INDEX_FILE = "sparse_index.db"
+RRF_K = 60
+
+# HTS numbers are matched as phrases of their digit groups ("9802 00 80")
+CODE_PATTERN = re.compile(r"\b\d{4}(?:\.\d{2}){1,3}\b")
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me of on or tell the "
+    "this to under what when which who why with".split()
+)
+
+SPARSE_SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+        doc_id UNINDEXED,
+        content,
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )
+"""
+
+SEARCH_SQL = """
+    SELECT doc_id FROM chunks_fts
+    WHERE chunks_fts MATCH ?
+    ORDER BY bm25(chunks_fts)
+    LIMIT ?
+"""
+
+
+def sparse_index_path(vector_store_path: str) -> str:
+    return os.path.join(vector_store_path, SPARSE_INDEX_FILE)
+
+
+def _match_expression(query: str) -> str:
+    """Any of the query's codes (as phrases) or content words"""
+    terms = [f'"{" ".join(code.split("."))}"' for code in CODE_PATTERN.findall(query)]
+    remainder = CODE_PATTERN.sub(" ", query.lower())
+    terms += [f'"{token}"' for token in dict.fromkeys(TOKEN_PATTERN.findall(remainder)) if token not in STOPWORDS]
+    return " OR ".join(terms)
+
+
+class SparseIndex:
+    """FTS5/BM25 search over chunk text, keyed by docstore id"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pool = get_pool(path)
+        with self.pool.writer() as conn:
+            conn.execute(SPARSE_SCHEMA)
+
+    def sync(self, documents: Dict[str, str]) -> Dict[str, int]:
+        """Make the index hold exactly these {doc_id: text} chunks"""
+        indexed = {row[0] for row in self.pool.execute("SELECT doc_id FROM chunks_fts")}
+        removed = indexed - documents.keys()
+        added = [(doc_id, documents[doc_id]) for doc_id in documents.keys() - indexed]
+        if removed or added:
+            with self.pool.writer() as conn:
+                conn.executemany("DELETE FROM chunks_fts WHERE doc_id = ?", ((doc_id,) for doc_id in removed))
+                conn.executemany("INSERT INTO chunks_fts (doc_id, content) VALUES (?, ?)", added)
+                conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('optimize')")
+        return {"added": len(added), "removed": len(removed)}
+
+    def search(self, query: str, limit: int = 10) -> List[str]:
+        """Docstore ids ranked by BM25"""
+        expression = _match_expression(query or "")
+        if not expression:
+            return []
+        return [row[0] for row in self.pool.execute(SEARCH_SQL, (expression, limit))]
+
+    def __len__(self):
+        return self.pool.execute("SELECT COUNT(*) FROM chunks_fts")[0][0]
+
+
+def sync_sparse_index(vector_store_path: str, docstore, index_to_docstore_id: Dict[int, str]) -> Dict[str, int]:
+    """Bring the store's sparse index in line with its docstore"""
+    documents = {}
+    for doc_id in index_to_docstore_id.values():
+        doc = docstore.search(doc_id)
+        if not isinstance(doc, str):
+            documents[doc_id] = doc.page_content
+    return SparseIndex(sparse_index_path(vector_store_path)).sync(documents)
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], limit: int, k: int = RRF_K) -> List[str]:
+    """Merge ranked id lists: each id scores the sum of 1 / (k + rank) over the lists"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)[:limit]
@@ -1,59 +1,66 @@
-import sqlite3
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 import pandas as pd
-import re
+import numpy as np
 import json
 
+from tools.hts_index import get_schedule_index
+from tools.program_index import get_program_index, resolve
+from tools.rate_compiler import compile_rate
+
+DUTY_COLUMNS = ["General Rate of Duty", "Special Rate of Duty", "Column 2 Rate of Duty"]
+
+# Column names accepted by calculate_duties, mapped from the batch CSV template
+# headers (see hts_batch_template.csv) to the calculate_duty argument names.
+BATCH_COLUMNS = {
+    "HTS Code": "hts_code",
+    "Product Cost": "product_cost",
+    "Freight": "freight",
+    "Insurance": "insurance",
+    "Unit Weight": "unit_weight",
+    "Quantity": "quantity",
+    "Origin": "origin",
+}
+
 class TariffCalculator:
     def __init__(self, db_path="data/hts.db"):
         self.db_path = db_path
     
+    @property
+    def schedule(self):
+        """Resolved schedule index; statistical lines inherit their parent's rates"""
+        return get_schedule_index(self.db_path)
+    
     def parse_duty_advanced(self, duty_str, unit_weight=None, quantity=None, cif_value=1.0):
         """Parse duty strings and calculate rates"""
-        if pd.isna(duty_str) or duty_str.strip() == "":
-            return 0.0
-        
-        duty_str = duty_str.strip().lower()
-        
-        if "free" in duty_str:
-            return 0.0
-        
-        # Percentage duty (e.g., '5%')
-        match = re.search(r"([\d.]+)\s*%", duty_str)
-        if match:
-            return float(match.group(1)) / 100
-        
-        # Weight-based duty (e.g., '2.5¢/kg')
-        match = re.search(r"([\d.]+)\s*¢/kg", duty_str)
-        if match and unit_weight is not None:
-            cents_per_kg = float(match.group(1))
-            return (cents_per_kg * unit_weight) / (100 * cif_value)
-        
-        # Unit-based duty (e.g., '$1.00/unit')
-        match = re.search(r"\$([\d.]+)/unit", duty_str)
-        if match and quantity is not None:
-            dollars_per_unit = float(match.group(1))
-            return (dollars_per_unit * quantity) / cif_value
-        
-        return 0.0
+        return compile_rate(duty_str).evaluate(cif_value, unit_weight, quantity)
+    
+    @property
+    def programs(self):
+        """Special-program rates per line, compiled at ingest"""
+        return get_program_index(self.db_path)
     
-    def calculate_duty(self, hts_code, product_cost, freight, insurance, unit_weight, quantity):
-        """Calculate duties for a given HTS code and product details"""
+    def calculate_duty(self, hts_code, product_cost, freight, insurance, unit_weight, quantity, origin=None):
+        """Calculate duties for a given HTS code and product details.
+        
+        With a country of origin, the total uses the rate that applies to it:
+        column 2, the cheapest special program it qualifies for, or general.
+        """
         cif_value = product_cost + freight + insurance
         
-        # Query database
+        # Look up the effective schedule line
         try:
-            conn = sqlite3.connect(self.db_path)
-            query = f"SELECT * FROM hts_data WHERE \"HTS Number\" = '{hts_code}'"
-            df = pd.read_sql_query(query, conn)
-            conn.close()
+            entry = self.schedule.get(hts_code)
         except Exception as e:
             return {"error": f"Database error: {str(e)}. Run process_hts.py first."}
         
-        if df.empty:
+        if entry is None:
             return {"error": f"No data found for HTS code {hts_code}"}
         
         # Calculate duties
-        row = df.iloc[0]
+        row = entry.as_row()
         result = {
             "HTS Code": hts_code,
             "Description": row.get("Description", "N/A"),
@@ -65,9 +72,8 @@ class TariffCalculator:
         }
         
         total_duty = 0.0
-        duty_columns = ["General Rate of Duty", "Special Rate of Duty", "Column 2 Rate of Duty"]
         
-        for col in duty_columns:
+        for col in DUTY_COLUMNS:
             if col in row:
                 duty_rate = self.parse_duty_advanced(
                     row[col], unit_weight, quantity, cif_value
@@ -80,10 +86,177 @@ class TariffCalculator:
                 if col == "General Rate of Duty":  # Use general rate for calculation
                     total_duty = duty_amount
         
+        if origin:
+            resolution = resolve(self.programs.programs(hts_code), origin, entry.general,
+                                 entry.column2, unit_weight, cif_value, quantity)
+            total_duty = resolution.rate.amount(cif_value, unit_weight, quantity)
+            result["Origin"] = origin
+            result["Applied Rate"] = {
+                "column": resolution.column,
+                "program": resolution.program_name or resolution.program or "None",
+                "rate": resolution.rate.raw or "Free",
+                "amount": f"${total_duty:,.2f}"
+            }
+            if resolution.reference:
+                result["Applied Rate"]["reference"] = resolution.reference
+        
         result["Total Duty"] = f"${total_duty:,.2f}"
         result["Landed Cost"] = f"${(cif_value + total_duty):,.2f}"
         
         return result
+    
+    def _lookup_codes(self, codes):
+        """Resolve many codes against the schedule index in one pass"""
+        schedule = self.schedule
+        rows = []
+        for code in codes:
+            entry = schedule.get(code)
+            if entry is not None:
+                row = entry.as_row()
+                # Keyed by the code as submitted so it joins back onto the batch
+                row["HTS Number"] = code
+                rows.append(row)
+        return pd.DataFrame(rows, columns=["HTS Number", "Description"] + DUTY_COLUMNS)
+    
+    def calculate_duties(self, df, formatted=False):
+        """Calculate duties for a whole DataFrame of line items at once.
+        
+        Accepts either the batch template headers ("HTS Code", "Product Cost",
+        ...) or the calculate_duty argument names as columns. Returns one row per
+        input line with the fields calculate_duty produces, flattened: a rate and
+        amount column per duty column, "Total Duty", "Landed Cost" and "error".
+        Money columns are floats unless formatted=True.
+        
+        With an origin column, lines that name an origin are totalled at the
+        rate that applies to it, like calculate_duty(origin=...), and get
+        "Origin" and "Applied Column/Program/Rate/Reference" columns.
+        """
+        items = df.rename(columns=BATCH_COLUMNS).reset_index(drop=True)
+        for col in ["freight", "insurance", "unit_weight", "quantity"]:
+            if col not in items.columns:
+                items[col] = 0.0
+        
+        codes = items["hts_code"].astype(str).str.strip()
+        product_cost = items["product_cost"].astype(float).to_numpy()
+        freight = items["freight"].fillna(0).astype(float).to_numpy()
+        insurance = items["insurance"].fillna(0).astype(float).to_numpy()
+        unit_weight = items["unit_weight"].fillna(0).astype(float).to_numpy()
+        quantity = items["quantity"].fillna(0).astype(float).to_numpy()
+        cif_value = product_cost + freight + insurance
+        
+        result = pd.DataFrame({
+            "HTS Code": codes,
+            "Product Cost": product_cost,
+            "Freight": freight,
+            "Insurance": insurance,
+            "CIF Value": cif_value,
+        })
+        
+        try:
+            schedule = self._lookup_codes(codes.unique())
+        except Exception as e:
+            result["Description"] = "N/A"
+            result["Total Duty"] = np.nan
+            result["Landed Cost"] = np.nan
+            result["error"] = f"Database error: {str(e)}. Run process_hts.py first."
+            return self.format_duties(result) if formatted else result
+        
+        matched = codes.to_frame("HTS Number").merge(schedule, on="HTS Number", how="left")
+        found = codes.isin(schedule["HTS Number"]).to_numpy()
+        result["Description"] = matched["Description"].fillna("N/A").to_numpy()
+        
+        # Rate strings are compiled once (memoized), then every line is priced column-wise
+        safe_cif = np.where(cif_value != 0, cif_value, 1.0)
+        total_duty = np.zeros(len(items))
+        for col in DUTY_COLUMNS:
+            if col not in matched.columns:
+                continue
+            compiled = matched[col].map(compile_rate)
+            ad_valorem = compiled.map(lambda r: r.ad_valorem).to_numpy(dtype=float)
+            per_kg = compiled.map(lambda r: r.dollars_per_kg + r.dollars_per_ton / 1000).to_numpy(dtype=float)
+            per_unit = compiled.map(lambda r: r.dollars_per_unit).to_numpy(dtype=float)
+            
+            specific = per_kg * unit_weight + per_unit * quantity
+            duty_rate = ad_valorem + np.where(cif_value != 0, specific / safe_cif, 0.0)
+            duty_amount = duty_rate * cif_value
+            result[f"{col} Rate"] = duty_rate
+            result[f"{col} Amount"] = duty_amount
+            if col == "General Rate of Duty":  # Use general rate for calculation
+                total_duty = duty_amount.copy()
+        
+        if "origin" in items.columns:
+            self._apply_origins(items["origin"], codes, found, cif_value, unit_weight, quantity,
+                                total_duty, result)
+        
+        result["Total Duty"] = total_duty
+        result["Landed Cost"] = cif_value + total_duty
+        result["error"] = np.where(found, None, "No data found for HTS code " + codes)
+        
+        if formatted:
+            result = self.format_duties(result)
+        return result
+    
+    def _apply_origins(self, origin_column, codes, found, cif_value, unit_weight, quantity, total_duty, result):
+        """Reprice lines with an origin at its applicable rate, in place"""
+        origins = [o.strip() if isinstance(o, str) and o.strip() else None for o in origin_column]
+        lines = [i for i in np.flatnonzero(found) if origins[i]]
+        # Schedule line and programs are looked up once per code, not once per line
+        schedule, programs = self.schedule, self.programs
+        rates = {}
+        for code in {codes.iat[i] for i in lines}:
+            entry = schedule.get(code)
+            rates[code] = (programs.programs(code), entry.general, entry.column2)
+        
+        applied = [None] * len(origins)
+        for i in lines:
+            line_programs, general, column2 = rates[codes.iat[i]]
+            resolution = resolve(line_programs, origins[i], general, column2,
+                                 unit_weight[i], cif_value[i], quantity[i])
+            total_duty[i] = resolution.rate.amount(cif_value[i], unit_weight[i], quantity[i])
+            applied[i] = resolution
+        
+        result["Origin"] = origins
+        result["Applied Column"] = [r.column if r else None for r in applied]
+        result["Applied Program"] = [(r.program_name or r.program or "None") if r else None for r in applied]
+        result["Applied Rate"] = [(r.rate.raw or "Free") if r else None for r in applied]
+        result["Applied Reference"] = [r.reference if r else None for r in applied]
+    
+    @staticmethod
+    def result_from_row(row):
+        """calculate_duty's result for one row of a formatted calculate_duties frame"""
+        if pd.notna(row.get("error")):
+            return {"error": row["error"]}
+        result = {key: row[key] for key in ("HTS Code", "Description", "CIF Value", "Product Cost", "Freight", "Insurance")}
+        result["duties"] = {
+            col: {"rate": row[f"{col} Rate"], "amount": row[f"{col} Amount"]}
+            for col in DUTY_COLUMNS if f"{col} Rate" in row
+        }
+        if pd.notna(row.get("Applied Column")):
+            result["Origin"] = row["Origin"]
+            result["Applied Rate"] = {
+                "column": row["Applied Column"],
+                "program": row["Applied Program"],
+                "rate": row["Applied Rate"],
+                "amount": row["Total Duty"]
+            }
+            if pd.notna(row.get("Applied Reference")):
+                result["Applied Rate"]["reference"] = row["Applied Reference"]
+        result["Total Duty"] = row["Total Duty"]
+        result["Landed Cost"] = row["Landed Cost"]
+        return result
+    
+    @staticmethod
+    def format_duties(result):
+        """Format a calculate_duties frame the way calculate_duty formats its fields"""
+        result = result.copy()
+        money_columns = [c for c in result.columns
+                         if c in ("Product Cost", "Freight", "Insurance", "CIF Value", "Total Duty", "Landed Cost")
+                         or c.endswith(" Amount")]
+        for col in money_columns:
+            result[col] = result[col].map(lambda v: f"${v:,.2f}" if pd.notna(v) else None)
+        for col in [f"{c} Rate" for c in DUTY_COLUMNS if f"{c} Rate" in result.columns]:
+            result[col] = result[col].map(lambda v: f"{v * 100:.2f}%" if v > 0 else "Free")
+        return result
 
 if __name__ == "__main__":
     # Test the calculator
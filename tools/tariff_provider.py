@@ -0,0 +1,434 @@
+"""
+Pluggable tariff data providers.
+
+Every UI and CLI reads the schedule through a TariffDataProvider: a read-only
+mapping of HTS code -> record, where a record has the shape the apps were built
+around (description, duty_rate, category, units, special_programs,
+origin_rates, seasonal, avg_value) plus the raw rate strings.
+
+Three implementations share one interface:
+
+    SQLiteTariffProvider     the resolved schedule index over data/hts.db
+    SnapshotTariffProvider   the memory-mapped columnar snapshot (zero copy)
+    InMemoryTariffProvider   a fixed dict, for tests and databaseless demos
+
+Records are built on first access and memoized per process. The cache is keyed
+by the provider's schedule version, so re-ingesting the schedule invalidates it.
+"""
+
+import os
+import sys
+import threading
+import time
+from abc import abstractmethod
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.hts_index import VERSION_CHECK_INTERVAL, db_signature, get_schedule_index, normalize_code
+from tools.hts_search import HTSSearchIndex, get_search_index
+from tools.program_index import (
+    ProgramRates, Resolution, compile_programs, get_program_index, resolve
+)
+from tools.rate_compiler import CompiledRate, EMPTY_RATE, compile_rate
+from tools.schedule_snapshot import DEFAULT_COLUMNAR_PATH, ensure_snapshot, open_snapshot
+
+DEFAULT_DB_PATH = "data/hts.db"
+
+# Value of one unit of quantity assumed when pricing a line with no declared
+# value; per-kilogram lines are mostly bulk commodities
+DEFAULT_AVG_VALUE = 1000.0
+DEFAULT_AVG_VALUE_BY_UNIT = {"kg": 10.0}
+
+CHAPTER_TITLES = {
+    "01": "Live Animals", "02": "Meat and Edible Meat Offal", "03": "Fish and Crustaceans",
+    "04": "Dairy, Eggs and Honey", "05": "Other Products of Animal Origin",
+    "06": "Live Trees and Plants", "07": "Edible Vegetables", "08": "Edible Fruit and Nuts",
+    "09": "Coffee, Tea and Spices", "10": "Cereals", "11": "Milling Products",
+    "12": "Oil Seeds and Fruits", "13": "Lacs, Gums and Resins",
+    "14": "Vegetable Plaiting Materials", "15": "Fats and Oils",
+    "16": "Meat and Fish Preparations", "17": "Sugars and Confectionery", "18": "Cocoa",
+    "19": "Cereal and Bakery Preparations", "20": "Vegetable and Fruit Preparations",
+    "21": "Miscellaneous Edible Preparations", "22": "Beverages and Spirits",
+    "23": "Food Industry Residues and Animal Feed", "24": "Tobacco",
+    "25": "Salt, Sulfur, Earths and Stone", "26": "Ores, Slag and Ash",
+    "27": "Mineral Fuels and Oils", "28": "Inorganic Chemicals", "29": "Organic Chemicals",
+    "30": "Pharmaceutical Products", "31": "Fertilizers",
+    "32": "Tanning and Dyeing Extracts, Paints", "33": "Essential Oils and Cosmetics",
+    "34": "Soaps, Waxes and Polishes", "35": "Albuminoidal Substances, Glues, Enzymes",
+    "36": "Explosives and Matches", "37": "Photographic Goods",
+    "38": "Miscellaneous Chemical Products", "39": "Plastics", "40": "Rubber",
+    "41": "Raw Hides, Skins and Leather", "42": "Leather Articles and Handbags",
+    "43": "Furskins", "44": "Wood", "45": "Cork", "46": "Basketware", "47": "Wood Pulp",
+    "48": "Paper and Paperboard", "49": "Printed Books and Newspapers", "50": "Silk",
+    "51": "Wool and Animal Hair", "52": "Cotton", "53": "Other Vegetable Textile Fibers",
+    "54": "Man-made Filaments", "55": "Man-made Staple Fibers",
+    "56": "Wadding, Felt, Twine and Rope", "57": "Carpets", "58": "Special Woven Fabrics",
+    "59": "Coated and Laminated Textiles", "60": "Knitted or Crocheted Fabrics",
+    "61": "Knitted Apparel", "62": "Woven Apparel", "63": "Other Made-up Textile Articles",
+    "64": "Footwear", "65": "Headgear", "66": "Umbrellas and Walking Sticks",
+    "67": "Feathers and Artificial Flowers", "68": "Stone, Plaster and Cement Articles",
+    "69": "Ceramic Products", "70": "Glass and Glassware",
+    "71": "Pearls, Precious Stones and Metals", "72": "Iron and Steel",
+    "73": "Iron or Steel Articles", "74": "Copper", "75": "Nickel", "76": "Aluminum",
+    "78": "Lead", "79": "Zinc", "80": "Tin", "81": "Other Base Metals",
+    "82": "Tools and Cutlery", "83": "Miscellaneous Base Metal Articles",
+    "84": "Machinery and Mechanical Appliances", "85": "Electrical Machinery and Electronics",
+    "86": "Railway Equipment", "87": "Vehicles", "88": "Aircraft and Spacecraft",
+    "89": "Ships and Boats", "90": "Optical, Medical and Precision Instruments",
+    "91": "Clocks and Watches", "92": "Musical Instruments", "93": "Arms and Ammunition",
+    "94": "Furniture and Lighting", "95": "Toys, Games and Sports Equipment",
+    "96": "Miscellaneous Manufactured Articles", "97": "Works of Art and Antiques",
+    "98": "Special Classification Provisions", "99": "Temporary Legislation",
+}
+
+# Origins priced into each record's origin_rates for the app's comparison views
+DISPLAY_ORIGINS = (
+    "China", "EU", "Germany", "Japan", "Mexico", "Canada", "Vietnam", "India", "Brazil",
+    "USMCA", "Korea", "Australia", "Chile", "Colombia", "Panama", "Peru", "Singapore",
+    "Israel", "Cuba", "North Korea", "Russia", "Belarus",
+)
+
+# The sample catalog the apps shipped with, used when no schedule database exists
+SAMPLE_TARIFF_RECORDS = {
+    "0101.30.00.00": {
+        "description": "Live asses",
+        "duty_rate": 0.0,
+        "category": "Live Animals",
+        "units": "Number",
+        "special_programs": ["GSP"],
+        "origin_rates": {"China": 0.0, "EU": 0.0, "USMCA": 0.0},
+        "seasonal": False,
+        "avg_value": 5000
+    },
+    "0102.21.00.00": {
+        "description": "Live cattle, purebred breeding animals",
+        "duty_rate": 0.025,
+        "category": "Live Animals",
+        "units": "Number",
+        "special_programs": ["USMCA"],
+        "origin_rates": {"China": 0.025, "EU": 0.025, "USMCA": 0.0},
+        "seasonal": False,
+        "avg_value": 15000
+    },
+    "0201.10.00.00": {
+        "description": "Beef carcasses and half-carcasses, fresh or chilled",
+        "duty_rate": 0.044,
+        "category": "Meat Products",
+        "units": "kg",
+        "special_programs": ["TRQ"],
+        "origin_rates": {"China": 0.044, "EU": 0.044, "USMCA": 0.0},
+        "seasonal": False,
+        "avg_value": 8
+    },
+    "8471.30.01.00": {
+        "description": "Portable digital automatic data processing machines",
+        "duty_rate": 0.0,
+        "category": "Electronics",
+        "units": "Number",
+        "special_programs": ["ITA"],
+        "origin_rates": {"China": 0.25, "EU": 0.0, "USMCA": 0.0},
+        "seasonal": False,
+        "avg_value": 800
+    },
+    "6109.10.00.40": {
+        "description": "T-shirts, singlets and other vests, knitted, of cotton",
+        "duty_rate": 0.165,
+        "category": "Textiles",
+        "units": "Dozen",
+        "special_programs": ["CAFTA"],
+        "origin_rates": {"China": 0.165, "EU": 0.12, "USMCA": 0.0},
+        "seasonal": False,
+        "avg_value": 45
+    }
+}
+
+
+def _equivalent_rate(rate: CompiledRate, unit: str, avg_value: float) -> float:
+    """Ad valorem equivalent of a rate for one unit of quantity worth avg_value"""
+    weight = 1.0 if unit == "kg" else None
+    return rate.evaluate(avg_value, unit_weight=weight, quantity=1.0)
+
+
+def build_record(code: str, description: str, unit: str, general: CompiledRate,
+                 special: CompiledRate, column2: CompiledRate,
+                 programs: Optional[ProgramRates] = None,
+                 avg_value: Optional[float] = None) -> Dict[str, object]:
+    """App-shaped record for one resolved schedule line"""
+    if avg_value is None:
+        avg_value = DEFAULT_AVG_VALUE_BY_UNIT.get(unit, DEFAULT_AVG_VALUE)
+    if programs is None:
+        programs = compile_programs(special.raw)
+    duty_rate = _equivalent_rate(general, unit, avg_value)
+
+    weight = 1.0 if unit == "kg" else None
+    origin_rates = {
+        origin: resolve(programs, origin, general, column2, weight, avg_value, 1.0).rate.evaluate(
+            avg_value, unit_weight=weight, quantity=1.0
+        )
+        for origin in DISPLAY_ORIGINS
+    }
+
+    return {
+        "description": description,
+        "duty_rate": duty_rate,
+        "category": CHAPTER_TITLES.get(normalize_code(code)[:2], "Other"),
+        "units": unit or "Number",
+        "special_programs": list(programs.rates) + [p for p in programs.references if p not in programs.rates],
+        "origin_rates": origin_rates,
+        "seasonal": False,
+        "avg_value": avg_value,
+        "general_rate": general.raw,
+        "special_rate": special.raw,
+        "column2_rate": column2.raw,
+    }
+
+
+class TariffDataProvider(Mapping):
+    """Read-only {hts code: record} view of the tariff schedule"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._version = None
+        self._checked_at = float("-inf")
+        self._records: Dict[str, Dict[str, object]] = {}
+        self._codes: Optional[List[str]] = None
+        self._search_index: Optional[HTSSearchIndex] = None
+
+    @abstractmethod
+    def schedule_version(self):
+        """Changes whenever the underlying schedule changes"""
+
+    @abstractmethod
+    def _load_codes(self) -> List[str]:
+        """Every code in schedule order"""
+
+    @abstractmethod
+    def _load_record(self, key: str) -> Optional[Dict[str, object]]:
+        """Record for a normalized code, or None"""
+
+    def rate(self, code, column: str = "general") -> CompiledRate:
+        """Compiled rate of one column for a code"""
+        record = self.get(code)
+        return compile_rate(record.get(f"{column}_rate")) if record else EMPTY_RATE
+
+    def programs(self, code) -> ProgramRates:
+        """Compiled special-program rates for a code"""
+        record = self.get(code)
+        return compile_programs(record.get("special_rate")) if record else compile_programs(None)
+
+    def resolve(self, code, origin: Optional[str], unit_weight: Optional[float] = None,
+                cif_value: float = 1.0, quantity: Optional[float] = None,
+                claim_programs: bool = True) -> Resolution:
+        """Rate that applies to a code for a country of origin"""
+        if code not in self:
+            raise KeyError(code)
+        programs = self.programs(code) if claim_programs else compile_programs(None)
+        return resolve(programs, origin, self.rate(code), self.rate(code, "column2"),
+                       unit_weight, cif_value, quantity)
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return
+        with self._lock:
+            version = self.schedule_version()
+            if version != self._version:
+                self._records = {}
+                self._codes = None
+                self._search_index = None
+                self._version = version
+            self._checked_at = now
+
+    @property
+    def version(self):
+        self._sync()
+        return self._version
+
+    def __getitem__(self, code) -> Dict[str, object]:
+        self._sync()
+        key = normalize_code(code)
+        record = self._records.get(key)
+        if record is None:
+            record = self._load_record(key) if key else None
+            if record is None:
+                raise KeyError(code)
+            self._records[key] = record
+        return record
+
+    def __iter__(self) -> Iterator[str]:
+        self._sync()
+        if self._codes is None:
+            self._codes = self._load_codes()
+        return iter(self._codes)
+
+    def __len__(self):
+        self._sync()
+        if self._codes is None:
+            self._codes = self._load_codes()
+        return len(self._codes)
+
+    def duty(self, code, cif_value: float, unit_weight: Optional[float] = None,
+             quantity: Optional[float] = None) -> float:
+        """General-column duty in dollars for one line"""
+        return self.rate(code).amount(cif_value, unit_weight, quantity)
+
+    @property
+    def search_index(self) -> HTSSearchIndex:
+        """Full-text index over this provider's records"""
+        self._sync()
+        if self._search_index is None:
+            self._search_index = HTSSearchIndex.from_records(self)
+        return self._search_index
+
+    def search(self, query: str, limit: int = 10) -> List[str]:
+        return self.search_index.search_codes(query, limit=limit)
+
+
+class InMemoryTariffProvider(TariffDataProvider):
+    """Fixed records, e.g. SAMPLE_TARIFF_RECORDS or a test fixture"""
+
+    def __init__(self, records: Optional[Dict[str, Dict[str, object]]] = None):
+        super().__init__()
+        self.fixture = dict(SAMPLE_TARIFF_RECORDS if records is None else records)
+        self._by_key = {normalize_code(code): code for code in self.fixture}
+
+    def schedule_version(self):
+        return ("fixture", id(self.fixture))
+
+    def _load_codes(self) -> List[str]:
+        return list(self.fixture)
+
+    def _load_record(self, key: str) -> Optional[Dict[str, object]]:
+        code = self._by_key.get(key)
+        return None if code is None else self.fixture[code]
+
+    def rate(self, code, column: str = "general") -> CompiledRate:
+        record = self.get(code)
+        if not record:
+            return EMPTY_RATE
+        if f"{column}_rate" in record:
+            return compile_rate(record[f"{column}_rate"])
+        # Sample records only carry an ad valorem duty_rate
+        return CompiledRate(raw=f"{record['duty_rate'] * 100:g}%", kind="ad_valorem",
+                            ad_valorem=record["duty_rate"])
+
+    def resolve(self, code, origin: Optional[str], unit_weight: Optional[float] = None,
+                cif_value: float = 1.0, quantity: Optional[float] = None,
+                claim_programs: bool = True) -> Resolution:
+        record = self[code]
+        if "special_rate" in record:
+            return super().resolve(code, origin, unit_weight, cif_value, quantity, claim_programs)
+        # Sample records state their preferential rates per origin directly
+        general = self.rate(code)
+        origin_rate = record["origin_rates"].get(origin)
+        if not claim_programs or origin_rate is None or origin_rate >= record["duty_rate"]:
+            return Resolution(origin, "general", general)
+        rate = CompiledRate(raw=f"{origin_rate * 100:g}%", kind="ad_valorem", ad_valorem=origin_rate)
+        return Resolution(origin, "special", rate)
+
+
+class SQLiteTariffProvider(TariffDataProvider):
+    """Records from the resolved schedule index over an hts.db"""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        super().__init__()
+        self.db_path = db_path
+
+    def schedule_version(self):
+        return db_signature(self.db_path)
+
+    def _load_codes(self) -> List[str]:
+        schedule = get_schedule_index(self.db_path)
+        return [schedule.by_key[key].code for key in schedule.sorted_keys]
+
+    def _load_record(self, key: str) -> Optional[Dict[str, object]]:
+        entry = get_schedule_index(self.db_path).by_key.get(key)
+        if entry is None:
+            return None
+        return build_record(entry.code, entry.full_description, entry.unit,
+                            entry.general, entry.special, entry.column2, self.programs(key))
+
+    def programs(self, code) -> ProgramRates:
+        # Compiled once at ingest
+        return get_program_index(self.db_path).programs(code)
+
+    @property
+    def search_index(self) -> HTSSearchIndex:
+        return get_search_index(self.db_path)
+
+
+class SnapshotTariffProvider(TariffDataProvider):
+    """Records read straight from the memory-mapped columnar snapshot"""
+
+    def __init__(self, path: str = DEFAULT_COLUMNAR_PATH, db_path: Optional[str] = None):
+        super().__init__()
+        self.path = path
+        self.db_path = db_path
+
+    def schedule_version(self):
+        if self.db_path is not None:
+            # Rebuild the file if the database changed outside the ingest pipeline
+            ensure_snapshot(self.db_path, self.path)
+        stat = os.stat(self.path)
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def _load_codes(self) -> List[str]:
+        return list(open_snapshot(self.path).codes())
+
+    def _load_record(self, key: str) -> Optional[Dict[str, object]]:
+        snapshot = open_snapshot(self.path)
+        row = snapshot.find(key)
+        if row is None:
+            return None
+        return build_record(
+            snapshot.string("code", row), snapshot.string("full_description", row),
+            snapshot.string("unit", row), snapshot.rate("general", row),
+            snapshot.rate("special", row), snapshot.rate("column2", row), self.programs(key)
+        )
+
+    def programs(self, code) -> ProgramRates:
+        if self.db_path is not None:
+            # Compiled once at ingest
+            return get_program_index(self.db_path).programs(code)
+        snapshot = open_snapshot(self.path)
+        row = snapshot.find(code)
+        return compile_programs(None if row is None else snapshot.string("special_rate", row))
+
+    def duty(self, code, cif_value: float, unit_weight: Optional[float] = None,
+             quantity: Optional[float] = None) -> float:
+        duty = open_snapshot(self.path).duty(code, cif_value, unit_weight, quantity)
+        # Unknown codes price like the base provider: no rate, no duty
+        return 0.0 if duty is None else duty
+
+    @property
+    def search_index(self) -> HTSSearchIndex:
+        if self.db_path is None:
+            return super().search_index
+        return get_search_index(self.db_path)
+
+
+_providers: Dict[tuple, TariffDataProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_tariff_provider(db_path: str = DEFAULT_DB_PATH,
+                        snapshot_path: str = DEFAULT_COLUMNAR_PATH) -> TariffDataProvider:
+    """Process-wide provider: the columnar snapshot when the schedule database
+    exists (built on first use), SQLite if the snapshot cannot be written, and
+    the sample catalog when there is no database at all."""
+    key = (os.path.abspath(db_path), os.path.abspath(snapshot_path))
+    with _providers_lock:
+        provider = _providers.get(key)
+        if provider is None:
+            if not os.path.exists(db_path):
+                provider = InMemoryTariffProvider()
+            else:
+                try:
+                    ensure_snapshot(db_path, snapshot_path)
+                    provider = SnapshotTariffProvider(snapshot_path, db_path)
+                except OSError:
+                    provider = SQLiteTariffProvider(db_path)
+            _providers[key] = provider
+        return provider
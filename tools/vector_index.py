@@ -0,0 +1,179 @@
+"""
+Approximate FAISS indexes for the policy vector store.
+
+Ingestion always maintains the exact flat index (index.faiss), because it is
+the only index type that supports deleting chunks in place. build_ann_index
+derives an HNSW or IVF-PQ index from it, in the same row order so the pickled
+docstore mapping stays valid, and writes it next to the flat index together
+with index_meta.json:
+
+    {"type": "ivfpq", "file": "index.ivfpq.faiss", "rows": "<digest of docstore ids>",
+     "params": {"nlist": 256, "m": 48, "nbits": 8}, "search": {"nprobe": 16}}
+
+Ingestion rebuilds it whenever the flat index changes; one whose rows no longer
+match the docstore is ignored in favour of the flat index.
+
+load_vector_store opens the index named there, memory-mapped where the faiss
+build supports it (IVF inverted lists, and flat/HNSW codes on newer builds), and
+applies the search parameters. Stores without index_meta.json load the flat
+index. scripts/benchmark_vector_index.py measures recall against latency.
+"""
+
+import hashlib
+import json
+import math
+import os
+import pickle
+from typing import Dict, Optional
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+INDEX_META_FILE = "index_meta.json"
+
+DEFAULT_PARAMS = {
+    "hnsw": {"M": 32, "efConstruction": 200},
+    "ivfpq": {"nlist": None, "m": None, "nbits": 8},
+}
+DEFAULT_SEARCH = {
+    "hnsw": {"efSearch": 64},
+    "ivfpq": {"nprobe": 16},
+}
+
+
+def _mapping_digest(index_to_docstore_id: Dict[int, str]) -> str:
+    """Fingerprint of the row -> docstore id mapping an index was built against"""
+    ids = "\n".join(index_to_docstore_id[row] for row in range(len(index_to_docstore_id)))
+    return hashlib.sha1(ids.encode("utf-8")).hexdigest()
+
+
+def _read_mapping(vector_store_path: str):
+    with open(os.path.join(vector_store_path, "index.pkl"), "rb") as f:
+        return pickle.load(f)
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    # Largest of these that divides the dimension (384 -> 48 sub-vectors of 8 dims)
+    for m in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1):
+        if dimension % m == 0 and dimension // m >= 4:
+            return m
+    return 1
+
+
+def create_index(vectors, index_type: str, params: Optional[Dict] = None):
+    """Build and fill an index of the given type over an (n, d) float32 array"""
+    import faiss
+
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {', '.join(INDEX_TYPES)}")
+    params = {**DEFAULT_PARAMS.get(index_type, {}), **(params or {})}
+    count, dimension = vectors.shape
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, int(params["M"]))
+        index.hnsw.efConstruction = int(params["efConstruction"])
+    else:
+        nlist = int(params["nlist"] or max(1, min(4 * int(math.sqrt(count)), count // 39)))
+        m = int(params["m"] or _pq_subquantizers(dimension))
+        nbits = int(params["nbits"])
+        params.update(nlist=nlist, m=m)
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dimension), dimension, nlist, m, nbits)
+        index.train(vectors)
+    index.add(vectors)
+    return index, params
+
+
+def apply_search_params(index, search: Optional[Dict]):
+    import faiss
+
+    space = faiss.ParameterSpace()
+    for name, value in (search or {}).items():
+        space.set_index_parameter(index, name, value)
+
+
+def flat_vectors(index):
+    """All vectors of a flat index, in row order"""
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def build_ann_index(vector_store_path: str, index_type: str, params: Optional[Dict] = None,
+                    search: Optional[Dict] = None) -> Dict:
+    """Derive an approximate index from the store's flat index and make it the one RAGTool loads"""
+    import faiss
+
+    meta_path = os.path.join(vector_store_path, INDEX_META_FILE)
+    if index_type == "flat":
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        return {"type": "flat", "file": "index.faiss"}
+
+    flat = faiss.read_index(os.path.join(vector_store_path, "index.faiss"))
+    index, effective = create_index(flat_vectors(flat), index_type, params)
+    _, index_to_docstore_id = _read_mapping(vector_store_path)
+    meta = {
+        "type": index_type,
+        "file": f"index.{index_type}.faiss",
+        "rows": _mapping_digest(index_to_docstore_id),
+        "params": effective,
+        # What was asked for, so a rebuild after ingestion re-derives nlist/m for the new size
+        "requested": params or {},
+        "search": {**DEFAULT_SEARCH.get(index_type, {}), **(search or {})},
+    }
+
+    tmp_path = os.path.join(vector_store_path, f"{meta['file']}.tmp")
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, os.path.join(vector_store_path, meta["file"]))
+    with open(f"{meta_path}.tmp", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(f"{meta_path}.tmp", meta_path)
+    return meta
+
+
+def refresh_ann_index(vector_store_path: str) -> Optional[Dict]:
+    """Rebuild the approximate index, if the store has one, after the flat index changed"""
+    meta = read_index_meta(vector_store_path)
+    if meta is None:
+        return None
+    return build_ann_index(vector_store_path, meta["type"], meta.get("requested"), meta.get("search"))
+
+
+def read_index_meta(vector_store_path: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(vector_store_path, INDEX_META_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_index(path: str, mmap: bool = True):
+    import faiss
+
+    if mmap:
+        flags = faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError:
+            # Index types this faiss build cannot map are read into memory
+            pass
+    return faiss.read_index(path)
+
+
+def load_vector_store(vector_store_path: str, embeddings, index_type: str = "auto", mmap: bool = True):
+    """A langchain FAISS store over the index named in index_meta.json (or the flat index)"""
+    from langchain_community.vectorstores import FAISS
+
+    meta = read_index_meta(vector_store_path) if index_type != "flat" else None
+    if index_type not in ("auto", "flat") and (meta is None or meta["type"] != index_type):
+        raise FileNotFoundError(f"No {index_type} index has been built in {vector_store_path}")
+
+    docstore, index_to_docstore_id = _read_mapping(vector_store_path)
+    if meta and meta.get("rows") != _mapping_digest(index_to_docstore_id):
+        # Built before the last ingestion: its rows no longer line up with the docstore
+        if index_type != "auto":
+            raise ValueError(f"The {index_type} index in {vector_store_path} is stale; rebuild it")
+        meta = None
+
+    index = read_index(os.path.join(vector_store_path, meta["file"] if meta else "index.faiss"), mmap)
+    if meta:
+        apply_search_params(index, meta.get("search"))
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)